@@ -6,7 +6,12 @@ Routes tasks to the best model based on type and availability
 
 import os
 import json
-from typing import Dict, List, Optional, Any
+import time
+import asyncio
+import hashlib
+import statistics
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Callable, Dict, List, Optional, Any, Union
 from enum import Enum
 
 # Import providers with graceful fallback
@@ -50,6 +55,55 @@ except ImportError:
     GROQ_AVAILABLE = False
     print("[WARN] groq not installed (pip install groq)")
 
+# Put between the static and per-turn parts of a system prompt. Anthropic gets everything
+# before it as a cached block; other providers just lose the marker (OpenAI, Gemini and
+# Groq cache stable prompt prefixes on their own)
+PROMPT_CACHE_BREAK = "<<prompt-cache-break>>"
+_EPHEMERAL = {"type": "ephemeral"}
+
+
+class ToolSet(list):
+    """
+    Claude-format tool schemas (read-only) plus their compiled per-provider forms
+
+    Get one with tool_set(tools): equal lists — by content hash — share one
+    ToolSet, so the OpenAI/Groq function format and Gemini FunctionDeclarations
+    are built once per distinct tool list instead of on every request. It is
+    still a list, so anything that only reads the tools keeps working.
+    """
+
+    def __init__(self, tools: List[Dict], digest: str):
+        super().__init__(tools)
+        self.digest = digest
+        self._compiled: Dict[str, Any] = {}
+
+    def compiled(self, fmt: str, build):
+        """build(self) for this provider format, computed on first use"""
+        if fmt not in self._compiled:
+            self._compiled[fmt] = build(self)
+        return self._compiled[fmt]
+
+
+_TOOL_SETS: "OrderedDict[str, ToolSet]" = OrderedDict()
+_MAX_TOOL_SETS = 32
+
+
+def tool_set(tools: Optional[List[Dict]]) -> Optional[ToolSet]:
+    """The shared ToolSet for a list of Claude-format tools (None and ToolSets pass through)"""
+    if tools is None or isinstance(tools, ToolSet):
+        return tools
+    tools = list(tools)
+    digest = hashlib.sha256(json.dumps(tools, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    cached = _TOOL_SETS.get(digest)
+    if cached is None:
+        cached = _TOOL_SETS[digest] = ToolSet(tools, digest)
+        if len(_TOOL_SETS) > _MAX_TOOL_SETS:
+            _TOOL_SETS.popitem(last=False)
+    else:
+        _TOOL_SETS.move_to_end(digest)
+    return cached
+
+
 class TaskType(Enum):
     CODE = "code"
     CHAT = "chat"
@@ -65,6 +119,128 @@ class ModelProvider(Enum):
     OLLAMA = "ollama"
     GROQ = "groq"
 
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+# Provider health: rolling window of recent calls per provider
+_HEALTH_WINDOW = 50
+_DEFAULT_LATENCY = 5.0       # seconds assumed for a provider with no calls yet
+_ERROR_PENALTY = 4.0         # score multiplier per unit of error rate
+_MAX_COOLDOWN = 1800.0       # failed half-open probes double the cooldown up to this
+_BILLING_KEYWORDS = ("credit", "billing", "payment", "insufficient")
+_HEDGE_MIN_SAMPLES = 5       # latencies needed before the percentile is trusted
+
+
+class ProviderHealth:
+    """
+    Circuit breaker + rolling latency/error score for one provider
+
+    closed → open after VESPER_BREAKER_FAILURES consecutive failures (or at once
+    on a billing/credit error, with the longer billing cooldown); once the
+    cooldown has passed the breaker is half-open and lets one probe call
+    through — success closes it, failure reopens it with twice the cooldown.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.failures = 0               # consecutive
+        self.opened_at: Optional[float] = None
+        self.cooldown = 0.0
+        self.reason = ""
+        self.warning: Optional[str] = None  # user-visible note while open
+        self.probe_started: Optional[float] = None
+        self.latencies: deque = deque(maxlen=_HEALTH_WINDOW)     # full responses (chat)
+        self.first_tokens: deque = deque(maxlen=_HEALTH_WINDOW)  # time to first token (chat_stream)
+        self.outcomes: deque = deque(maxlen=_HEALTH_WINDOW)
+
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.time() - self.opened_at < self.cooldown else "half_open"
+
+    def allow(self) -> bool:
+        """Whether a call may go out now — claims the probe slot when half-open"""
+        state = self.state()
+        if state == "closed":
+            return True
+        if state == "open":
+            return False
+        now = time.time()
+        # A probe that never reported back (cancelled call) frees the slot after one cooldown
+        if self.probe_started is not None and now - self.probe_started < self.cooldown:
+            return False
+        self.probe_started = now
+        return True
+
+    def record_success(self, latency: float, first_token: bool = False):
+        if self.opened_at is not None:
+            print(f"[OK] {self.name} circuit closed again")
+        self.failures = 0
+        self.opened_at = self.probe_started = None
+        self.reason, self.warning = "", None
+        (self.first_tokens if first_token else self.latencies).append(latency)
+        self.outcomes.append(True)
+
+    def record_failure(self, error: str, warning: Optional[str] = None):
+        was_probe = self.state() == "half_open"
+        self.failures += 1
+        self.outcomes.append(False)
+        self.probe_started = None
+        billing = any(kw in error.lower() for kw in _BILLING_KEYWORDS)
+        if was_probe:
+            self.cooldown = min(self.cooldown * 2, _MAX_COOLDOWN)
+        elif billing:
+            self.cooldown = _env_float("VESPER_BREAKER_BILLING_COOLDOWN", 900)
+        elif self.failures >= _env_float("VESPER_BREAKER_FAILURES", 3):
+            self.cooldown = _env_float("VESPER_BREAKER_COOLDOWN", 60)
+        else:
+            return
+        self.opened_at = time.time()
+        self.reason = error[:200]
+        self.warning = warning
+        print(f"[WARN] {self.name} circuit open for {self.cooldown:.0f}s — {self.reason}")
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def score(self, first_token: bool = False) -> float:
+        """Expected seconds until the user sees an answer — the median full-response (or, for
+        streaming, first-token) latency, inflated by the recent error rate. Lower is better"""
+        samples = self.first_tokens if first_token else self.latencies
+        latency = statistics.median(samples) if samples else _DEFAULT_LATENCY
+        return latency * (1 + _ERROR_PENALTY * self.error_rate())
+
+    def hedge_delay(self, first_token: bool = False) -> float:
+        """Seconds to wait on this provider before hedging: the VESPER_HEDGE_PERCENTILE of its
+        recent (first-token) latencies, never below VESPER_HEDGE_MIN_DELAY"""
+        samples = sorted(self.first_tokens if first_token else self.latencies)
+        floor = _env_float("VESPER_HEDGE_MIN_DELAY", 1.0)
+        if len(samples) < _HEDGE_MIN_SAMPLES:
+            return max(floor, _DEFAULT_LATENCY)
+        pct = min(100.0, max(0.0, _env_float("VESPER_HEDGE_PERCENTILE", 90)))
+        rank = max(0, int(-(-pct * len(samples) // 100)) - 1)  # nearest-rank percentile
+        return max(floor, samples[rank])
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state()
+        return {
+            "state": state,
+            "consecutive_failures": self.failures,
+            "retry_in": round(self.opened_at + self.cooldown - time.time(), 1) if state == "open" else 0,
+            "reason": self.reason or None,
+            "median_latency": round(statistics.median(self.latencies), 3) if self.latencies else None,
+            "median_first_token": round(statistics.median(self.first_tokens), 3) if self.first_tokens else None,
+            "error_rate": round(self.error_rate(), 3),
+            "score": round(self.score(), 3),
+            "stream_score": round(self.score(first_token=True), 3),
+        }
+
+
 class AIRouter:
     """Intelligent AI model router with fallback support"""
     
@@ -75,6 +251,7 @@ class AIRouter:
         self.google_client = None  # Changed from google_configured to google_client
         self.ollama_available = False
         self.groq_client = None
+        self.health = {p: ProviderHealth(p.value) for p in ModelProvider}
         
         # Detect environment: local vs production
         self.is_local = self._detect_local_environment()
@@ -201,11 +378,23 @@ class AIRouter:
         }
     
     def get_available_provider(self, task_type: TaskType) -> Optional[ModelProvider]:
-        """Get first available provider for task type"""
-        for provider in self.routing_strategy[task_type]:
-            if self.is_provider_available(provider):
-                return provider
-        return None
+        """Get first available provider for task type (skipping open circuits unless all are open)"""
+        order = self._provider_order(task_type)
+        return next((p for p in order if self.health[p].state() != "open"), order[0] if order else None)
+
+    def _provider_order(self, task_type: TaskType, preferred_provider: Optional[ModelProvider] = None,
+                        exclude=(), streaming: bool = False) -> List[ModelProvider]:
+        """
+        Providers to try for one request: the preferred one (or the first in the static
+        routing order), then every other available provider with a closed or half-open
+        circuit, best health score first (first-token score when streaming) — ties keep
+        the static order
+        """
+        static = [p for p in self.routing_strategy[task_type] if self.is_provider_available(p)]
+        head = preferred_provider or (static[0] if static else None)
+        rest = [p for p in static if p != head and p not in exclude and self.health[p].state() != "open"]
+        rest.sort(key=lambda p: self.health[p].score(first_token=streaming))
+        return ([head] if head else []) + rest
     
     def is_provider_available(self, provider: ModelProvider) -> bool:
         """Check if provider is configured and available"""
@@ -223,13 +412,14 @@ class AIRouter:
     
     async def chat(
         self,
-        messages: List[Dict[str, str]],
+        messages: Union[List[Dict[str, str]], Callable[[ModelProvider, str], List[Dict]]],
         task_type: TaskType = TaskType.CHAT,
         tools: Optional[List[Dict]] = None,
         max_tokens: int = 4096,
         temperature: float = 0.7,
         preferred_provider: Optional[ModelProvider] = None,
         model_override: Optional[str] = None,
+        hedge: bool = False,
         _tried_providers: Optional[set] = None,
         _errors: Optional[list] = None,
         _warnings: Optional[list] = None
@@ -238,114 +428,395 @@ class AIRouter:
         Route chat request to best available provider
         
         Args:
-            messages: Chat messages in standard format
+            messages: Chat messages in standard format, or a callable (provider, model) → messages
+                so each provider tried (fallback, hedge) gets a prompt packed for its own window
             task_type: Type of task (code, chat, search, etc.)
-            tools: Function calling tools (Claude/OpenAI format)
+            tools: Function calling tools (Claude format) — a list, or better the ToolSet from
+                tool_set() so the per-provider conversions are reused
             max_tokens: Max response tokens
             temperature: Response randomness (0-1)
             preferred_provider: Override automatic routing
-            _tried_providers: Internal — tracks failed providers to prevent recursion loops
-            _errors: Internal — collects errors from all failed providers
+            hedge: Latency-critical turn — if the provider hasn't answered within its
+                hedge_delay(), ask the next one too and take whichever answers first
+                (only when no provider is pinned, at most one extra request)
+            _tried_providers: Providers to leave out of the fallback list
+            _errors: Errors to report ahead of this call's own
+        
+        Providers whose circuit breaker is open are skipped without a round trip;
+        fallbacks are ordered by recent latency and error rate (see ProviderHealth).
         
         Returns:
             Standardized response with content, provider info, usage stats
         """
-        if _tried_providers is None:
-            _tried_providers = set()
-        elif not isinstance(_tried_providers, set):
-            _tried_providers = set(_tried_providers)  # guard: convert list → set if corrupted
-        if _errors is None:
-            _errors = []
-        if _warnings is None:
-            _warnings = []
-        
-        # Get provider
-        provider = preferred_provider if preferred_provider else self.get_available_provider(task_type)
-        
-        if not provider:
-            if _errors:
-                error_summary = " | ".join(_errors)
-                return {"error": f"All providers failed: {error_summary}", "provider": None, "model": None}
-            return {
+        tools = tool_set(tools)
+        errors = list(_errors or [])
+        warnings = list(_warnings or [])
+        attempts = self._attempts(
+            self._provider_order(task_type, preferred_provider, set(_tried_providers or ())),
+            model_override, errors, warnings)
+        hedges = 1 if hedge and preferred_provider is None else 0
+        running: Dict[asyncio.Task, tuple] = {}  # call → (provider, model, started)
+        result = None
+        last = None
+
+        def launch(provider, model):
+            task = asyncio.create_task(self._provider_call(provider, messages, model, tools, max_tokens, temperature))
+            running[task] = (provider, model, time.time())
+
+        try:
+            while True:
+                if not running:
+                    attempt = next(attempts, None)
+                    if attempt is None:
+                        break
+                    if last is not None:
+                        print(f"[FALLBACK] Falling back to {attempt[0].value}")
+                    last = attempt[0]
+                    launch(*attempt)
+
+                delay = None
+                if hedges and len(running) == 1:
+                    (provider, _, started), = running.values()
+                    hedge_after = self.health[provider].hedge_delay()
+                    delay = max(0.0, started + hedge_after - time.time())
+                done, _ = await asyncio.wait(running, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedges = 0
+                    attempt = next(attempts, None)
+                    if attempt is not None:
+                        print(f"[HEDGE] {provider.value} slower than {hedge_after:.1f}s — also asking {attempt[0].value}")
+                        last = attempt[0]
+                        launch(*attempt)
+                    continue
+
+                # Record every call that finished in this round before picking a winner, so a
+                # result that lands alongside the winner's still counts toward its provider's health
+                answered = []
+                for task in sorted(done, key=lambda t: running[t][2]):  # earliest launched wins a tie
+                    provider, model, started = running.pop(task)
+                    health = self.health[provider]
+                    if task.exception() is not None:
+                        e = task.exception()
+                        # Collect error and fall back to the next provider
+                        error_msg = f"{provider.value}: {str(e)[:200]}"
+                        errors.append(error_msg)
+                        print(f"[ERR] {error_msg}")
+
+                        # Detect billing/credit errors and queue a user-visible warning
+                        warning = self._provider_warning(provider, e)
+                        if warning:
+                            warnings.append(warning)
+                        health.record_failure(str(e), warning)
+                        continue
+
+                    # If a provider returns empty content with no tool calls and no error,
+                    # treat it as a soft failure and try the next provider automatically.
+                    # This catches silent failures (e.g. Groq returning None content unexpectedly).
+                    result = task.result()
+                    if not result.get("content") and not result.get("tool_calls") and not result.get("error"):
+                        error_msg = f"{provider.value}: empty response (no content, no tool calls)"
+                        errors.append(error_msg)
+                        print(f"[WARN] {error_msg} — trying next provider")
+                        health.record_failure(error_msg)
+                        continue
+
+                    health.record_success(time.time() - started)
+                    answered.append(result)
+
+                if answered:
+                    result = answered[0]
+                    # Append any billing/credit warnings to the response content so user sees them
+                    if warnings and result.get("content") and not result.get("error"):
+                        warning_block = "\n\n---\n" + "\n".join(f"⚠️ {w}" for w in warnings)
+                        result["content"] = result["content"] + warning_block
+                        result["provider_warnings"] = warnings
+                    return result
+        finally:
+            self._cancel_losers(running)
+
+        if result is not None:
+            return result  # every provider answered empty — caller has its own fallback message
+        if errors:
+            error_summary = " | ".join(errors)
+            return {"error": f"All providers failed: {error_summary}", "provider": last.value if last else None, "model": None}
+        return {
+            "error": "No AI providers configured. Set ANTHROPIC_API_KEY, OPENAI_API_KEY, GOOGLE_API_KEY, or install Ollama.",
+            "provider": None,
+            "model": None
+        }
+
+    def _attempts(self, order: List[ModelProvider], model_override: Optional[str], errors: list, warnings: list):
+        """(provider, model) pairs to call in turn — providers with an open circuit are skipped
+        here, their error (and out-of-credits warning) recorded instead"""
+        for i, provider in enumerate(order):
+            health = self.health[provider]
+            if not health.allow():
+                errors.append(f"{provider.value}: circuit open ({health.reason})")
+                print(f"[SKIP] {provider.value} circuit open — {health.reason}")
+                if health.warning and health.warning not in warnings:
+                    warnings.append(health.warning)
+                continue
+            yield provider, (model_override if model_override and i == 0 else self.models[provider])
+
+    @staticmethod
+    def _cancel_losers(tasks):
+        for task in tasks:
+            if task.done():
+                if not task.cancelled():
+                    task.exception()  # retrieved — no "exception never retrieved" noise
+            else:
+                task.cancel()
+
+    @staticmethod
+    def _messages_for(messages, provider: ModelProvider, model: str) -> List[Dict]:
+        return messages(provider, model) if callable(messages) else messages
+
+    async def _provider_call(self, provider, messages, model, tools, max_tokens, temperature) -> Dict[str, Any]:
+        messages = self._messages_for(messages, provider, model)
+        if provider != ModelProvider.ANTHROPIC:
+            messages = self._without_cache_break(messages)
+        if provider == ModelProvider.ANTHROPIC:
+            return await self._chat_anthropic(messages, model, tools, max_tokens, temperature)
+        elif provider == ModelProvider.OPENAI:
+            return await self._chat_openai(messages, model, tools, max_tokens, temperature)
+        elif provider == ModelProvider.GOOGLE:
+            return await self._chat_google(messages, model, tools, max_tokens, temperature)
+        elif provider == ModelProvider.OLLAMA:
+            return await self._chat_ollama(messages, model, max_tokens, temperature)
+        elif provider == ModelProvider.GROQ:
+            return await self._chat_groq(messages, model, tools, max_tokens, temperature)
+        raise ValueError(f"Unknown provider: {provider}")
+    
+    @staticmethod
+    def _provider_warning(provider: ModelProvider, error: Exception) -> Optional[str]:
+        """User-visible note for billing / overload / rate-limit failures, None for other errors"""
+        err_lower = str(error).lower()
+        BILLING_KEYWORDS = (
+            "credit", "billing", "payment", "quota", "insufficient_quota",
+            "credit_balance", "overloaded", "rate_limit", "too_many_requests"
+        )
+        if not any(kw in err_lower for kw in BILLING_KEYWORDS):
+            return None
+        provider_names = {
+            "anthropic": "Anthropic (Claude)",
+            "openai": "OpenAI",
+            "google": "Google (Gemini)",
+            "groq": "Groq",
+            "ollama": "Ollama",
+        }
+        friendly = provider_names.get(provider.value, provider.value)
+        if "credit" in err_lower or "billing" in err_lower or "payment" in err_lower or "insufficient" in err_lower:
+            return f"{friendly} is out of credits — switched providers. Add credits at your provider dashboard to restore it."
+        elif "overloaded" in err_lower:
+            return f"{friendly} is currently overloaded — switched providers temporarily."
+        elif "rate_limit" in err_lower or "too_many" in err_lower:
+            return f"{friendly} hit its rate limit — switched providers temporarily."
+        return None
+
+    async def chat_stream(
+        self,
+        messages: Union[List[Dict[str, str]], Callable[[ModelProvider, str], List[Dict]]],
+        task_type: TaskType = TaskType.CHAT,
+        tools: Optional[List[Dict]] = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        preferred_provider: Optional[ModelProvider] = None,
+        model_override: Optional[str] = None,
+        hedge: bool = False,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming chat(): same routing and fallback, but yields events as the provider produces them
+
+            {"type": "provider", "provider": ..., "model": ...}   before the first text of the answering provider
+            {"type": "text", "text": delta}
+            {"type": "tool_call", "id": ..., "name": ..., "input": {...}}   once the answer is complete
+            {"type": "done", "result": {...}}   always last — exactly what chat() would have returned
+
+        A provider that fails (or answers empty) before streaming any text is replaced by the
+        next one like in chat(); a failure after text went out ends the stream with the partial
+        content and an "error" in the result. With hedge, a provider that hasn't produced its
+        first token within its hedge_delay() gets raced against the next one; the first to
+        produce output is streamed and the other cancelled.
+        """
+        tools = tool_set(tools)
+        errors, warnings = [], []
+        attempts = self._attempts(self._provider_order(task_type, preferred_provider, streaming=True),
+                                  model_override, errors, warnings)
+        hedges = 1 if hedge and preferred_provider is None else 0
+        racing: Dict[asyncio.Future, Dict[str, Any]] = {}  # pending queue.get() → attempt
+        launched: List[Dict[str, Any]] = []
+        winner = first = None
+        last_result = None
+        last = None
+
+        def launch(provider, model):
+            queue: asyncio.Queue = asyncio.Queue()
+            attempt = {"provider": provider, "model": model, "started": time.time(), "queue": queue,
+                       "pump": asyncio.create_task(self._pump_stream(
+                           queue, provider, messages, model, tools, max_tokens, temperature))}
+            launched.append(attempt)
+            racing[asyncio.ensure_future(queue.get())] = attempt
+
+        def failed(attempt, error_msg, error=None):
+            provider = attempt["provider"]
+            errors.append(error_msg)
+            warning = self._provider_warning(provider, error) if error is not None else None
+            if warning:
+                warnings.append(warning)
+            self.health[provider].record_failure(str(error) if error is not None else error_msg, warning)
+
+        try:
+            # Race for the first output: one provider at a time, or two once a hedge fires
+            while winner is None:
+                if not racing:
+                    attempt = next(attempts, None)
+                    if attempt is None:
+                        break
+                    if last is not None:
+                        print(f"[FALLBACK] Falling back to {attempt[0].value}")
+                    last = attempt[0]
+                    launch(*attempt)
+
+                delay = None
+                if hedges and len(racing) == 1:
+                    slow, = racing.values()
+                    hedge_after = self.health[slow["provider"]].hedge_delay(True)
+                    delay = max(0.0, slow["started"] + hedge_after - time.time())
+                done, _ = await asyncio.wait(racing, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedges = 0
+                    attempt = next(attempts, None)
+                    if attempt is not None:
+                        print(f"[HEDGE] {slow['provider'].value} no first token after {hedge_after:.1f}s — also asking {attempt[0].value}")
+                        last = attempt[0]
+                        launch(*attempt)
+                    continue
+
+                # Every attempt that reported in this round is recorded, winner or not
+                for getter in sorted(done, key=lambda g: racing[g]["started"]):  # earliest launched wins a tie
+                    attempt = racing.pop(getter)
+                    event = getter.result()
+                    provider = attempt["provider"]
+                    if event["type"] == "text" and not event["text"]:
+                        if winner is None:
+                            racing[asyncio.ensure_future(attempt["queue"].get())] = attempt
+                    elif event["type"] == "error":
+                        e = event["error"]
+                        error_msg = f"{provider.value}: {str(e)[:200]}"
+                        print(f"[ERR] {error_msg}")
+                        failed(attempt, error_msg, e)
+                    elif event["type"] == "result" and not (event["result"].get("content") or event["result"].get("tool_calls")):
+                        last_result = event["result"]
+                        error_msg = f"{provider.value}: empty response (no content, no tool calls)"
+                        print(f"[WARN] {error_msg} — trying next provider")
+                        failed(attempt, error_msg)
+                    elif winner is None:
+                        winner, first = attempt, event
+                    else:
+                        # Lost the race with output ready — its first-token time is still a sample
+                        self.health[provider].record_success(time.time() - attempt["started"], first_token=True)
+            self._cancel_losers(list(racing) + [a["pump"] for a in launched if a is not winner])
+            racing.clear()
+
+            if winner is not None:
+                provider, model = winner["provider"], winner["model"]
+                health = self.health[provider]
+                first_token = time.time() - winner["started"]
+                yield {"type": "provider", "provider": provider.value, "model": model}
+                sent: List[str] = []
+                event = first
+                while True:
+                    if event["type"] == "text" and event["text"]:
+                        sent.append(event["text"])
+                        yield event
+                    elif event["type"] == "error":
+                        e = event["error"]
+                        error_msg = f"{provider.value}: {str(e)[:200]}"
+                        errors.append(error_msg)
+                        print(f"[ERR] {error_msg}")
+                        health.record_failure(str(e), self._provider_warning(provider, e))
+                        yield {"type": "done", "result": {
+                            "content": "".join(sent), "provider": provider.value, "model": model,
+                            "usage": {"input_tokens": 0, "output_tokens": 0}, "tool_calls": [],
+                            "error": f"Stream interrupted: {error_msg}",
+                        }}
+                        return
+                    elif event["type"] == "result":
+                        break
+                    event = await winner["queue"].get()
+
+                result = event["result"]
+                health.record_success(first_token, first_token=True)
+                if result.get("content") and not sent:
+                    yield {"type": "text", "text": result["content"]}
+                if warnings and result.get("content"):
+                    warning_block = "\n\n---\n" + "\n".join(f"⚠️ {w}" for w in warnings)
+                    yield {"type": "text", "text": warning_block}
+                    result["content"] = result["content"] + warning_block
+                    result["provider_warnings"] = warnings
+                for call in result.get("tool_calls") or []:
+                    yield {"type": "tool_call", **call}
+                yield {"type": "done", "result": result}
+                return
+        finally:
+            self._cancel_losers(list(racing) + [a["pump"] for a in launched])
+
+        if last_result is not None:
+            yield {"type": "done", "result": last_result}  # every provider answered empty — same as chat()
+        elif errors:
+            yield {"type": "done", "result": {"error": f"All providers failed: {' | '.join(errors)}", "provider": None, "model": None}}
+        else:
+            yield {"type": "done", "result": {
                 "error": "No AI providers configured. Set ANTHROPIC_API_KEY, OPENAI_API_KEY, GOOGLE_API_KEY, or install Ollama.",
                 "provider": None,
                 "model": None
-            }
-        
-        _tried_providers.add(provider)
-        model = model_override if model_override else self.models[provider]
-        
+            }}
+
+    async def _pump_stream(self, queue: asyncio.Queue, provider, messages, model, tools, max_tokens, temperature):
+        """Feed one provider stream's events into queue; an exception becomes a final {"type": "error"}"""
         try:
-            if provider == ModelProvider.ANTHROPIC:
-                result = await self._chat_anthropic(messages, model, tools, max_tokens, temperature)
-            elif provider == ModelProvider.OPENAI:
-                result = await self._chat_openai(messages, model, tools, max_tokens, temperature)
-            elif provider == ModelProvider.GOOGLE:
-                result = await self._chat_google(messages, model, tools, max_tokens, temperature)
-            elif provider == ModelProvider.OLLAMA:
-                result = await self._chat_ollama(messages, model, max_tokens, temperature)
-            elif provider == ModelProvider.GROQ:
-                result = await self._chat_groq(messages, model, tools, max_tokens, temperature)
-            else:
-                return {"error": f"Unknown provider: {provider}", "provider": None, "model": model}
-
-            # If a provider returns empty content with no tool calls and no error,
-            # treat it as a soft failure and try the next provider automatically.
-            # This catches silent failures (e.g. Groq returning None content unexpectedly).
-            if not result.get("content") and not result.get("tool_calls") and not result.get("error"):
-                error_msg = f"{provider.value}: empty response (no content, no tool calls)"
-                _errors.append(error_msg)
-                print(f"[WARN] {error_msg} — trying next provider")
-                fallback_providers = [p for p in self.routing_strategy[task_type] if p not in _tried_providers and self.is_provider_available(p)]
-                if fallback_providers:
-                    print(f"[FALLBACK] {provider.value} gave empty response → trying {fallback_providers[0].value}")
-                    return await self.chat(messages, task_type, tools, max_tokens, temperature, preferred_provider=fallback_providers[0], _tried_providers=_tried_providers, _errors=_errors, _warnings=_warnings)
-                # All providers exhausted — return result as-is (caller has its own fallback message)
-
-            # Append any billing/credit warnings to the response content so user sees them
-            if _warnings and result.get("content") and not result.get("error"):
-                warning_block = "\n\n---\n" + "\n".join(f"⚠️ {w}" for w in _warnings)
-                result["content"] = result["content"] + warning_block
-                result["provider_warnings"] = _warnings
-
-            return result
+            async for event in self._provider_stream(provider, messages, model, tools, max_tokens, temperature):
+                queue.put_nowait(event)
         except Exception as e:
-            # Collect error and fallback to next provider (excluding ALL previously tried ones)
-            error_msg = f"{provider.value}: {str(e)[:200]}"
-            _errors.append(error_msg)
-            print(f"[ERR] {error_msg}")
-
-            # Detect billing/credit errors and queue a user-visible warning
-            err_lower = str(e).lower()
-            BILLING_KEYWORDS = (
-                "credit", "billing", "payment", "quota", "insufficient_quota",
-                "credit_balance", "overloaded", "rate_limit", "too_many_requests"
-            )
-            if any(kw in err_lower for kw in BILLING_KEYWORDS):
-                provider_names = {
-                    "anthropic": "Anthropic (Claude)",
-                    "openai": "OpenAI",
-                    "google": "Google (Gemini)",
-                    "groq": "Groq",
-                    "ollama": "Ollama",
-                }
-                friendly = provider_names.get(provider.value, provider.value)
-                if "credit" in err_lower or "billing" in err_lower or "payment" in err_lower or "insufficient" in err_lower:
-                    _warnings.append(f"{friendly} is out of credits — switched providers. Add credits at your provider dashboard to restore it.")
-                elif "overloaded" in err_lower:
-                    _warnings.append(f"{friendly} is currently overloaded — switched providers temporarily.")
-                elif "rate_limit" in err_lower or "too_many" in err_lower:
-                    _warnings.append(f"{friendly} hit its rate limit — switched providers temporarily.")
-
-            fallback_providers = [p for p in self.routing_strategy[task_type] if p not in _tried_providers and self.is_provider_available(p)]
-            if fallback_providers:
-                print(f"[FALLBACK] Falling back to {fallback_providers[0].value}")
-                return await self.chat(messages, task_type, tools, max_tokens, temperature, preferred_provider=fallback_providers[0], _tried_providers=_tried_providers, _errors=_errors, _warnings=_warnings)
-            error_summary = " | ".join(_errors)
-            return {"error": f"All providers failed: {error_summary}", "provider": provider.value, "model": model}
-    
+            queue.put_nowait({"type": "error", "error": e})
+
+    def _provider_stream(self, provider, messages, model, tools, max_tokens, temperature) -> AsyncIterator[Dict]:
+        """Provider streaming call: {"type": "text", "text"} deltas, then one {"type": "result", "result"}"""
+        messages = self._messages_for(messages, provider, model)
+        if provider != ModelProvider.ANTHROPIC:
+            messages = self._without_cache_break(messages)
+        if provider == ModelProvider.ANTHROPIC:
+            return self._stream_anthropic(messages, model, tools, max_tokens, temperature)
+        if provider == ModelProvider.OPENAI:
+            return self._stream_openai_compatible(
+                self.openai_client, self._openai_request(messages, model, tools, max_tokens, temperature),
+                ModelProvider.OPENAI, model)
+        if provider == ModelProvider.GROQ:
+            return self._stream_openai_compatible(
+                self.groq_client, self._groq_request(messages, model, tools, max_tokens, temperature),
+                ModelProvider.GROQ, model)
+        if provider == ModelProvider.GOOGLE:
+            return self._stream_google(messages, model, tools, max_tokens, temperature)
+        if provider == ModelProvider.OLLAMA:
+            return self._stream_ollama(messages, model, max_tokens, temperature)
+        raise ValueError(f"Unknown provider: {provider}")
+
     async def _chat_anthropic(self, messages, model, tools, max_tokens, temperature):
         """Chat with Anthropic Claude"""
+        kwargs = self._anthropic_request(messages, model, tools, max_tokens, temperature)
+        response = await self.anthropic_client.messages.create(**kwargs)
+        return self._anthropic_result(response, model)
+
+    async def _stream_anthropic(self, messages, model, tools, max_tokens, temperature):
+        kwargs = self._anthropic_request(messages, model, tools, max_tokens, temperature)
+        async with self.anthropic_client.messages.stream(**kwargs) as stream:
+            async for event in stream:
+                if event.type == "text":
+                    yield {"type": "text", "text": event.text}
+            response = await stream.get_final_message()
+        yield {"type": "result", "result": self._anthropic_result(response, model)}
+
+    def _anthropic_request(self, messages, model, tools, max_tokens, temperature) -> Dict[str, Any]:
         # Convert messages to Claude format
         system_msg = next((m["content"] for m in messages if m["role"] == "system"), None)
         
@@ -388,12 +859,42 @@ class AIRouter:
         }
         
         if system_msg:
-            kwargs["system"] = system_msg
+            kwargs["system"] = self._anthropic_system(system_msg)
         if tools:
-            kwargs["tools"] = tools
-        
-        response = await self.anthropic_client.messages.create(**kwargs)
-        
+            kwargs["tools"] = tool_set(tools).compiled("anthropic", self._anthropic_tools)
+        return kwargs
+
+    @staticmethod
+    def _anthropic_tools(tools: ToolSet) -> List[Dict]:
+        # Tools come first in Claude's prompt — a breakpoint on the last one caches them all
+        return tools[:-1] + [dict(tools[-1], cache_control=_EPHEMERAL)]
+
+    @staticmethod
+    def _anthropic_system(system_msg):
+        """System prompt as text blocks, the part before PROMPT_CACHE_BREAK marked cacheable"""
+        if not isinstance(system_msg, str) or PROMPT_CACHE_BREAK not in system_msg:
+            return system_msg
+        static, _, dynamic = system_msg.partition(PROMPT_CACHE_BREAK)
+        blocks = [{"type": "text", "text": static.strip(), "cache_control": _EPHEMERAL}]
+        if dynamic.strip():
+            blocks.append({"type": "text", "text": dynamic.strip()})
+        return blocks
+
+    @staticmethod
+    def _without_cache_break(messages):
+        """Messages with PROMPT_CACHE_BREAK removed from the system prompt"""
+        if not any(m.get("role") == "system" and isinstance(m.get("content"), str)
+                   and PROMPT_CACHE_BREAK in m["content"] for m in messages):
+            return messages
+        cleaned = []
+        for m in messages:
+            if m.get("role") == "system" and isinstance(m.get("content"), str) and PROMPT_CACHE_BREAK in m["content"]:
+                static, _, dynamic = m["content"].partition(PROMPT_CACHE_BREAK)
+                m = dict(m, content="\n\n".join(p.strip() for p in (static, dynamic) if p.strip()))
+            cleaned.append(m)
+        return cleaned
+
+    def _anthropic_result(self, response, model) -> Dict[str, Any]:
         # Extract content (join all text blocks)
         content_text = ""
         if hasattr(response, "content") and response.content:
@@ -416,8 +917,10 @@ class AIRouter:
             "provider": ModelProvider.ANTHROPIC.value,
             "model": model,
             "usage": {
-                "input_tokens": response.usage.input_tokens,
-                "output_tokens": response.usage.output_tokens
+                "input_tokens": response.usage.input_tokens,  # uncached part of the prompt only
+                "output_tokens": response.usage.output_tokens,
+                "cache_read_tokens": getattr(response.usage, "cache_read_input_tokens", 0) or 0,
+                "cache_write_tokens": getattr(response.usage, "cache_creation_input_tokens", 0) or 0,
             },
             "tool_calls": tool_calls
         }
@@ -454,26 +957,7 @@ class AIRouter:
 
     async def _chat_openai(self, messages, model, tools, max_tokens, temperature):
         """Chat with OpenAI GPT"""
-        messages = self._sanitize_messages_for_openai(messages)
-        # o1/o3 and gpt-5.x (reasoning) models use max_completion_tokens, not max_tokens.
-        # They also don't support temperature, frequency_penalty, or presence_penalty.
-        is_reasoning = model.startswith(("o1", "o3", "o4", "gpt-5"))
-        tokens_key = "max_completion_tokens" if is_reasoning else "max_tokens"
-        kwargs = {
-            "model": model,
-            "messages": messages,
-            tokens_key: max_tokens,
-        }
-        if not is_reasoning:
-            kwargs["temperature"] = temperature
-            kwargs["frequency_penalty"] = 0.5
-            kwargs["presence_penalty"] = 0.5
-        
-        if tools:
-            # Convert Claude tools to OpenAI format
-            openai_tools = [self._convert_tool_to_openai(tool) for tool in tools]
-            kwargs["tools"] = openai_tools
-        
+        kwargs = self._openai_request(messages, model, tools, max_tokens, temperature)
         response = await self.openai_client.chat.completions.create(**kwargs)
         
         tool_calls = []
@@ -494,15 +978,115 @@ class AIRouter:
             "content": response.choices[0].message.content or "",
             "provider": ModelProvider.OPENAI.value,
             "model": model,
-            "usage": {
-                "input_tokens": response.usage.prompt_tokens,
-                "output_tokens": response.usage.completion_tokens
-            },
+            "usage": self._openai_usage(response.usage),
             "tool_calls": tool_calls
         }
+
+    def _openai_request(self, messages, model, tools, max_tokens, temperature) -> Dict[str, Any]:
+        messages = self._sanitize_messages_for_openai(messages)
+        # o1/o3 and gpt-5.x (reasoning) models use max_completion_tokens, not max_tokens.
+        # They also don't support temperature, frequency_penalty, or presence_penalty.
+        is_reasoning = model.startswith(("o1", "o3", "o4", "gpt-5"))
+        tokens_key = "max_completion_tokens" if is_reasoning else "max_tokens"
+        kwargs = {
+            "model": model,
+            "messages": messages,
+            tokens_key: max_tokens,
+        }
+        if not is_reasoning:
+            kwargs["temperature"] = temperature
+            kwargs["frequency_penalty"] = 0.5
+            kwargs["presence_penalty"] = 0.5
+        
+        if tools:
+            # Claude tools in OpenAI format, converted once per tool set
+            kwargs["tools"] = tool_set(tools).compiled("openai", self._openai_tools)
+        return kwargs
+
+    @staticmethod
+    def _openai_usage(usage) -> Dict[str, int]:
+        """Usage dict from a chat.completions usage object (OpenAI, Groq); prompt caching is automatic
+        there and input_tokens includes the cached part"""
+        details = getattr(usage, "prompt_tokens_details", None)
+        return {
+            "input_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            "cache_read_tokens": getattr(details, "cached_tokens", 0) or 0,
+        }
+
+    async def _stream_openai_compatible(self, client, kwargs, provider: ModelProvider, model):
+        """Streamed chat.completions (OpenAI, Groq): text deltas as they come, tool calls
+        assembled from their argument fragments"""
+        kwargs = dict(kwargs, stream=True)
+        if provider == ModelProvider.OPENAI:
+            kwargs["stream_options"] = {"include_usage": True}
+        stream = await client.chat.completions.create(**kwargs)
+        content: List[str] = []
+        calls: Dict[int, Dict[str, Any]] = {}
+        usage = None
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content.append(delta.content)
+                yield {"type": "text", "text": delta.content}
+            for tc in getattr(delta, "tool_calls", None) or []:
+                call = calls.setdefault(tc.index, {"id": None, "name": None, "arguments": ""})
+                call["id"] = tc.id or call["id"]
+                if tc.function is not None:
+                    call["name"] = tc.function.name or call["name"]
+                    call["arguments"] += tc.function.arguments or ""
+        tool_calls = []
+        for _, call in sorted(calls.items()):
+            try:
+                parsed = json.loads(call["arguments"]) if call["arguments"] else {}
+            except Exception:
+                parsed = {"raw": call["arguments"]}
+            tool_calls.append({"id": call["id"], "name": call["name"], "input": parsed})
+        yield {"type": "result", "result": {
+            "content": "".join(content),
+            "provider": provider.value,
+            "model": model,
+            "usage": self._openai_usage(usage),
+            "tool_calls": tool_calls,
+        }}
     
     async def _chat_google(self, messages, model, tools, max_tokens, temperature):
         """Chat with Google Gemini using new google-genai SDK with full function calling support."""
+        contents, config = self._google_request(messages, tools, max_tokens, temperature)
+        import asyncio as _asyncio
+        response = await _asyncio.to_thread(
+            self.google_client.models.generate_content,
+            model=model,
+            contents=contents,
+            config=config
+        )
+        return self._google_result([response], model)
+
+    async def _stream_google(self, messages, model, tools, max_tokens, temperature):
+        contents, config = self._google_request(messages, tools, max_tokens, temperature)
+        stream = await self.google_client.aio.models.generate_content_stream(
+            model=model, contents=contents, config=config)
+        chunks = []
+        async for chunk in stream:
+            chunks.append(chunk)
+            text = self._google_text(chunk)
+            if text:
+                yield {"type": "text", "text": text}
+        yield {"type": "result", "result": self._google_result(chunks, model)}
+
+    @staticmethod
+    def _google_text(response) -> str:
+        try:
+            return response.text or ""
+        except Exception:
+            # response.text raises if there are only function calls or safety blocks
+            return ""
+
+    def _google_request(self, messages, tools, max_tokens, temperature):
+        """(contents, config) for generate_content"""
         # Extract system message for system_instruction
         system_msg = None
         contents = []
@@ -530,44 +1114,8 @@ class AIRouter:
             else:
                 contents.append({"role": role, "parts": [{"text": str(raw)}]})
 
-        # Add function declarations if tools are provided (before building config)
-        _google_tool_list = None
-        if tools:
-            def _sanitize_schema(s):
-                """Recursively ensure every object-type node has a 'properties' key.
-                Gemini's SDK raises ValueError on any object without properties."""
-                if not isinstance(s, dict):
-                    return s
-                s = dict(s)
-                if s.get("type") == "object" and "properties" not in s:
-                    s["properties"] = {}
-                if "properties" in s:
-                    s["properties"] = {k: _sanitize_schema(v) for k, v in s["properties"].items()}
-                if "items" in s:
-                    s["items"] = _sanitize_schema(s["items"])
-                return s
-
-            try:
-                from google.genai import types as _gtypes
-                func_decls = []
-                google_tools_failed = []
-                for tool in tools:
-                    try:
-                        schema = _sanitize_schema(dict(tool.get("input_schema", {})))
-                        func_decls.append(_gtypes.FunctionDeclaration(
-                            name=tool["name"],
-                            description=tool.get("description", ""),
-                            parameters=schema,
-                        ))
-                    except Exception as _te_single:
-                        google_tools_failed.append(f"{tool['name']}: {_te_single}")
-                if google_tools_failed:
-                    print(f"[WARN] Google tool decl failed for {len(google_tools_failed)} tool(s): {google_tools_failed[:3]}")
-                if func_decls:
-                    _google_tool_list = [_gtypes.Tool(function_declarations=func_decls)]
-                    print(f"[OK] Google tools loaded: {len(func_decls)} ({len(google_tools_failed)} skipped)")
-            except Exception as _te:
-                print(f"[WARN] Google tool setup failed entirely: {_te}")
+        # Function declarations, built once per tool set (before building config)
+        _google_tool_list = tool_set(tools).compiled("google", self._google_tools) if tools else None
 
         # Build typed GenerateContentConfig — raw dict does not reliably serialize Tool objects
         try:
@@ -589,44 +1137,79 @@ class AIRouter:
                 config["system_instruction"] = system_msg
             if _google_tool_list:
                 config["tools"] = _google_tool_list
+        return contents, config
 
-        import asyncio as _asyncio
-        response = await _asyncio.to_thread(
-            self.google_client.models.generate_content,
-            model=model,
-            contents=contents,
-            config=config
-        )
+    @staticmethod
+    def _google_tools(tools: ToolSet):
+        """[types.Tool] with a FunctionDeclaration per tool, or None if none could be built"""
+        def _sanitize_schema(s):
+            """Recursively ensure every object-type node has a 'properties' key.
+            Gemini's SDK raises ValueError on any object without properties."""
+            if not isinstance(s, dict):
+                return s
+            s = dict(s)
+            if s.get("type") == "object" and "properties" not in s:
+                s["properties"] = {}
+            if "properties" in s:
+                s["properties"] = {k: _sanitize_schema(v) for k, v in s["properties"].items()}
+            if "items" in s:
+                s["items"] = _sanitize_schema(s["items"])
+            return s
 
-        # Extract text content safely
-        content_text = ""
         try:
-            content_text = response.text or ""
-        except Exception:
-            # response.text raises if there are only function calls or safety blocks
-            pass
+            from google.genai import types as _gtypes
+            func_decls = []
+            google_tools_failed = []
+            for tool in tools:
+                try:
+                    schema = _sanitize_schema(dict(tool.get("input_schema", {})))
+                    func_decls.append(_gtypes.FunctionDeclaration(
+                        name=tool["name"],
+                        description=tool.get("description", ""),
+                        parameters=schema,
+                    ))
+                except Exception as _te_single:
+                    google_tools_failed.append(f"{tool['name']}: {_te_single}")
+            if google_tools_failed:
+                print(f"[WARN] Google tool decl failed for {len(google_tools_failed)} tool(s): {google_tools_failed[:3]}")
+            if func_decls:
+                print(f"[OK] Google tools compiled: {len(func_decls)} ({len(google_tools_failed)} skipped)")
+                return [_gtypes.Tool(function_declarations=func_decls)]
+        except Exception as _te:
+            print(f"[WARN] Google tool setup failed entirely: {_te}")
+        return None
+
+    def _google_result(self, responses, model) -> Dict[str, Any]:
+        """Result dict from one response, or from every chunk of a streamed one"""
+        # Extract text content safely
+        content_text = "".join(self._google_text(r) for r in responses)
 
         # Extract function calls if any
         tool_calls = []
         try:
-            for candidate in (response.candidates or []):
-                for part in (candidate.content.parts if candidate.content else []):
-                    if hasattr(part, "function_call") and part.function_call:
-                        fc = part.function_call
-                        tool_calls.append({
-                            "id": f"google-{fc.name}-{len(tool_calls)}",
-                            "name": fc.name,
-                            "input": dict(fc.args) if fc.args else {},
-                        })
+            for response in responses:
+                for candidate in (response.candidates or []):
+                    for part in (candidate.content.parts if candidate.content else []) or []:
+                        if hasattr(part, "function_call") and part.function_call:
+                            fc = part.function_call
+                            tool_calls.append({
+                                "id": f"google-{fc.name}-{len(tool_calls)}",
+                                "name": fc.name,
+                                "input": dict(fc.args) if fc.args else {},
+                            })
         except Exception as _tce:
             print(f"[WARN] Google tool call extraction failed: {_tce}")
 
         usage_in = 0
         usage_out = 0
+        usage_cached = 0
         try:
-            if hasattr(response, "usage_metadata") and response.usage_metadata:
-                usage_in = response.usage_metadata.prompt_token_count or 0
-                usage_out = response.usage_metadata.candidates_token_count or 0
+            # Streamed responses report cumulative usage — the last chunk that has it wins
+            for response in responses:
+                if hasattr(response, "usage_metadata") and response.usage_metadata:
+                    usage_in = response.usage_metadata.prompt_token_count or 0
+                    usage_out = response.usage_metadata.candidates_token_count or 0
+                    usage_cached = getattr(response.usage_metadata, "cached_content_token_count", 0) or 0
         except Exception:
             pass
 
@@ -634,7 +1217,7 @@ class AIRouter:
             "content": content_text,
             "provider": ModelProvider.GOOGLE.value,
             "model": model,
-            "usage": {"input_tokens": usage_in, "output_tokens": usage_out},
+            "usage": {"input_tokens": usage_in, "output_tokens": usage_out, "cache_read_tokens": usage_cached},
             "tool_calls": tool_calls,
         }
     
@@ -664,22 +1247,37 @@ class AIRouter:
             },
             "tool_calls": []  # Ollama doesn't support function calling
         }
+
+    async def _stream_ollama(self, messages, model, max_tokens, temperature):
+        host = getattr(self, "ollama_host", os.getenv("OLLAMA_HOST", "http://localhost:11434").rstrip("/"))
+        stream = await ollama.AsyncClient(host=host).chat(
+            model=model,
+            messages=messages,
+            options={"num_predict": max_tokens, "temperature": temperature},
+            stream=True,
+        )
+        content: List[str] = []
+        last = None
+        async for part in stream:
+            last = part
+            text = part["message"]["content"]
+            if text:
+                content.append(text)
+                yield {"type": "text", "text": text}
+        yield {"type": "result", "result": {
+            "content": "".join(content),
+            "provider": ModelProvider.OLLAMA.value,
+            "model": model,
+            "usage": {
+                "input_tokens": (last.get("prompt_eval_count") if last else 0) or 0,
+                "output_tokens": (last.get("eval_count") if last else 0) or 0,
+            },
+            "tool_calls": [],
+        }}
     
     async def _chat_groq(self, messages, model, tools, max_tokens, temperature):
         """Chat with Groq (free tier: 14,400 req/day, Llama 3.3 70B)"""
-        messages = self._sanitize_messages_for_openai(messages)
-        kwargs = {
-            "model": model,
-            "messages": messages,
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-        }
-
-        if tools:
-            # Groq uses OpenAI-compatible tool format
-            kwargs["tools"] = [self._convert_tool_to_openai(t) for t in tools]
-            kwargs["tool_choice"] = "auto"
-
+        kwargs = self._groq_request(messages, model, tools, max_tokens, temperature)
         response = await self.groq_client.chat.completions.create(**kwargs)
         choice = response.choices[0]
 
@@ -702,13 +1300,28 @@ class AIRouter:
             "content": choice.message.content or "",
             "provider": ModelProvider.GROQ.value,
             "model": model,
-            "usage": {
-                "input_tokens": response.usage.prompt_tokens,
-                "output_tokens": response.usage.completion_tokens,
-            },
+            "usage": self._openai_usage(response.usage),
             "tool_calls": tool_calls,
         }
 
+    def _groq_request(self, messages, model, tools, max_tokens, temperature) -> Dict[str, Any]:
+        messages = self._sanitize_messages_for_openai(messages)
+        kwargs = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+
+        if tools:
+            # Groq uses OpenAI-compatible tool format
+            kwargs["tools"] = tool_set(tools).compiled("openai", self._openai_tools)
+            kwargs["tool_choice"] = "auto"
+        return kwargs
+
+    def _openai_tools(self, tools: ToolSet) -> List[Dict]:
+        return [self._convert_tool_to_openai(tool) for tool in tools]
+
     def _convert_tool_to_openai(self, claude_tool: Dict) -> Dict:
         """Convert Claude tool format to OpenAI format"""
         return {
@@ -743,6 +1356,8 @@ class AIRouter:
             if groq_key and not self.groq_client:
                 self.groq_client = AsyncGroq(api_key=groq_key)
                 print("[OK] Groq reconfigured")
+        # New keys may well fix what opened a breaker (e.g. an exhausted account)
+        self.health = {p: ProviderHealth(p.value) for p in ModelProvider}
         self._setup_routing_strategy()
 
     def get_stats(self) -> Dict[str, Any]:
@@ -755,7 +1370,8 @@ class AIRouter:
                 "ollama": self.is_provider_available(ModelProvider.OLLAMA)
             },
             "models": {k.value: v for k, v in self.models.items()},
-            "routing_strategy": {k.value: [p.value for p in v] for k, v in self.routing_strategy.items()}
+            "routing_strategy": {k.value: [p.value for p in v] for k, v in self.routing_strategy.items()},
+            "health": {p.value: self.health[p].snapshot() for p in ModelProvider if self.is_provider_available(p)}
         }
 
 
@@ -0,0 +1,281 @@
+"""
+Vesper context budget — token-aware prompt assembly
+One budget for the whole request instead of per-piece character caps: the
+system prompt core, the current message and the tool schemas are always sent;
+what's left of the model's window is shared out by priority between recent
+history, RAG context, always-on memories, older history and a compressed
+summary of whatever history doesn't fit verbatim.
+
+Token counts: tiktoken for OpenAI models when installed, otherwise a
+characters-per-token ratio per provider (deliberately on the generous side).
+Budget: model context window − max output tokens. VESPER_CONTEXT_BUDGET caps
+only the shared (history/RAG/memory) part, never the required pieces.
+"""
+
+import os
+import json
+from typing import List, Dict, Tuple, Optional, Union
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Default cap on the history/RAG/memory tokens per request — long threads past
+# this cost latency and money without helping the answer
+_DEFAULT_BUDGET = 32000
+# Shared tokens kept even when the required pieces fill (or overflow) the window,
+# so a turn never goes out without recent history, RAG context and memories
+_MIN_FLEXIBLE = 6000
+
+# Context windows by model-name prefix (first match wins); provider fallback below
+_MODEL_WINDOWS = [
+    ("claude", 200_000),
+    ("gpt-5", 400_000),
+    ("gpt-4.1", 1_000_000),
+    ("gpt-4o", 128_000),
+    ("gemini", 1_000_000),
+    ("llama-3", 128_000),
+    ("gemma", 8_192),
+]
+_PROVIDER_WINDOWS = {
+    "anthropic": 200_000,
+    "openai": 128_000,
+    "google": 1_000_000,
+    "groq": 128_000,
+    "ollama": 8_192,  # local models run with small num_ctx by default
+}
+
+# Characters per token when no tokenizer is available
+_CHARS_PER_TOKEN = {"anthropic": 3.5, "openai": 4.0, "google": 4.0, "groq": 3.8, "ollama": 3.8}
+_DEFAULT_CHARS_PER_TOKEN = 3.5
+
+_MESSAGE_OVERHEAD = 4   # role + delimiters per chat message
+_IMAGE_TOKENS = 1000    # rough cost of one attached image
+
+# Share of the flexible budget each optional piece may take, highest priority
+# first. Unused share falls through to verbatim history.
+DEFAULT_SHARES = {"rag": 0.25, "always_on": 0.15, "thread_summary": 0.10}
+
+# History: the newest messages are protected before RAG/always-on are sized;
+# at most MAX_VERBATIM messages are ever sent verbatim
+MIN_RECENT_MESSAGES = 6
+MAX_VERBATIM_MESSAGES = 200
+_SUMMARY_SNIPPET_CHARS = 400
+_SUMMARY_MAX_LINES = 120
+# Newest messages a caller needs to load — anything older can reach neither the
+# verbatim history nor the summary
+HISTORY_TAIL = MAX_VERBATIM_MESSAGES + _SUMMARY_MAX_LINES
+_SUMMARY_HEADER = "**EARLIER CONVERSATION (compressed):**"
+_SUMMARY_FOOTER = "(Full detail resumes below in the recent messages.)"
+
+
+# ---------------------------------------------------------------------------
+# Token estimation
+# ---------------------------------------------------------------------------
+
+_ENCODINGS: Dict[str, object] = {}
+
+
+def _encoding(model: Optional[str]):
+    if tiktoken is None:
+        return None
+    name = "o200k_base" if model and model.startswith(("gpt-4o", "gpt-4.1", "gpt-5", "o")) else "cl100k_base"
+    if name not in _ENCODINGS:
+        try:
+            _ENCODINGS[name] = tiktoken.get_encoding(name)
+        except Exception:
+            _ENCODINGS[name] = None  # offline / unknown encoding — fall back to the ratio
+    return _ENCODINGS[name]
+
+
+def estimate_tokens(content: Union[str, List, None], provider: Optional[str] = None,
+                    model: Optional[str] = None) -> int:
+    """Approximate token count for a string or a multi-part (text + image) message body"""
+    if not content:
+        return 0
+    if isinstance(content, list):
+        total = 0
+        for part in content:
+            if isinstance(part, dict) and part.get("type") == "text":
+                total += estimate_tokens(part.get("text", ""), provider, model)
+            elif isinstance(part, dict) and part.get("type") in ("image_url", "image"):
+                total += _IMAGE_TOKENS
+            else:
+                total += estimate_tokens(json.dumps(part, default=str), provider, model)
+        return total
+    text = str(content)
+    if provider == "openai":
+        enc = _encoding(model)
+        if enc is not None:
+            return len(enc.encode(text, disallowed_special=()))
+    ratio = _CHARS_PER_TOKEN.get(provider or "", _DEFAULT_CHARS_PER_TOKEN)
+    return int(len(text) / ratio) + 1
+
+
+def context_window(provider: Optional[str], model: Optional[str]) -> int:
+    m = (model or "").lower()
+    for prefix, window in _MODEL_WINDOWS:
+        if m.startswith(prefix):
+            return window
+    return _PROVIDER_WINDOWS.get(provider or "", 128_000)
+
+
+def context_budget(provider: Optional[str], model: Optional[str], max_output_tokens: int = 4096) -> int:
+    """Prompt-token budget for one request: the model window minus the output tokens"""
+    return max(1024, context_window(provider, model) - max_output_tokens)
+
+
+def flexible_budget() -> int:
+    """Cap on history + RAG + memory tokens per request (VESPER_CONTEXT_BUDGET)"""
+    try:
+        return max(_MIN_FLEXIBLE, int(os.getenv("VESPER_CONTEXT_BUDGET", "") or _DEFAULT_BUDGET))
+    except ValueError:
+        return _DEFAULT_BUDGET
+
+
+# ---------------------------------------------------------------------------
+# Packing
+# ---------------------------------------------------------------------------
+
+def _message_role_content(msg: Dict) -> Tuple[str, object]:
+    role = msg.get("role", "user" if msg.get("from") == "user" else "assistant")
+    return role, msg.get("content", msg.get("text", ""))
+
+
+def _summary_line(role: str, content) -> Optional[str]:
+    text = str(content or "").strip()
+    if role not in ("user", "assistant") or not text:
+        return None
+    prefix = "CC" if role == "user" else "Vesper"
+    return f"- {prefix}: {text.replace(chr(10), ' ')[:_SUMMARY_SNIPPET_CHARS]}"
+
+
+class ContextPacker:
+    """
+    Assembles the chat message list for one request within a token budget.
+
+    system_parts is the system prompt in order: plain strings are required and
+    sent as-is; (name, text) tuples are optional blocks ("rag", "always_on")
+    that are cut line by line from the bottom — both are written most-relevant
+    first under a one-line header — when their share runs out. The order of
+    the parts is kept, so where each block sits in the prompt doesn't change.
+
+    After pack(), .report holds the token allocation for logging.
+    """
+
+    def __init__(self, provider: Optional[str] = None, model: Optional[str] = None,
+                 budget_tokens: Optional[int] = None, max_output_tokens: int = 4096,
+                 shares: Optional[Dict[str, float]] = None):
+        self.provider = provider
+        self.model = model
+        self.budget = budget_tokens or context_budget(provider, model, max_output_tokens)
+        self.flexible_cap = flexible_budget()
+        self.shares = dict(DEFAULT_SHARES, **(shares or {}))
+        self.report: Dict = {}
+
+    def tokens(self, content) -> int:
+        return estimate_tokens(content, self.provider, self.model)
+
+    def _fit_lines(self, text: str, limit: int, keep_newest: bool = False) -> Tuple[str, int]:
+        """Header + as many body lines as fit in limit tokens (oldest dropped first if keep_newest)"""
+        lines = text.split("\n")
+        header, body = lines[0], lines[1:]
+        used = self.tokens(header)
+        if used > limit:
+            return "", 0
+        kept: List[str] = []
+        for line in (reversed(body) if keep_newest else body):
+            cost = self.tokens(line) + 1
+            if used + cost > limit:
+                break
+            kept.append(line)
+            used += cost
+        if not kept and body:
+            return "", 0
+        if keep_newest:
+            kept.reverse()
+        return "\n".join([header] + kept), used
+
+    def pack(self, system_parts: List[Union[str, Tuple[str, str]]], history: List[Dict],
+             current, tools: Optional[List[Dict]] = None) -> List[Dict]:
+        # Normalize history: user/assistant turns with content, newest MAX_VERBATIM as candidates
+        turns = []
+        for msg in history or []:
+            role, content = _message_role_content(msg)
+            if role in ("user", "assistant") and content:
+                turns.append((role, content))
+        candidates = turns[-MAX_VERBATIM_MESSAGES:]
+        overflow = turns[:-MAX_VERBATIM_MESSAGES] if len(turns) > MAX_VERBATIM_MESSAGES else []
+
+        # 1. Required pieces
+        required = sum(self.tokens(p) for p in system_parts if isinstance(p, str))
+        required += self.tokens(current) + 2 * _MESSAGE_OVERHEAD
+        if tools:
+            required += self.tokens(json.dumps(tools, default=str))
+        # What the window has left, within VESPER_CONTEXT_BUDGET — and never less than
+        # _MIN_FLEXIBLE, even if that pushes a small window over
+        flexible = min(self.flexible_cap, max(self.budget - required, _MIN_FLEXIBLE))
+        left = flexible
+
+        # 2. Always keep the last few turns
+        turn_cost = [self.tokens(c) + _MESSAGE_OVERHEAD for _, c in candidates]
+        keep_from = max(0, len(candidates) - MIN_RECENT_MESSAGES)
+        left -= sum(turn_cost[keep_from:])
+
+        # 3. Optional system blocks by priority, each within its share (at least its share
+        #    of _MIN_FLEXIBLE, so long recent turns can't crowd them out entirely)
+        fitted: Dict[str, str] = {}
+        optional = {p[0]: p[1] for p in system_parts if isinstance(p, tuple) and p[1]}
+        for name in sorted(optional, key=lambda n: -self.shares.get(n, 0.0)):
+            share = self.shares.get(name, 0.0)
+            cap = max(int(_MIN_FLEXIBLE * share), min(left, int(flexible * share)))
+            text, used = self._fit_lines(optional[name], cap)
+            fitted[name] = text
+            left -= used
+
+        # 4. More history, newest first, keeping room for a summary if anything is dropped
+        older_cost = sum(turn_cost[:keep_from])
+        summary_room = 0
+        if older_cost > left or overflow:
+            summary_room = min(left, int(flexible * self.shares["thread_summary"]))
+        while keep_from > 0 and turn_cost[keep_from - 1] <= left - summary_room:
+            keep_from -= 1
+            left -= turn_cost[keep_from]
+
+        # 5. Compress what didn't make it verbatim, newest lines first
+        summary = ""
+        dropped = overflow + candidates[:keep_from]
+        if dropped:
+            lines = [line for line in (_summary_line(r, c) for r, c in dropped) if line]
+            lines = lines[-_SUMMARY_MAX_LINES:]
+            if lines:
+                room = min(left, max(summary_room, int(flexible * self.shares["thread_summary"])))
+                room -= self.tokens(_SUMMARY_FOOTER) + 2
+                body, used = self._fit_lines("\n".join([_SUMMARY_HEADER] + lines), room, keep_newest=True)
+                if body:
+                    summary = f"{body}\n\n{_SUMMARY_FOOTER}"
+                    left -= used
+
+        # Render in the original order
+        chunks = []
+        for part in system_parts:
+            text = (part if isinstance(part, str) else fitted.get(part[0], "")).strip("\n")
+            if text:
+                chunks.append(text)
+        if summary:
+            chunks.append(summary)
+        messages = [{"role": "system", "content": "\n\n".join(chunks)}]
+        messages.extend({"role": r, "content": c} for r, c in candidates[keep_from:])
+        messages.append({"role": "user", "content": current})
+
+        self.report = {
+            "budget": self.budget,
+            "required": required,
+            "used": required + flexible - left,
+            "history_verbatim": len(candidates) - keep_from,
+            "history_summarized": len(dropped),
+            "blocks": {name: self.tokens(text) for name, text in fitted.items()},
+            "summary": self.tokens(summary),
+        }
+        return messages
@@ -0,0 +1,198 @@
+"""
+Vesper knowledge graph — memories, tasks and research linked by shared tags
+Built once from the DB, then kept in memory and updated incrementally from
+memory_db write listeners, so /api/knowledge/graph doesn't reload every row
+and re-pair every tag group per request.
+
+Edges live in a dict keyed by the (sorted) node-id pair with the number of
+shared tags as weight; each node keeps an adjacency set, which is what the
+neighborhood queries (center + depth) walk. A full rebuild still happens
+every VESPER_GRAPH_REBUILD_SECONDS (default 600) to pick up writes from other
+processes or from code paths that don't notify.
+
+Usage:
+    from knowledge_graph import graph
+    data = graph.snapshot()                          # whole graph
+    data = graph.neighborhood("mem-12", depth=2)     # nodes within 2 hops
+"""
+
+import os
+import time
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+MAX_DEPTH = 3
+
+# Node id prefix and frontend group per record kind
+_KINDS = {"memory": ("mem", 1), "task": ("task", 2), "research": ("res", 3)}
+_TASK_VALUES = {"high": 15, "medium": 10}
+
+
+def _rebuild_seconds() -> float:
+    try:
+        return float(os.getenv("VESPER_GRAPH_REBUILD_SECONDS", "") or 600)
+    except ValueError:
+        return 600.0
+
+
+def _node_id(kind: str, record_id) -> str:
+    return f"{_KINDS[kind][0]}-{record_id}"
+
+
+def graph_node(kind: str, record: Dict) -> Dict:
+    """Graph node for a memory/task/research record (the memory_db dict shapes)"""
+    prefix, group = _KINDS[kind]
+    node = {"id": f"{prefix}-{record['id']}", "group": group, "tags": record.get("tags") or []}
+    if kind == "memory":
+        content = record.get("content") or ""
+        node.update({
+            "name": content[:50] + "..." if len(content) > 50 else content,
+            "full_text": content,
+            "val": (record.get("importance") or 0) * 2 or 5,
+            "category": record.get("category"),
+        })
+    elif kind == "task":
+        node.update({
+            "name": record.get("title"),
+            "full_text": record.get("description"),
+            "val": _TASK_VALUES.get(record.get("priority"), 5),
+            "status": record.get("status"),
+        })
+    else:
+        node.update({
+            "name": record.get("title"),
+            "full_text": (record.get("content") or "")[:100],
+            "val": (record.get("confidence") or 0.5) * 20,
+            "source": record.get("source"),
+        })
+    return node
+
+
+def _link_tags(node: Dict) -> Set[str]:
+    return {t.lower().strip() for t in node["tags"] if isinstance(t, str) and t.strip()}
+
+
+class KnowledgeGraph:
+    """In-memory tag co-occurrence graph over one PersistentMemoryDB — see the module docstring."""
+
+    def __init__(self, memory_db=None):
+        self._db = memory_db
+        self._lock = threading.RLock()
+        self._built_at: Optional[float] = None
+        self._listening = False
+        self.nodes: Dict[str, Dict] = {}
+        self.node_tags: Dict[str, Set[str]] = {}
+        self.tag_nodes: Dict[str, Set[str]] = {}
+        self.edges: Dict[Tuple[str, str], int] = {}  # sorted id pair → number of shared tags
+        self.adjacency: Dict[str, Set[str]] = {}
+
+    # -- building -----------------------------------------------------------
+
+    def _ensure_built(self):
+        with self._lock:
+            if self._built_at is not None and time.time() - self._built_at < _rebuild_seconds():
+                return
+            if self._db is None:
+                from memory_db import db as memory_db
+                self._db = memory_db
+            if not self._listening:
+                self._db.add_write_listener(self._on_db_write)
+                self._listening = True
+            self.nodes, self.node_tags, self.tag_nodes = {}, {}, {}
+            self.edges, self.adjacency = {}, {}
+            for kind, records in self._db.get_graph_records().items():
+                for record in records:
+                    self._add(graph_node(kind, record))
+            self._built_at = time.time()
+
+    def _on_db_write(self, kind: str, action: str, record: Dict):
+        if kind not in _KINDS or record.get("id") is None:
+            return
+        with self._lock:
+            if self._built_at is None:
+                return  # not built yet — the first query reads the DB anyway
+            self._remove(_node_id(kind, record["id"]))
+            if action != "delete":
+                self._add(graph_node(kind, record))
+
+    def _add(self, node: Dict):
+        node_id = node["id"]
+        tags = _link_tags(node)
+        self.nodes[node_id] = node
+        self.node_tags[node_id] = tags
+        neighbors = self.adjacency.setdefault(node_id, set())
+        for tag in tags:
+            members = self.tag_nodes.setdefault(tag, set())
+            for other in members:
+                pair = (node_id, other) if node_id < other else (other, node_id)
+                self.edges[pair] = self.edges.get(pair, 0) + 1
+                neighbors.add(other)
+                self.adjacency[other].add(node_id)
+            members.add(node_id)
+
+    def _remove(self, node_id: str):
+        if node_id not in self.nodes:
+            return
+        del self.nodes[node_id]
+        for tag in self.node_tags.pop(node_id):
+            members = self.tag_nodes[tag]
+            members.discard(node_id)
+            if not members:
+                del self.tag_nodes[tag]
+        for other in self.adjacency.pop(node_id):
+            self.adjacency[other].discard(node_id)
+            self.edges.pop((node_id, other) if node_id < other else (other, node_id), None)
+
+    # -- queries ------------------------------------------------------------
+
+    def _links(self, node_ids: Set[str]) -> List[Dict]:
+        links = []
+        for a in node_ids:
+            for b in self.adjacency[a]:
+                if a < b and b in node_ids:
+                    links.append({
+                        "source": a,
+                        "target": b,
+                        "value": self.edges[(a, b)],
+                        "type": "tag",
+                        "tag": min(self.node_tags[a] & self.node_tags[b]),
+                    })
+        return links
+
+    def snapshot(self, limit: Optional[int] = None) -> Dict:
+        """The whole graph — or the limit best-connected nodes and the links between them"""
+        with self._lock:
+            self._ensure_built()
+            if limit is None or limit >= len(self.nodes):
+                ids = list(self.nodes)
+            else:
+                ids = sorted(self.nodes, key=lambda n: -len(self.adjacency[n]))[:max(0, limit)]
+            return {"nodes": [self.nodes[n] for n in ids], "links": self._links(set(ids))}
+
+    def neighborhood(self, center: str, depth: int = 1, limit: Optional[int] = None) -> Optional[Dict]:
+        """Nodes within depth hops of center (strongest links first when limit cuts in), or None if unknown"""
+        with self._lock:
+            self._ensure_built()
+            if center not in self.nodes:
+                return None
+            depth = max(0, min(depth, MAX_DEPTH))
+            seen = {center: 0}
+            frontier = [center]
+            for hop in range(1, depth + 1):
+                nxt = []
+                for node_id in frontier:
+                    ranked = sorted(
+                        (n for n in self.adjacency[node_id] if n not in seen),
+                        key=lambda n: -self.edges[(node_id, n) if node_id < n else (n, node_id)],
+                    )
+                    for other in ranked:
+                        if limit is not None and len(seen) >= limit:
+                            break
+                        seen[other] = hop
+                        nxt.append(other)
+                frontier = nxt
+            nodes = [dict(self.nodes[n], depth=d) for n, d in seen.items()]
+            return {"nodes": nodes, "links": self._links(set(seen)), "center": center, "depth": depth}
+
+
+graph = KnowledgeGraph()
@@ -5,14 +5,22 @@ Replaces ephemeral JSON file storage with real persistent database
 """
 
 import os
+import re
 import json
 import time
+import base64
+import queue
+import atexit
 import datetime
-from typing import List, Dict, Optional, Any
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, JSON, Boolean, Float, text
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Any, Iterator, Tuple
+from sqlalchemy import create_engine, event, insert, case, Column, Integer, String, Text, DateTime, JSON, Boolean, Float, Index, text, and_, or_, func
+from sqlalchemy.exc import IntegrityError, OperationalError, DisconnectionError, TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, QueuePool
 from sqlalchemy.orm.attributes import flag_modified
 
 Base = declarative_base()
@@ -20,14 +28,32 @@ Base = declarative_base()
 class Thread(Base):
     """Conversation threads with messages"""
     __tablename__ = "threads"
+    __table_args__ = (Index("ix_threads_pinned_updated", "pinned", "updated_at"),)
     
     id = Column(String, primary_key=True)
     title = Column(String, nullable=False)
     pinned = Column(Boolean, default=False)  # Pin important conversations
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
-    messages = Column(JSON, default=list)  # Store messages as JSON array
+    messages = Column(JSON, default=list)  # Legacy JSON array — moved into the messages table on startup
     meta_data = Column(JSON, default=dict)
+    # Denormalized for the thread list — maintained by add_message_to_thread
+    message_count = Column(Integer, default=0)
+    summary = Column(Text, default="")  # first user message, 200 chars
+    last_message_at = Column(DateTime, nullable=True)
+
+class Message(Base):
+    """One chat message — appended as a row, never rewritten with the rest of the thread"""
+    __tablename__ = "messages"
+    __table_args__ = (Index("ix_messages_thread_seq", "thread_id", "seq", unique=True),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    thread_id = Column(String, nullable=False)
+    seq = Column(Integer, nullable=False)  # 0-based position in the thread
+    role = Column(String, nullable=False)
+    content = Column(Text, nullable=False, default="")  # text part; multi-part bodies keep the original in meta_data
+    meta_data = Column(JSON, default=dict)  # every other key of the message dict
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
 
 class Memory(Base):
     """Memory entries by category"""
@@ -43,6 +69,14 @@ class Memory(Base):
     tags = Column(JSON, default=list)
     meta_data = Column(JSON, default=dict)
 
+class MemoryTag(Base):
+    """One tag of one memory — indexed copy of Memory.tags for tag filters and the tag cloud"""
+    __tablename__ = "memory_tags"
+    __table_args__ = (Index("ix_memory_tags_tag", "tag", "memory_id"),)
+
+    memory_id = Column(Integer, primary_key=True)
+    tag = Column(String, primary_key=True)
+
 class Task(Base):
     """Task management"""
     __tablename__ = "tasks"
@@ -106,6 +140,7 @@ class Document(Base):
 class Analytics(Base):
     """Analytics and usage tracking"""
     __tablename__ = "analytics"
+    __table_args__ = (Index("ix_analytics_created_at", "created_at"),)
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     event_type = Column(String, nullable=False)  # chat, memory, research, task, document
@@ -120,6 +155,23 @@ class Analytics(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     meta_data = Column(JSON, default=dict)
 
+class AnalyticsRollup(Base):
+    """Analytics totals per hour / day and (event_type, topic, ai_provider) — see roll_up_analytics"""
+    __tablename__ = "analytics_rollups"
+    __table_args__ = (Index("ix_analytics_rollups_period_bucket", "period", "bucket"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    period = Column(String, nullable=False)  # hour, day
+    bucket = Column(DateTime, nullable=False)  # start of the hour / day (UTC)
+    event_type = Column(String)
+    topic = Column(String)
+    ai_provider = Column(String)
+    events = Column(Integer, default=0)
+    successes = Column(Integer, default=0)
+    response_time_ms = Column(Integer, default=0)  # sum
+    input_tokens = Column(Integer, default=0)
+    output_tokens = Column(Integer, default=0)
+
 class Personality(Base):
     """Personality and customization settings"""
     __tablename__ = "personality"
@@ -198,6 +250,296 @@ class IncomeSale(Base):
     sold_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def _postgres_pool_options() -> Dict[str, Any]:
+    """create_engine() options for PostgreSQL, chosen by VESPER_DB_POOL.
+
+    "queue" (default): a small pool of reused connections — one TCP + TLS + auth
+    handshake per connection instead of per session. pre_ping tests each
+    connection on checkout and transparently reconnects after a Railway restart
+    dropped it; recycle retires connections before the proxy's idle timeout does;
+    TCP keepalives notice dead peers between requests.
+    "null": a fresh connection per session (the old behaviour).
+    """
+    connect_args: Dict[str, Any] = {"connect_timeout": 15}
+    if os.getenv("VESPER_DB_POOL", "queue").strip().lower() == "null":
+        return {"poolclass": NullPool, "connect_args": connect_args}
+    connect_args.update(keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3)
+    return {
+        "poolclass": QueuePool,
+        "pool_size": _env_int("VESPER_DB_POOL_SIZE", 5),
+        "max_overflow": _env_int("VESPER_DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _env_int("VESPER_DB_POOL_TIMEOUT", 10),
+        "pool_recycle": _env_int("VESPER_DB_POOL_RECYCLE", 300),
+        "pool_pre_ping": True,
+        "pool_use_lifo": True,  # idle extras age out instead of all staying warm-but-stale
+        "connect_args": connect_args,
+    }
+
+
+# SQLite tuning, applied to every new connection (sync and aiosqlite engines):
+# WAL lets readers run while a write is in progress; synchronous=NORMAL is
+# durable across app crashes under WAL (only an OS crash can lose the last
+# commits); busy_timeout makes a second writer wait instead of failing.
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=10000",
+    "PRAGMA cache_size=-65536",    # 64 MB page cache
+    "PRAGMA mmap_size=268435456",  # 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def _configure_sqlite(engine) -> None:
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in _SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+# Full-text indexes: table → (weighted columns, highest weight first). SQLite keeps an
+# FTS5 external-content table in sync with triggers; Postgres a generated tsvector + GIN.
+_FULLTEXT = {
+    "memories": (("title", "A"), ("content", "B")),
+    "research": (("title", "A"), ("content", "B")),
+    "documents": (("filename", "A"), ("summary", "B"), ("content", "C")),
+}
+_FTS5_WEIGHTS = {"A": 4.0, "B": 1.0, "C": 1.0}
+_FTS_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_FTS_MAX_TOKENS = 16
+
+
+def _fulltext_query(query: str, dialect: str) -> Optional[str]:
+    """All words must match; the last one as a prefix (search-as-you-type). None if no words."""
+    tokens = _FTS_TOKEN_RE.findall((query or "").lower())[:_FTS_MAX_TOKENS]
+    if not tokens:
+        return None
+    if dialect == "sqlite":
+        return " ".join(f'"{t}"' for t in tokens[:-1]) + f' "{tokens[-1]}"*'
+    return " & ".join(tokens[:-1] + [f"{tokens[-1]}:*"])
+
+
+_HOUR = datetime.timedelta(hours=1)
+_DAY = datetime.timedelta(days=1)
+
+
+def _floor_hour(ts: datetime.datetime) -> datetime.datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _floor_day(ts: datetime.datetime) -> datetime.datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _ceil(ts: datetime.datetime, floor, step: datetime.timedelta) -> datetime.datetime:
+    start = floor(ts)
+    return start if start == ts else start + step
+
+
+class _AnalyticsBuffer:
+    """
+    log_event queue: events are stamped when logged and inserted in batches by a
+    background thread every VESPER_ANALYTICS_FLUSH_SECONDS (or as soon as
+    _FLUSH_AT are waiting), so logging never waits on the database. The same
+    thread rolls the raw events up into hourly/daily totals every
+    VESPER_ANALYTICS_ROLLUP_SECONDS. Whatever is still queued is flushed at exit.
+    """
+
+    _FLUSH_AT = 200
+    _MAX_PENDING = 10000  # past this (DB down) the oldest events are dropped
+
+    def __init__(self, memory_db: "PersistentMemoryDB"):
+        self._db = memory_db
+        self._pending: List[Dict] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flush_every = _env_int("VESPER_ANALYTICS_FLUSH_SECONDS", 2)
+        self._rollup_every = _env_int("VESPER_ANALYTICS_ROLLUP_SECONDS", 300)
+        self._thread = None
+
+    def add(self, fields: Dict) -> None:
+        with self._lock:
+            self._pending.append(fields)
+            if len(self._pending) > self._MAX_PENDING:
+                del self._pending[:len(self._pending) - self._MAX_PENDING]
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True, name="VesperAnalytics")
+                self._thread.start()
+                atexit.register(self.flush)
+            if len(self._pending) >= self._FLUSH_AT:
+                self._wake.set()
+
+    # Errors that say the database is unreachable or busy, not that the rows are bad
+    _TRANSIENT = (OperationalError, DisconnectionError, PoolTimeoutError)
+
+    def flush(self) -> int:
+        """Insert everything queued so far; returns the number of events written.
+        If the database is unreachable the batch stays queued for the next flush; if the
+        batch itself is rejected, its rows are inserted one by one and the bad ones dropped."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            try:
+                return self._db._write(self._db._insert_events, rows)
+            except self._TRANSIENT as e:
+                self._requeue(rows, e)
+                return 0
+            except Exception as e:
+                print(f"⚠️  analytics batch of {len(rows)} rejected, inserting one by one: {e}")
+            written = 0
+            for i, row in enumerate(rows):
+                try:
+                    written += self._db._write(self._db._insert_events, [row])
+                except self._TRANSIENT as e:
+                    self._requeue(rows[i:], e)
+                    break
+                except Exception as e:
+                    print(f"⚠️  analytics event dropped ({row.get('event_type')!r}): {e}")
+            return written
+
+    def _requeue(self, rows: List[Dict], error: Exception) -> None:
+        print(f"⚠️  analytics flush failed, {len(rows)} events kept for retry: {error}")
+        with self._lock:
+            self._pending[:0] = rows
+            if len(self._pending) > self._MAX_PENDING:
+                del self._pending[:len(self._pending) - self._MAX_PENDING]
+
+    def _loop(self):
+        last_rollup = 0.0
+        while True:
+            self._wake.wait(self._flush_every)
+            self._wake.clear()
+            self.flush()
+            if time.time() - last_rollup >= self._rollup_every:
+                last_rollup = time.time()
+                try:
+                    self._db.roll_up_analytics()
+                except Exception as e:
+                    print(f"⚠️  analytics rollup failed: {e}")
+
+
+class _UnitOfWork:
+    """
+    Write operations recorded inside PersistentMemoryDB.unit_of_work() — each call
+    queues the matching session-taking body and returns None; on exit they all run
+    in one transaction (one writer job on SQLite) and .results holds their return
+    values in call order.
+    """
+
+    # Public name → write body of PersistentMemoryDB, and the write-listener kind it reports
+    _OPS = {
+        "create_thread": ("_create_thread", None),
+        "add_message_to_thread": ("_add_message_to_thread", None),
+        "bulk_add_messages": ("_bulk_add_messages", None),
+        "add_memory": ("_add_memory", "memory"),
+        "bulk_add_memories": ("_bulk_add_memories", "memory"),
+        "create_task": ("_create_task", "task"),
+        "add_research": ("_add_research", "research"),
+        "add_document": ("_add_document", None),
+        "log_event": ("_insert_events", None),
+        "bulk_log_events": ("_insert_events", None),
+        "add_gap_entry": ("_add_gap_entry", None),
+        "save_config": ("_save_config", None),
+    }
+
+    def __init__(self, memory_db: "PersistentMemoryDB"):
+        self._db = memory_db
+        self.ops: List[Tuple[str, Any, tuple, dict]] = []
+        self.results: List[Any] = []
+
+    def __getattr__(self, name: str):
+        if name not in self._OPS:
+            raise AttributeError(f"{name} can't be used in a unit of work")
+        body = getattr(self._db, self._OPS[name][0])
+
+        def record(*args, **kwargs):
+            if name == "log_event":
+                args, kwargs = ([self._db._event_fields(*args, **kwargs)],), {}
+            elif name == "bulk_log_events":
+                args, kwargs = ([self._db._event_fields(**e) for e in (args[0] if args else kwargs["events"])],), {}
+            self.ops.append((name, body, args, kwargs))
+
+        return record
+
+
+class _SQLiteWriteQueue:
+    """
+    Single writer for a SQLite database. Callers queue fn(session, *args) bodies and
+    wait on a Future; one thread runs them, so writes never contend for the lock.
+    Jobs already waiting when the writer wakes share one transaction (one fsync for
+    the batch). If any of them fails, the batch is rolled back and its jobs re-run
+    one transaction each, so a bad write never sinks its neighbours.
+    Bodies commit through PersistentMemoryDB._commit, which only flushes in a shared batch.
+    """
+
+    _MAX_BATCH = 64
+
+    def __init__(self, session_factory):
+        self._sessions = session_factory
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="VesperDBWriter")
+        self._thread.start()
+
+    def on_writer_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        future: Future = Future()
+        self._jobs.put((fn, args, kwargs, future))
+        return future
+
+    def run(self, fn, *args, **kwargs):
+        return self.submit(fn, *args, **kwargs).result()
+
+    def _loop(self):
+        while True:
+            batch = [self._jobs.get()]
+            while len(batch) < self._MAX_BATCH:
+                try:
+                    batch.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+            batch = [job for job in batch if job[3].set_running_or_notify_cancel()]
+            if len(batch) == 1 or not self._run_batch(batch):
+                for job in batch:
+                    self._run_batch([job], isolated=True)
+
+    def _run_batch(self, batch, isolated: bool = False) -> bool:
+        """Run jobs in one transaction; False (nothing resolved) if a shared batch failed"""
+        session = self._sessions()
+        session.info["batched"] = not isolated  # a lone job commits itself, retries included
+        results = []
+        try:
+            for fn, args, kwargs, _ in batch:
+                results.append(fn(session, *args, **kwargs))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            if not isolated:
+                return False
+            batch[0][3].set_exception(e)
+            return True
+        finally:
+            session.close()
+        for (_, _, _, future), result in zip(batch, results):
+            future.set_result(result)
+        return True
+
+
 class PersistentMemoryDB:
     """Database manager for persistent memory"""
     
@@ -214,10 +556,15 @@ class PersistentMemoryDB:
         
         self._initialized = False
         self._schema_checked = False  # Run ensure_memory_schema only once per process
+        self._backfill_thread = None  # moves legacy thread messages in the background — see _run_backfills
+        self._fulltext_ready: set = set()  # tables whose full-text index exists — see _ensure_fulltext
         self.database_url = database_url
         self.engine = None
         self.SessionLocal = None
         self._use_sqlite = False
+        self._write_listeners = []  # callables(kind, action, record) — see add_write_listener
+        self._events = _AnalyticsBuffer(self)
+        self._writer: Optional[_SQLiteWriteQueue] = None  # SQLite only — see _write
         
         # Don't initialize at import time - do it lazily on first use
         # This prevents blocking Railway startup
@@ -254,25 +601,25 @@ class PersistentMemoryDB:
                         self.database_url,
                         connect_args={"check_same_thread": False}
                     )
+                    _configure_sqlite(self.engine)
                 else:
-                    # PostgreSQL — NullPool avoids stale sockets across Railway restarts
-                    self.engine = create_engine(
-                        self.database_url,
-                        poolclass=NullPool,
-                        connect_args={"connect_timeout": 15},
-                    )
+                    self.engine = create_engine(self.database_url, **_postgres_pool_options())
                 
                 # Create tables — this is the first real connection attempt
                 Base.metadata.create_all(self.engine)
                 self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+                if self._use_sqlite:
+                    self._writer = _SQLiteWriteQueue(self.SessionLocal)
                 self._initialized = True
                 
                 if not self._use_sqlite:
-                    print(f"✅ PostgreSQL connected! (attempt {_attempt})")
+                    print(f"✅ PostgreSQL connected! (attempt {_attempt}, pool: {self.engine.pool.__class__.__name__})")
                 return
                 
             except Exception as e:
                 _last_exc = e
+                if self.engine is not None:
+                    self.engine.dispose()  # drop any half-open pooled connections before retrying
                 if self._use_sqlite:
                     break  # SQLite failures are not retried — they are local
                 print(f"⚠️  PostgreSQL attempt {_attempt}/3 failed: {str(e)[:100]}")
@@ -292,8 +639,10 @@ class PersistentMemoryDB:
             self.database_url,
             connect_args={"check_same_thread": False}
         )
+        _configure_sqlite(self.engine)
         Base.metadata.create_all(self.engine)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self._writer = _SQLiteWriteQueue(self.SessionLocal)
         self._initialized = True
     
     def get_session(self) -> Session:
@@ -302,146 +651,415 @@ class PersistentMemoryDB:
         if not self._schema_checked:
             self.ensure_memory_schema()
             self._schema_checked = True
+            self._start_backfills()
         return self.SessionLocal()
+
+    # === WRITE LISTENERS ===
+
+    def add_write_listener(self, listener) -> None:
+        """Register a callable(kind, action, record) fired after a committed write.
+
+        kind is "memory", "research" or "task", action is "upsert" or "delete".
+        Used by vesper_rag and knowledge_graph to stay in sync without rescanning the DB.
+        """
+        if listener not in self._write_listeners:
+            self._write_listeners.append(listener)
+
+    def _notify_write(self, kind: str, action: str, record: Dict) -> None:
+        """Fan a committed write out to listeners — listener errors never fail the write."""
+        for listener in list(self._write_listeners):
+            try:
+                listener(kind, action, record)
+            except Exception as e:
+                print(f"⚠️  write listener failed ({kind}/{action}): {e}")
     
-    # === THREADS ===
-    
-    def create_thread(self, thread_id: str, title: str, metadata: Optional[Dict] = None) -> Dict:
-        """Create new conversation thread"""
+    def _in_session(self, fn, *args, **kwargs):
+        """Run fn(session, *args) in a fresh session. The session-taking _methods are shared
+        with AsyncMemoryDB, which runs them on an async connection via run_sync."""
         session = self.get_session()
         try:
-            thread = Thread(
-                id=thread_id,
-                title=title,
-                messages=[],
-                meta_data=metadata or {}
-            )
-            session.add(thread)
-            session.commit()
-            session.refresh(thread)
-            return self._thread_to_dict(thread)
+            return fn(session, *args, **kwargs)
         finally:
             session.close()
-    
-    def get_thread(self, thread_id: str) -> Optional[Dict]:
-        """Get thread by ID"""
-        session = self.get_session()
+
+    def _write(self, fn, *args, **kwargs):
+        """Run a write body — on the SQLite writer thread when there is one, else in its own session"""
+        self._ensure_initialized()
+        if self._writer is not None and not self._writer.on_writer_thread():
+            if not self._schema_checked:
+                self.get_session().close()  # migrations first
+            return self._writer.run(fn, *args, **kwargs)
+        return self._in_session(fn, *args, **kwargs)
+
+    @contextmanager
+    def unit_of_work(self) -> Iterator[_UnitOfWork]:
+        """Group writes into one transaction:
+
+            with db.unit_of_work() as uow:
+                uow.create_thread(thread_id, title)
+                uow.bulk_add_messages(thread_id, messages)
+            uow.results  # [thread dict, appended count]
+
+        Nothing is written if the block raises; if one operation fails, none are kept.
+        """
+        uow = _UnitOfWork(self)
+        yield uow
+        if not uow.ops:
+            return
+        uow.results = self._write(self._run_unit, [(body, args, kwargs) for _, body, args, kwargs in uow.ops])
+        for (name, _, _, _), result in zip(uow.ops, uow.results):
+            kind = _UnitOfWork._OPS[name][1]
+            for record in (result if isinstance(result, list) else [result]):
+                if kind and record:
+                    self._notify_write(kind, "upsert", record)
+
+    def _run_unit(self, session: Session, ops: List[Tuple[Any, tuple, dict]]) -> List[Any]:
+        batched = session.info.get("batched", False)
+        session.info["batched"] = True  # bodies only flush; one commit below
         try:
-            thread = session.query(Thread).filter(Thread.id == thread_id).first()
-            return self._thread_to_dict(thread) if thread else None
+            results = [body(session, *args, **kwargs) for body, args, kwargs in ops]
         finally:
-            session.close()
+            session.info["batched"] = batched
+        self._commit(session)
+        return results
+
+    @staticmethod
+    def _commit(session: Session) -> None:
+        """End a write body: commit, or just flush when the SQLite writer commits the whole batch"""
+        if session.info.get("batched"):
+            session.flush()
+        else:
+            session.commit()
+
+    # === THREADS ===
     
+    def create_thread(self, thread_id: str, title: str, metadata: Optional[Dict] = None) -> Dict:
+        """Create new conversation thread"""
+        return self._write(self._create_thread, thread_id, title, metadata)
+
+    def _create_thread(self, session: Session, thread_id: str, title: str, metadata: Optional[Dict] = None) -> Dict:
+        thread = Thread(
+            id=thread_id,
+            title=title,
+            messages=[],
+            meta_data=metadata or {}
+        )
+        session.add(thread)
+        self._commit(session)
+        session.refresh(thread)
+        return self._thread_to_dict(thread, messages=[])
+    
+    def get_thread(self, thread_id: str, tail: Optional[int] = None) -> Optional[Dict]:
+        """Get thread by ID with its messages.
+        tail=N loads only the newest N messages (message_count and summary still cover the whole thread).
+        """
+        return self._in_session(self._get_thread, thread_id, tail)
+
+    def _get_thread(self, session: Session, thread_id: str, tail: Optional[int] = None) -> Optional[Dict]:
+        thread = session.query(Thread).filter(Thread.id == thread_id).first()
+        if not thread:
+            return None
+        if tail is None:
+            messages = self._load_messages(session, [thread_id])[thread_id]
+        else:
+            messages = self._tail_messages(session, thread_id, tail)
+        return self._thread_to_dict(thread, messages=messages)
+    
+    def _thread_list_query(self, session: Session):
+        """Thread list columns only — the legacy messages JSON is never read"""
+        return session.query(
+            Thread.id, Thread.title, Thread.pinned, Thread.message_count, Thread.summary,
+            Thread.last_message_at, Thread.created_at, Thread.updated_at, Thread.meta_data,
+        ).order_by(
+            Thread.pinned.desc(),  # Pinned first
+            Thread.updated_at.desc(),  # Then by most recent
+            Thread.id.desc(),
+        )
+
     def get_all_threads(self, include_messages: bool = False) -> List[Dict]:
         """Get all threads, pinned first.
         Set include_messages=False (default) for lightweight list view.
         """
-        session = self.get_session()
+        return self._in_session(self._get_all_threads, include_messages)
+
+    def _get_all_threads(self, session: Session, include_messages: bool = False) -> List[Dict]:
+        if include_messages:
+            threads = session.query(Thread).order_by(Thread.pinned.desc(), Thread.updated_at.desc()).all()
+            by_thread = self._load_messages(session, [t.id for t in threads])
+            return [self._thread_to_dict(t, messages=by_thread[t.id]) for t in threads]
+        return [self._thread_to_dict(row) for row in self._thread_list_query(session).all()]
+
+    def get_threads_page(self, limit: int = 50, cursor: Optional[str] = None) -> Dict:
+        """One page of the thread list, pinned first then most recent.
+        Keyset pagination on (pinned, updated_at, id): pass back next_cursor for the following page.
+        Raises ValueError for a malformed cursor.
+        """
+        return self._in_session(self._get_threads_page, limit, cursor)
+
+    def _get_threads_page(self, session: Session, limit: int = 50, cursor: Optional[str] = None) -> Dict:
+        query = self._thread_list_query(session)
+        if cursor:
+            pinned, updated_at, last_id = self._decode_thread_cursor(cursor)
+            older = or_(
+                Thread.updated_at < updated_at,
+                and_(Thread.updated_at == updated_at, Thread.id < last_id),
+            )
+            if pinned:
+                query = query.filter(or_(Thread.pinned.is_(False), and_(Thread.pinned.is_(True), older)))
+            else:
+                query = query.filter(Thread.pinned.is_(False), older)
+        rows = query.limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self._encode_thread_cursor(rows[-1])
+        return {"threads": [self._thread_to_dict(row) for row in rows], "next_cursor": next_cursor}
+
+    @staticmethod
+    def _encode_thread_cursor(row) -> str:
+        key = [bool(row.pinned), row.updated_at.isoformat() if row.updated_at else None, row.id]
+        return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def _decode_thread_cursor(cursor: str) -> Tuple[bool, datetime.datetime, str]:
         try:
-            threads = session.query(Thread).order_by(
-                Thread.pinned.desc(),  # Pinned first
-                Thread.updated_at.desc()  # Then by most recent
-            ).all()
-            return [self._thread_to_dict(t, include_messages=include_messages) for t in threads]
-        finally:
-            session.close()
+            pinned, updated_at, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return bool(pinned), datetime.datetime.fromisoformat(updated_at), str(last_id)
+        except Exception as e:
+            raise ValueError(f"invalid thread cursor: {e}") from e
+
+    def get_thread_messages(self, thread_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Messages of a thread in order, starting at position offset — a range scan on (thread_id, seq)"""
+        return self._in_session(self._get_thread_messages, thread_id, offset, limit)
+
+    def _get_thread_messages(self, session: Session, thread_id: str, offset: int = 0,
+                             limit: Optional[int] = None) -> List[Dict]:
+        query = session.query(Message).filter(
+            Message.thread_id == thread_id, Message.seq >= offset
+        ).order_by(Message.seq.asc())
+        if limit is not None:
+            query = query.limit(limit)
+        return [self._message_to_dict(m) for m in query.all()]
+
+    def get_thread_tail(self, thread_id: str, n: int = 20) -> List[Dict]:
+        """The newest n messages of a thread, oldest first"""
+        return self._in_session(self._tail_messages, thread_id, n)
+    
+    def iter_threads(self, updated_since: Optional[datetime.datetime] = None, page_size: int = 50) -> Iterator[Dict]:
+        """Yield threads with messages, least recently updated first, one page per session.
+        Keyset pagination on (updated_at, id) keeps memory at one page however large the
+        history is; updated_since skips threads untouched since then.
+        """
+        cursor = None
+        while True:
+            session = self.get_session()
+            try:
+                query = session.query(Thread)
+                if updated_since is not None:
+                    query = query.filter(Thread.updated_at >= updated_since)
+                if cursor is not None:
+                    query = query.filter(or_(
+                        Thread.updated_at > cursor[0],
+                        and_(Thread.updated_at == cursor[0], Thread.id > cursor[1]),
+                    ))
+                page = query.order_by(Thread.updated_at.asc(), Thread.id.asc()).limit(page_size).all()
+                if page:
+                    cursor = (page[-1].updated_at, page[-1].id)
+                by_thread = self._load_messages(session, [t.id for t in page])
+                rows = [self._thread_to_dict(t, messages=by_thread[t.id]) for t in page]
+            finally:
+                session.close()
+            yield from rows
+            if len(rows) < page_size:
+                return
     
     def add_message_to_thread(self, thread_id: str, message: Dict) -> Optional[Dict]:
-        """Add message to thread — with consecutive-duplicate guard to prevent retry corruption"""
-        session = self.get_session()
-        try:
+        """Append a message row to the thread — with consecutive-duplicate guard to prevent retry corruption.
+        Returns the thread without its messages (the caller already has the one it sent).
+        """
+        return self._write(self._add_message_to_thread, thread_id, message)
+
+    def _add_message_to_thread(self, session: Session, thread_id: str, message: Dict) -> Optional[Dict]:
+        for _attempt in range(3):
             thread = session.query(Thread).filter(Thread.id == thread_id).first()
             if not thread:
                 return None
-            
-            # Force new list copy to ensure SQLAlchemy detects change
-            messages = list(thread.messages) if thread.messages else []
-            
+            last = session.query(Message).filter(
+                Message.thread_id == thread_id
+            ).order_by(Message.seq.desc()).first()
+            if last is None and thread.messages:
+                # Not backfilled yet — copy the legacy array first so the new row follows it
+                copied = self._copy_legacy_messages(session, thread)
+                last = copied[-1] if copied else None
+
             # Dedup guard: reject a message that is identical to the last saved message
             # (same role + same content).  This prevents doubled context when the frontend
             # retries after a stream-stall error and the user re-sends the same text.
-            if messages:
-                last = messages[-1]
+            if last is not None:
+                prev = self._message_to_dict(last)
                 new_role = message.get("role", "")
                 new_content = str(message.get("content") or "").strip()
-                last_role = last.get("role", "")
-                last_content = str(last.get("content") or "").strip()
-                if new_role == last_role and new_content == last_content and new_content:
+                last_content = str(prev.get("content") or "").strip()
+                if new_role == prev.get("role", "") and new_content == last_content and new_content:
                     return self._thread_to_dict(thread)  # Already saved — skip silently
-            
-            messages.append(message)
-            thread.messages = messages
-            # flag_modified is REQUIRED for SQLAlchemy to detect JSON column mutations.
-            # Without it, commit() silently skips the write if it thinks the column is clean.
-            flag_modified(thread, "messages")
+
+            seq = last.seq + 1 if last is not None else 0
+            row = self._message_row(thread_id, seq, message)
+            session.add(row)
+            thread.message_count = seq + 1
+            if not thread.summary and row.role == "user":
+                thread.summary = row.content[:200]
+            thread.last_message_at = row.timestamp
             thread.updated_at = datetime.datetime.utcnow()
-            session.commit()
-            session.refresh(thread)
+            try:
+                self._commit(session)
+            except IntegrityError:
+                if session.info.get("batched"):
+                    raise  # the writer re-runs this job on its own
+                # Another writer took this seq between our read and commit — re-read the tail and retry
+                session.rollback()
+                continue
             return self._thread_to_dict(thread)
-        finally:
-            session.close()
+        raise RuntimeError(f"could not append to thread {thread_id}: concurrent writers")
+    
+    def bulk_add_messages(self, thread_id: str, messages: List[Dict]) -> int:
+        """Append many messages to a thread in one INSERT; returns how many were added.
+        Same consecutive-duplicate guard as add_message_to_thread.
+        """
+        return self._write(self._bulk_add_messages, thread_id, messages)
+
+    def _bulk_add_messages(self, session: Session, thread_id: str, messages: List[Dict]) -> int:
+        thread = session.query(Thread).filter(Thread.id == thread_id).first()
+        if not thread:
+            return 0
+        last = session.query(Message).filter(Message.thread_id == thread_id).order_by(Message.seq.desc()).first()
+        if last is None and thread.messages:
+            copied = self._copy_legacy_messages(session, thread)
+            last = copied[-1] if copied else None
+        seq = last.seq + 1 if last is not None else 0
+        prev = (last.role, (last.content or "").strip()) if last is not None else None
+        rows = []
+        for message in messages or []:
+            if not isinstance(message, dict):
+                continue
+            row = self._message_row(thread_id, seq + len(rows), message)
+            key = (row.role, str(message.get("content") or "").strip())
+            if key[1] and key == prev:
+                continue
+            prev = key
+            rows.append(row)
+        if not rows:
+            return 0
+        columns = ("thread_id", "seq", "role", "content", "meta_data", "timestamp")
+        session.execute(insert(Message), [{c: getattr(r, c) for c in columns} for r in rows])
+        thread.message_count = seq + len(rows)
+        if not thread.summary:
+            thread.summary = next((r.content[:200] for r in rows if r.role == "user"), "")
+        thread.last_message_at = rows[-1].timestamp
+        thread.updated_at = datetime.datetime.utcnow()
+        self._commit(session)
+        return len(rows)
     
     def delete_thread(self, thread_id: str) -> bool:
-        """Delete thread"""
-        session = self.get_session()
-        try:
-            thread = session.query(Thread).filter(Thread.id == thread_id).first()
-            if thread:
-                session.delete(thread)
-                session.commit()
-                return True
-            return False
-        finally:
-            session.close()
+        """Delete thread and its messages"""
+        return self._write(self._delete_thread, thread_id)
+
+    def _delete_thread(self, session: Session, thread_id: str) -> bool:
+        thread = session.query(Thread).filter(Thread.id == thread_id).first()
+        if thread:
+            session.query(Message).filter(Message.thread_id == thread_id).delete(synchronize_session=False)
+            session.delete(thread)
+            self._commit(session)
+            return True
+        return False
     
     def update_thread_pinned(self, thread_id: str, pinned: bool) -> bool:
         """Pin or unpin a thread"""
-        session = self.get_session()
-        try:
-            thread = session.query(Thread).filter(Thread.id == thread_id).first()
-            if thread:
-                thread.pinned = pinned
-                thread.updated_at = datetime.datetime.utcnow()
-                session.commit()
-                return True
-            return False
-        finally:
-            session.close()
+        return self._write(self._update_thread_fields, thread_id, pinned=pinned)
     
     def update_thread_title(self, thread_id: str, title: str) -> bool:
         """Update thread title"""
-        session = self.get_session()
-        try:
-            thread = session.query(Thread).filter(Thread.id == thread_id).first()
-            if thread:
-                thread.title = title
-                thread.updated_at = datetime.datetime.utcnow()
-                session.commit()
-                return True
-            return False
-        finally:
-            session.close()
+        return self._write(self._update_thread_fields, thread_id, title=title)
+
+    def _update_thread_fields(self, session: Session, thread_id: str, **fields) -> bool:
+        thread = session.query(Thread).filter(Thread.id == thread_id).first()
+        if thread:
+            for name, value in fields.items():
+                setattr(thread, name, value)
+            thread.updated_at = datetime.datetime.utcnow()
+            self._commit(session)
+            return True
+        return False
     
     # === MEMORY ===
     
     def add_memory(self, category: str, content: str, importance: int = 5, tags: Optional[List[str]] = None, metadata: Optional[Dict] = None, title: Optional[str] = None) -> Dict:
         """Add memory entry"""
-        session = self.get_session()
-        try:
-            memory = Memory(
-                category=category,
-                title=title,
-                content=content,
-                importance=importance,
-                tags=tags or [],
-                meta_data=metadata or {}
-            )
-            session.add(memory)
-            session.commit()
-            session.refresh(memory)
-            return self._memory_to_dict(memory)
-        finally:
-            session.close()
+        result = self._write(self._add_memory, category, content, importance, tags, metadata, title)
+        self._notify_write("memory", "upsert", result)
+        return result
+
+    def _add_memory(self, session: Session, category: str, content: str, importance: int = 5,
+                    tags: Optional[List[str]] = None, metadata: Optional[Dict] = None,
+                    title: Optional[str] = None) -> Dict:
+        memory = Memory(
+            category=category,
+            title=title,
+            content=content,
+            importance=importance,
+            tags=tags or [],
+            meta_data=metadata or {}
+        )
+        session.add(memory)
+        session.flush()
+        self._set_memory_tags(session, memory.id, memory.tags)
+        self._commit(session)
+        session.refresh(memory)
+        return self._memory_to_dict(memory)
+
+    def bulk_add_memories(self, memories: List[Dict]) -> List[Dict]:
+        """Add many memories in one INSERT. Each dict takes add_memory's arguments
+        (category, content, importance, tags, metadata, title) plus an optional created_at.
+        """
+        results = self._write(self._bulk_add_memories, memories)
+        for result in results:
+            self._notify_write("memory", "upsert", result)
+        return results
+
+    def _bulk_add_memories(self, session: Session, memories: List[Dict]) -> List[Dict]:
+        now = datetime.datetime.utcnow()
+        rows = []
+        for m in memories or []:
+            created = self._message_timestamp(m.get("created_at"), now)
+            rows.append(dict(
+                category=m.get("category") or "notes",
+                title=m.get("title"),
+                content=m.get("content") or "",
+                importance=m.get("importance", 5),
+                tags=m.get("tags") or [],
+                meta_data=m.get("metadata") or {},
+                created_at=created,
+                updated_at=created,
+            ))
+        if not rows:
+            return []
+        inserted = session.scalars(insert(Memory).returning(Memory), rows).all()
+        tag_rows = [{"memory_id": m.id, "tag": t} for m in inserted for t in self._clean_tags(m.tags)]
+        if tag_rows:
+            session.execute(insert(MemoryTag), tag_rows)
+        results = [self._memory_to_dict(m) for m in inserted]
+        self._commit(session)
+        return results
+
+    @staticmethod
+    def _clean_tags(tags) -> List[str]:
+        """Distinct non-empty string tags, first occurrence order"""
+        return list(dict.fromkeys(t for t in (tags or []) if isinstance(t, str) and t))
+
+    def _set_memory_tags(self, session: Session, memory_id: int, tags) -> None:
+        """Replace the memory_tags rows of one memory"""
+        session.query(MemoryTag).filter(MemoryTag.memory_id == memory_id).delete(synchronize_session=False)
+        session.add_all(MemoryTag(memory_id=memory_id, tag=t) for t in self._clean_tags(tags))
     
     def get_memories(self, category: Optional[str] = None, limit: int = 100) -> List[Dict]:
         """Get memories, optionally filtered by category"""
@@ -455,141 +1073,134 @@ class PersistentMemoryDB:
         finally:
             session.close()
     
-    def search_memories(self, query: str, category: Optional[str] = None) -> List[Dict]:
-        """Search memories by content"""
+    def search_memories(self, query: str, category: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Search memories by title and content, best match first (full-text index when available)"""
         session = self.get_session()
         try:
+            ids = self._fulltext_ids(session, "memories", query, limit, {"category": category} if category else None)
+            if ids is not None:
+                return [self._memory_to_dict(m) for m in self._rows_in_order(session, Memory, ids)]
             q = session.query(Memory).filter(Memory.content.ilike(f"%{query}%"))
             if category:
                 q = q.filter(Memory.category == category)
-            memories = q.order_by(Memory.importance.desc(), Memory.created_at.desc()).all()
+            memories = q.order_by(Memory.importance.desc(), Memory.created_at.desc()).limit(limit).all()
             return [self._memory_to_dict(m) for m in memories]
         finally:
             session.close()
     
     def search_memories_by_tags(self, tags: List[str], match_all: bool = False) -> List[Dict]:
         """Search memories by tags (any or all)"""
+        tags = self._clean_tags(tags)
+        if not tags:
+            return []
         session = self.get_session()
         try:
-            query = session.query(Memory)
+            matching = session.query(MemoryTag.memory_id).filter(MemoryTag.tag.in_(tags))
             if match_all:
-                # Match all specified tags
-                for tag in tags:
-                    query = query.filter(Memory.tags.contains([tag]))
+                matching = matching.group_by(MemoryTag.memory_id).having(
+                    func.count(MemoryTag.tag) == len(tags))
             else:
-                # Match any specified tag
-                memories = []
-                for memory in session.query(Memory).all():
-                    if any(tag in (memory.tags or []) for tag in tags):
-                        memories.append(memory)
-                return [self._memory_to_dict(m) for m in memories]
-            
-            memories = query.order_by(Memory.importance.desc(), Memory.created_at.desc()).all()
+                matching = matching.distinct()
+            memories = session.query(Memory).filter(Memory.id.in_(matching.subquery().select())).order_by(
+                Memory.importance.desc(), Memory.created_at.desc()).all()
             return [self._memory_to_dict(m) for m in memories]
         finally:
             session.close()
     
     def get_all_tags(self, category: Optional[str] = None) -> List[str]:
         """Get all unique tags used in memories"""
+        return sorted(self.get_tag_counts(category))
+
+    def get_tag_counts(self, category: Optional[str] = None) -> Dict[str, int]:
+        """Number of memories per tag, most used first"""
         session = self.get_session()
         try:
-            query = session.query(Memory)
+            query = session.query(MemoryTag.tag, func.count(MemoryTag.memory_id))
             if category:
-                query = query.filter(Memory.category == category)
-            
-            memories = query.all()
-            all_tags = set()
-            for memory in memories:
-                if memory.tags:
-                    all_tags.update(memory.tags)
-            
-            return sorted(list(all_tags))
+                query = query.join(Memory, Memory.id == MemoryTag.memory_id).filter(Memory.category == category)
+            rows = query.group_by(MemoryTag.tag).order_by(func.count(MemoryTag.memory_id).desc(), MemoryTag.tag).all()
+            return {tag: count for tag, count in rows}
         finally:
             session.close()
     
     def update_memory_tags(self, memory_id: int, tags: List[str]) -> bool:
         """Update tags for a memory"""
-        session = self.get_session()
-        try:
-            memory = session.query(Memory).filter(Memory.id == memory_id).first()
-            if memory:
-                memory.tags = tags
-                flag_modified(memory, "tags")
-                memory.updated_at = datetime.datetime.utcnow()
-                session.commit()
-                return True
-            return False
-        finally:
-            session.close()
+        return self._edit_memory_tags(memory_id, lambda current: tags)
 
     def add_tag_to_memory(self, memory_id: int, tag: str) -> bool:
         """Add a tag to memory"""
-        session = self.get_session()
-        try:
-            memory = session.query(Memory).filter(Memory.id == memory_id).first()
-            if memory:
-                tags = list(memory.tags or [])
-                if tag not in tags:
-                    tags.append(tag)
-                    memory.tags = tags
-                    flag_modified(memory, "tags")
-                    memory.updated_at = datetime.datetime.utcnow()
-                    session.commit()
-                return True
-            return False
-        finally:
-            session.close()
+        return self._edit_memory_tags(memory_id, lambda current: current if tag in current else current + [tag])
 
     def remove_tag_from_memory(self, memory_id: int, tag: str) -> bool:
         """Remove a tag from memory"""
-        session = self.get_session()
-        try:
-            memory = session.query(Memory).filter(Memory.id == memory_id).first()
-            if memory:
-                tags = list(memory.tags or [])
-                if tag in tags:
-                    tags.remove(tag)
-                    memory.tags = tags
-                    flag_modified(memory, "tags")
-                    memory.updated_at = datetime.datetime.utcnow()
-                    session.commit()
-                return True
+        return self._edit_memory_tags(memory_id, lambda current: [t for t in current if t != tag])
+
+    def _edit_memory_tags(self, memory_id: int, edit) -> bool:
+        result = self._write(self._apply_memory_tags, memory_id, edit)
+        if result is None:
             return False
-        finally:
-            session.close()
+        if result:
+            self._notify_write("memory", "upsert", result)
+        return True
+
+    def _apply_memory_tags(self, session: Session, memory_id: int, edit) -> Optional[Dict]:
+        """The memory dict after edit(tags) — {} if the tags didn't change, None if there's no such memory"""
+        memory = session.query(Memory).filter(Memory.id == memory_id).first()
+        if not memory:
+            return None
+        current = list(memory.tags or [])
+        tags = list(edit(current))
+        if tags == current:
+            return {}
+        memory.tags = tags
+        flag_modified(memory, "tags")
+        memory.updated_at = datetime.datetime.utcnow()
+        self._set_memory_tags(session, memory_id, tags)
+        self._commit(session)
+        return self._memory_to_dict(memory)
     
     def delete_memory(self, memory_id: int) -> bool:
         """Delete memory"""
-        session = self.get_session()
-        try:
-            memory = session.query(Memory).filter(Memory.id == memory_id).first()
-            if memory:
-                session.delete(memory)
-                session.commit()
-                return True
+        if self._write(self._delete_memory, memory_id):
+            self._notify_write("memory", "delete", {"id": memory_id})
+            return True
+        return False
+
+    def _delete_memory(self, session: Session, memory_id: int) -> bool:
+        memory = session.query(Memory).filter(Memory.id == memory_id).first()
+        if not memory:
             return False
-        finally:
-            session.close()
+        session.delete(memory)
+        session.query(MemoryTag).filter(MemoryTag.memory_id == memory_id).delete(synchronize_session=False)
+        self._commit(session)
+        return True
     
     # === TASKS ===
     
-    def create_task(self, title: str, description: str = "", status: str = "inbox", priority: int = 0, tags: Optional[List[str]] = None) -> Dict:
-        """Create new task"""
-        session = self.get_session()
-        try:
-            task = Task(
-                title=title,
-                description=description,
-                status=status,
-                priority=priority,
-                tags=tags or []
-            )
-            session.add(task)
-            session.commit()
-            session.refresh(task)
-            return self._task_to_dict(task)
-        finally:
-            session.close()
+    def create_task(self, title: str, description: str = "", status: str = "inbox", priority: int = 0, tags: Optional[List[str]] = None,
+                    due_date: Optional[datetime.datetime] = None, reminder: bool = False, metadata: Optional[Dict] = None) -> Dict:
+        """Create new task (a reminder when reminder=True and due_date is set)"""
+        result = self._write(self._create_task, title, description, status, priority, tags, due_date, reminder, metadata)
+        self._notify_write("task", "upsert", result)
+        return result
+
+    def _create_task(self, session: Session, title: str, description: str = "", status: str = "inbox",
+                     priority: int = 0, tags: Optional[List[str]] = None, due_date: Optional[datetime.datetime] = None,
+                     reminder: bool = False, metadata: Optional[Dict] = None) -> Dict:
+        task = Task(
+            title=title,
+            description=description,
+            status=status,
+            priority=priority,
+            due_date=due_date,
+            reminder=reminder,
+            tags=tags or [],
+            meta_data=metadata or {}
+        )
+        session.add(task)
+        self._commit(session)
+        session.refresh(task)
+        return self._task_to_dict(task)
     
     def get_tasks(self, status: Optional[str] = None) -> List[Dict]:
         """Get tasks, optionally filtered by status"""
@@ -605,60 +1216,83 @@ class PersistentMemoryDB:
     
     def update_task(self, task_id: int, **kwargs) -> Optional[Dict]:
         """Update task fields"""
-        session = self.get_session()
-        try:
-            task = session.query(Task).filter(Task.id == task_id).first()
-            if not task:
-                return None
-            
-            for key, value in kwargs.items():
-                if hasattr(task, key):
-                    setattr(task, key, value)
-                    # JSON columns need flag_modified so SQLAlchemy detects the mutation
-                    if key in ("tags", "meta_data", "metadata"):
-                        flag_modified(task, key)
+        result = self._write(self._update_task, task_id, **kwargs)
+        if result:
+            self._notify_write("task", "upsert", result)
+        return result
 
-            if kwargs.get("status") == "done" and not task.completed_at:
-                task.completed_at = datetime.datetime.utcnow()
+    def _update_task(self, session: Session, task_id: int, **kwargs) -> Optional[Dict]:
+        task = session.query(Task).filter(Task.id == task_id).first()
+        if not task:
+            return None
 
-            session.commit()
-            session.refresh(task)
-            return self._task_to_dict(task)
-        finally:
-            session.close()
+        for key, value in kwargs.items():
+            if hasattr(task, key):
+                setattr(task, key, value)
+                # JSON columns need flag_modified so SQLAlchemy detects the mutation
+                if key in ("tags", "meta_data", "metadata"):
+                    flag_modified(task, key)
+
+        if kwargs.get("status") == "done" and not task.completed_at:
+            task.completed_at = datetime.datetime.utcnow()
+
+        self._commit(session)
+        session.refresh(task)
+        return self._task_to_dict(task)
     
     def delete_task(self, task_id: int) -> bool:
         """Delete task"""
-        session = self.get_session()
-        try:
-            task = session.query(Task).filter(Task.id == task_id).first()
-            if task:
-                session.delete(task)
-                session.commit()
-                return True
+        if self._write(self._delete_row, Task, task_id):
+            self._notify_write("task", "delete", {"id": task_id})
+            return True
+        return False
+
+    def fire_due_reminders(self, now: Optional[datetime.datetime] = None) -> List[Dict]:
+        """Mark every pending reminder due by now as done, in one write; returns the fired tasks"""
+        fired = self._write(self._fire_due_reminders, now or datetime.datetime.utcnow())
+        for task in fired:
+            self._notify_write("task", "upsert", task)
+        return fired
+
+    def _fire_due_reminders(self, session: Session, now: datetime.datetime) -> List[Dict]:
+        tasks = session.query(Task).filter(
+            Task.reminder == True, Task.status == "inbox", Task.due_date <= now
+        ).all()
+        for task in tasks:
+            task.status = "done"
+        if tasks:
+            self._commit(session)
+        return [self._task_to_dict(t) for t in tasks]
+
+    def _delete_row(self, session: Session, model, row_id: Any) -> bool:
+        row = session.query(model).filter(model.id == row_id).first()
+        if not row:
             return False
-        finally:
-            session.close()
+        session.delete(row)
+        self._commit(session)
+        return True
     
     # === RESEARCH ===
     
     def add_research(self, title: str, content: str, source: str = "manual", url: Optional[str] = None, tags: Optional[List[str]] = None) -> Dict:
         """Add research item"""
-        session = self.get_session()
-        try:
-            research = ResearchItem(
-                title=title,
-                content=content,
-                source=source,
-                url=url,
-                tags=tags or []
-            )
-            session.add(research)
-            session.commit()
-            session.refresh(research)
-            return self._research_to_dict(research)
-        finally:
-            session.close()
+        result = self._write(self._add_research, title, content, source, url, tags)
+        self._notify_write("research", "upsert", result)
+        return result
+
+    def _add_research(self, session: Session, title: str, content: str, source: str = "manual",
+                      url: Optional[str] = None, tags: Optional[List[str]] = None) -> Dict:
+        research = ResearchItem(
+            title=title,
+            content=content,
+            source=source,
+            url=url,
+            tags=tags or []
+        )
+        session.add(research)
+        self._commit(session)
+        session.refresh(research)
+        return self._research_to_dict(research)
     
     def get_research(self, limit: int = 100) -> List[Dict]:
         """Get research items"""
@@ -671,16 +1305,10 @@ class PersistentMemoryDB:
     
     def delete_research(self, research_id: int) -> bool:
         """Delete research item"""
-        session = self.get_session()
-        try:
-            research = session.query(ResearchItem).filter(ResearchItem.id == research_id).first()
-            if research:
-                session.delete(research)
-                session.commit()
-                return True
-            return False
-        finally:
-            session.close()
+        if self._write(self._delete_row, ResearchItem, research_id):
+            self._notify_write("research", "delete", {"id": research_id})
+            return True
+        return False
     
     # === ENHANCED RESEARCH ===
     def search_research_by_tag(self, tag: str) -> List[Dict]:
@@ -692,51 +1320,52 @@ class PersistentMemoryDB:
         finally:
             session.close()
     
-    def search_research(self, query: str) -> List[Dict]:
-        """Full-text search research"""
+    def search_research(self, query: str, limit: int = 100) -> List[Dict]:
+        """Full-text search research, best match first"""
         session = self.get_session()
         try:
+            ids = self._fulltext_ids(session, "research", query, limit)
+            if ids is not None:
+                return [self._research_to_dict(r) for r in self._rows_in_order(session, ResearchItem, ids)]
             items = session.query(ResearchItem).filter(
                 (ResearchItem.title.ilike(f'%{query}%')) | 
                 (ResearchItem.content.ilike(f'%{query}%'))
-            ).all()
+            ).limit(limit).all()
             return [self._research_to_dict(r) for r in items]
         finally:
             session.close()
     
     def update_research_citations(self, research_id: int, citations: List[Dict]) -> Dict:
         """Update citations for research item"""
-        session = self.get_session()
-        try:
-            research = session.query(ResearchItem).filter(ResearchItem.id == research_id).first()
-            if research:
-                research.citations = citations
-                session.commit()
-                session.refresh(research)
-                return self._research_to_dict(research)
+        return self._write(self._update_research_citations, research_id, citations)
+
+    def _update_research_citations(self, session: Session, research_id: int, citations: List[Dict]) -> Dict:
+        research = session.query(ResearchItem).filter(ResearchItem.id == research_id).first()
+        if not research:
             return {}
-        finally:
-            session.close()
+        research.citations = citations
+        self._commit(session)
+        session.refresh(research)
+        return self._research_to_dict(research)
     
     def add_research_source(self, research_id: int, url: str, title: str) -> Dict:
         """Add source to research item"""
-        session = self.get_session()
-        try:
-            research = session.query(ResearchItem).filter(ResearchItem.id == research_id).first()
-            if research:
-                sources = research.sources or []
-                sources.append({
-                    "url": url,
-                    "title": title,
-                    "accessed_at": datetime.datetime.utcnow().isoformat()
-                })
-                research.sources = sources
-                session.commit()
-                session.refresh(research)
-                return self._research_to_dict(research)
+        return self._write(self._add_research_source, research_id, url, title)
+
+    def _add_research_source(self, session: Session, research_id: int, url: str, title: str) -> Dict:
+        research = session.query(ResearchItem).filter(ResearchItem.id == research_id).first()
+        if not research:
             return {}
-        finally:
-            session.close()
+        sources = list(research.sources or [])
+        sources.append({
+            "url": url,
+            "title": title,
+            "accessed_at": datetime.datetime.utcnow().isoformat()
+        })
+        research.sources = sources
+        self._commit(session)
+        session.refresh(research)
+        return self._research_to_dict(research)
     
     def get_research_by_source(self, source: str) -> List[Dict]:
         """Get research items by source type (web, file, manual, etc)"""
@@ -751,23 +1380,24 @@ class PersistentMemoryDB:
     
     def add_document(self, filename: str, file_type: str, content: str, summary: Optional[str] = None, file_size: int = 0, tags: Optional[List[str]] = None, metadata: Optional[Dict] = None) -> Dict:
         """Add uploaded document"""
-        session = self.get_session()
-        try:
-            doc = Document(
-                filename=filename,
-                file_type=file_type,
-                content=content,
-                summary=summary,
-                file_size=file_size,
-                tags=tags or [],
-                meta_data=metadata or {}
-            )
-            session.add(doc)
-            session.commit()
-            session.refresh(doc)
-            return self._document_to_dict(doc)
-        finally:
-            session.close()
+        return self._write(self._add_document, filename, file_type, content, summary, file_size, tags, metadata)
+
+    def _add_document(self, session: Session, filename: str, file_type: str, content: str,
+                      summary: Optional[str] = None, file_size: int = 0, tags: Optional[List[str]] = None,
+                      metadata: Optional[Dict] = None) -> Dict:
+        doc = Document(
+            filename=filename,
+            file_type=file_type,
+            content=content,
+            summary=summary,
+            file_size=file_size,
+            tags=tags or [],
+            meta_data=metadata or {}
+        )
+        session.add(doc)
+        self._commit(session)
+        session.refresh(doc)
+        return self._document_to_dict(doc)
     
     def get_documents(self, limit: int = 50) -> List[Dict]:
         """Get all documents"""
@@ -778,15 +1408,18 @@ class PersistentMemoryDB:
         finally:
             session.close()
     
-    def search_documents(self, query: str) -> List[Dict]:
-        """Search document content"""
+    def search_documents(self, query: str, limit: int = 100) -> List[Dict]:
+        """Search document filename, summary and content, best match first"""
         session = self.get_session()
         try:
+            ids = self._fulltext_ids(session, "documents", query, limit)
+            if ids is not None:
+                return [self._document_to_dict(d) for d in self._rows_in_order(session, Document, ids)]
             docs = session.query(Document).filter(
                 (Document.content.ilike(f"%{query}%")) |
                 (Document.filename.ilike(f"%{query}%")) |
                 (Document.summary.ilike(f"%{query}%"))
-            ).order_by(Document.created_at.desc()).all()
+            ).order_by(Document.created_at.desc()).limit(limit).all()
             return [self._document_to_dict(d) for d in docs]
         finally:
             session.close()
@@ -802,47 +1435,38 @@ class PersistentMemoryDB:
     
     def delete_document(self, doc_id: int) -> bool:
         """Delete document"""
-        session = self.get_session()
-        try:
-            doc = session.query(Document).filter(Document.id == doc_id).first()
-            if doc:
-                session.delete(doc)
-                session.commit()
-                return True
-            return False
-        finally:
-            session.close()
+        return self._write(self._delete_row, Document, doc_id)
 
     # === MEDIA ===
 
     def add_media_item(self, media_id: str, media_type: str, url: str, prompt: str = "", metadata: Optional[Dict] = None, created_at: Optional[datetime.datetime] = None) -> Dict:
         """Add or update a generated media item."""
-        session = self.get_session()
-        try:
-            item = session.query(MediaItem).filter(MediaItem.id == media_id).first()
-            if not item:
-                item = MediaItem(
-                    id=media_id,
-                    type=media_type,
-                    url=url,
-                    prompt=prompt,
-                    meta_data=metadata or {},
-                    created_at=created_at or datetime.datetime.utcnow(),
-                )
-                session.add(item)
-            else:
-                item.type = media_type
-                item.url = url
-                item.prompt = prompt
-                item.meta_data = metadata or {}
-                flag_modified(item, "meta_data")
-                if created_at:
-                    item.created_at = created_at
-            session.commit()
-            session.refresh(item)
-            return self._media_to_dict(item)
-        finally:
-            session.close()
+        return self._write(self._add_media_item, media_id, media_type, url, prompt, metadata, created_at)
+
+    def _add_media_item(self, session: Session, media_id: str, media_type: str, url: str, prompt: str = "",
+                        metadata: Optional[Dict] = None, created_at: Optional[datetime.datetime] = None) -> Dict:
+        item = session.query(MediaItem).filter(MediaItem.id == media_id).first()
+        if not item:
+            item = MediaItem(
+                id=media_id,
+                type=media_type,
+                url=url,
+                prompt=prompt,
+                meta_data=metadata or {},
+                created_at=created_at or datetime.datetime.utcnow(),
+            )
+            session.add(item)
+        else:
+            item.type = media_type
+            item.url = url
+            item.prompt = prompt
+            item.meta_data = metadata or {}
+            flag_modified(item, "meta_data")
+            if created_at:
+                item.created_at = created_at
+        self._commit(session)
+        session.refresh(item)
+        return self._media_to_dict(item)
 
     def get_media_items(self, media_type: Optional[str] = None, limit: int = 100) -> List[Dict]:
         """Get media items, newest first."""
@@ -858,34 +1482,24 @@ class PersistentMemoryDB:
 
     def delete_media_item(self, media_id: str) -> bool:
         """Delete media item by id."""
-        session = self.get_session()
-        try:
-            item = session.query(MediaItem).filter(MediaItem.id == media_id).first()
-            if item:
-                session.delete(item)
-                session.commit()
-                return True
-            return False
-        finally:
-            session.close()
+        return self._write(self._delete_row, MediaItem, media_id)
     
     # === PATTERNS ===
     
     def add_pattern(self, pattern_type: str, pattern_data: Dict, confidence: int = 5) -> Dict:
         """Add learned pattern"""
-        session = self.get_session()
-        try:
-            pattern = Pattern(
-                pattern_type=pattern_type,
-                pattern_data=pattern_data,
-                confidence=confidence
-            )
-            session.add(pattern)
-            session.commit()
-            session.refresh(pattern)
-            return self._pattern_to_dict(pattern)
-        finally:
-            session.close()
+        return self._write(self._add_pattern, pattern_type, pattern_data, confidence)
+
+    def _add_pattern(self, session: Session, pattern_type: str, pattern_data: Dict, confidence: int = 5) -> Dict:
+        pattern = Pattern(
+            pattern_type=pattern_type,
+            pattern_data=pattern_data,
+            confidence=confidence
+        )
+        session.add(pattern)
+        self._commit(session)
+        session.refresh(pattern)
+        return self._pattern_to_dict(pattern)
     
     def get_patterns(self, pattern_type: Optional[str] = None) -> List[Dict]:
         """Get learned patterns"""
@@ -903,30 +1517,62 @@ class PersistentMemoryDB:
     
     def log_event(self, event_type: str, topic: Optional[str] = None, response_time_ms: int = 0, 
                   input_tokens: int = 0, output_tokens: int = 0, response_length: int = 0,
-                  ai_provider: str = "unknown", success: bool = True, error_message: Optional[str] = None) -> Dict:
-        """Log analytics event"""
-        session = self.get_session()
-        try:
-            event = Analytics(
-                event_type=event_type,
-                topic=topic,
-                response_time_ms=response_time_ms,
-                input_tokens=input_tokens,
-                output_tokens=output_tokens,
-                response_length=response_length,
-                ai_provider=ai_provider,
-                success=success,
-                error_message=error_message
-            )
-            session.add(event)
-            session.commit()
-            session.refresh(event)
-            return self._analytics_to_dict(event)
-        finally:
-            session.close()
+                  ai_provider: str = "unknown", success: bool = True, error_message: Optional[str] = None) -> None:
+        """Log analytics event. The row is only buffered here and inserted in a batch shortly
+        after (see _AnalyticsBuffer), so there is no saved row to return; call flush_events()
+        to write it now, or bulk_log_events() to insert synchronously."""
+        fields = self._event_fields(event_type, topic, response_time_ms, input_tokens, output_tokens,
+                                    response_length, ai_provider, success, error_message)
+        self._events.add(fields)
+
+    def bulk_log_events(self, events: List[Dict]) -> int:
+        """Insert many analytics events now, in one INSERT. Each dict takes log_event's
+        arguments plus optional created_at / metadata; returns the number written."""
+        rows = [self._event_fields(**e) for e in events or []]
+        return self._write(self._insert_events, rows) if rows else 0
+
+    def _event_fields(self, event_type: str, topic: Optional[str] = None, response_time_ms: int = 0,
+                      input_tokens: int = 0, output_tokens: int = 0, response_length: int = 0,
+                      ai_provider: str = "unknown", success: bool = True, error_message: Optional[str] = None,
+                      created_at: Any = None, metadata: Optional[Dict] = None) -> Dict:
+        """Column values for one event. Types are checked here, before the event is
+        buffered, so a bad call fails on its own instead of inside a later batch."""
+        if not isinstance(event_type, str) or not event_type:
+            raise TypeError(f"event_type must be a non-empty string, got {event_type!r}")
+        for name, value in (("topic", topic), ("ai_provider", ai_provider), ("error_message", error_message)):
+            if value is not None and not isinstance(value, str):
+                raise TypeError(f"{name} must be a string, got {type(value).__name__}")
+        counts = {}
+        for name, value in (("response_time_ms", response_time_ms), ("input_tokens", input_tokens),
+                            ("output_tokens", output_tokens), ("response_length", response_length)):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise TypeError(f"{name} must be a number, got {type(value).__name__}")
+            counts[name] = int(value)
+        if metadata is not None and not isinstance(metadata, dict):
+            raise TypeError(f"metadata must be a dict, got {type(metadata).__name__}")
+        return dict(
+            event_type=event_type,
+            topic=topic,
+            **counts,
+            ai_provider=ai_provider or "unknown",
+            success=bool(success),
+            error_message=error_message,
+            created_at=self._message_timestamp(created_at) if created_at is not None else datetime.datetime.utcnow(),
+            meta_data=metadata or {},
+        )
+
+    def flush_events(self) -> int:
+        """Write queued log_event calls now"""
+        return self._events.flush()
+
+    def _insert_events(self, session: Session, rows: List[Dict]) -> int:
+        session.execute(insert(Analytics), rows)
+        self._commit(session)
+        return len(rows)
     
     def get_analytics(self, event_type: Optional[str] = None, days: int = 7) -> List[Dict]:
         """Get analytics events from last N days"""
+        self.flush_events()
         session = self.get_session()
         try:
             cutoff_date = datetime.datetime.utcnow() - datetime.timedelta(days=days)
@@ -940,13 +1586,34 @@ class PersistentMemoryDB:
             session.close()
     
     def get_analytics_summary(self, days: int = 7) -> Dict:
-        """Get analytics summary (stats, topics, providers)"""
+        """Get analytics summary (stats, topics, providers).
+        Whole days and hours already rolled up are read from analytics_rollups; only the
+        edges of the window are aggregated from raw events, GROUP BY in SQL either way.
+        """
+        self.flush_events()
         session = self.get_session()
         try:
-            cutoff_date = datetime.datetime.utcnow() - datetime.timedelta(days=days)
-            events = session.query(Analytics).filter(Analytics.created_at >= cutoff_date).all()
-            
-            if not events:
+            now = datetime.datetime.utcnow()
+            cutoff_date = now - datetime.timedelta(days=days)
+            hour_end, day_end = self._rollup_watermarks(session)
+            groups = []
+            start = _ceil(cutoff_date, _floor_hour, _HOUR)
+            if hour_end is None or start >= hour_end:
+                groups += self._raw_totals(session, cutoff_date, now)
+            else:
+                groups += self._raw_totals(session, cutoff_date, start)
+                day_start = _ceil(start, _floor_day, _DAY)
+                if day_end is not None and day_start < day_end:
+                    groups += self._rollup_totals(session, "hour", start, day_start)
+                    groups += self._rollup_totals(session, "day", day_start, day_end)
+                    groups += self._rollup_totals(session, "hour", day_end, hour_end)
+                else:
+                    groups += self._rollup_totals(session, "hour", start, hour_end)
+                # A day can be rolled past the last hour bucket when its final hours were empty
+                groups += self._raw_totals(session, max(hour_end, day_end or hour_end), now)
+
+            total = sum(g[3] for g in groups)
+            if not total:
                 return {
                     "total_events": 0,
                     "successful_events": 0,
@@ -957,43 +1624,133 @@ class PersistentMemoryDB:
                     "providers": {},
                     "event_types": {}
                 }
-            
-            # Calculate stats
-            total = len(events)
-            successful = sum(1 for e in events if e.success)
-            failed = total - successful
-            avg_response_time = sum(e.response_time_ms or 0 for e in events) // max(total, 1)
-            total_tokens = sum((e.input_tokens or 0) + (e.output_tokens or 0) for e in events)
-            
-            # Count topics
-            topics = {}
-            for e in events:
-                if e.topic:
-                    topics[e.topic] = topics.get(e.topic, 0) + 1
-            
-            # Count providers
-            providers = {}
-            for e in events:
-                providers[e.ai_provider] = providers.get(e.ai_provider, 0) + 1
-            
-            # Count event types
-            event_types = {}
-            for e in events:
-                event_types[e.event_type] = event_types.get(e.event_type, 0) + 1
+
+            successful = sum(g[4] or 0 for g in groups)
+            topics, providers, event_types = {}, {}, {}
+            for event_type, topic, provider, count, *_ in groups:
+                if topic:
+                    topics[topic] = topics.get(topic, 0) + count
+                providers[provider] = providers.get(provider, 0) + count
+                event_types[event_type] = event_types.get(event_type, 0) + count
             
             return {
                 "total_events": total,
                 "successful_events": successful,
-                "failed_events": failed,
+                "failed_events": total - successful,
                 "success_rate": round((successful / total * 100) if total > 0 else 0, 1),
-                "avg_response_time_ms": avg_response_time,
-                "total_tokens": total_tokens,
+                "avg_response_time_ms": sum(g[5] or 0 for g in groups) // max(total, 1),
+                "total_tokens": sum((g[6] or 0) + (g[7] or 0) for g in groups),
                 "topics": topics,
                 "providers": providers,
                 "event_types": event_types
             }
         finally:
             session.close()
+
+    @staticmethod
+    def _raw_totals(session: Session, start: datetime.datetime, end: datetime.datetime) -> List[Tuple]:
+        """(event_type, topic, ai_provider, events, successes, response ms, input, output tokens) from raw events"""
+        if start >= end:
+            return []
+        return session.query(
+            Analytics.event_type, Analytics.topic, Analytics.ai_provider,
+            func.count(Analytics.id),
+            func.sum(case((Analytics.success.is_(True), 1), else_=0)),
+            func.sum(func.coalesce(Analytics.response_time_ms, 0)),
+            func.sum(func.coalesce(Analytics.input_tokens, 0)),
+            func.sum(func.coalesce(Analytics.output_tokens, 0)),
+        ).filter(Analytics.created_at >= start, Analytics.created_at < end).group_by(
+            Analytics.event_type, Analytics.topic, Analytics.ai_provider).all()
+
+    @staticmethod
+    def _rollup_totals(session: Session, period: str, start: datetime.datetime,
+                       end: datetime.datetime) -> List[Tuple]:
+        """Same shape as _raw_totals, from the period rollups with bucket in [start, end)"""
+        if start >= end:
+            return []
+        r = AnalyticsRollup
+        return session.query(
+            r.event_type, r.topic, r.ai_provider, func.sum(r.events), func.sum(r.successes),
+            func.sum(r.response_time_ms), func.sum(r.input_tokens), func.sum(r.output_tokens),
+        ).filter(r.period == period, r.bucket >= start, r.bucket < end).group_by(
+            r.event_type, r.topic, r.ai_provider).all()
+
+    @staticmethod
+    def _rollup_watermarks(session: Session) -> Tuple[Optional[datetime.datetime], Optional[datetime.datetime]]:
+        """End (exclusive) of the hours and of the days rolled up so far, None before the first rollup"""
+        ends = []
+        for period, step in (("hour", _HOUR), ("day", _DAY)):
+            last = session.query(func.max(AnalyticsRollup.bucket)).filter(AnalyticsRollup.period == period).scalar()
+            ends.append(last + step if last is not None else None)
+        return ends[0], ends[1]
+
+    def roll_up_analytics(self) -> int:
+        """Add rollup rows for every hour and day that has ended since the last run; returns rows added"""
+        return self._write(self._roll_up_analytics)
+
+    def _roll_up_analytics(self, session: Session) -> int:
+        hour_end, day_end = self._rollup_watermarks(session)
+        dialect = session.bind.dialect.name
+        # Hours are closed a couple of flush intervals after they end, so buffered events land first
+        grace = datetime.timedelta(seconds=max(60, 3 * self._events._flush_every))
+        upto = _floor_hour(datetime.datetime.utcnow() - grace)
+        if hour_end is None:
+            first = session.query(func.min(Analytics.created_at)).scalar()
+            if first is None:
+                return 0
+            hour_end = _floor_hour(first)
+        added = 0
+        if hour_end < upto:
+            bucket = self._bucket(dialect, "hour", Analytics.created_at)
+            rows = session.query(
+                bucket, Analytics.event_type, Analytics.topic, Analytics.ai_provider,
+                func.count(Analytics.id),
+                func.sum(case((Analytics.success.is_(True), 1), else_=0)),
+                func.sum(func.coalesce(Analytics.response_time_ms, 0)),
+                func.sum(func.coalesce(Analytics.input_tokens, 0)),
+                func.sum(func.coalesce(Analytics.output_tokens, 0)),
+            ).filter(Analytics.created_at >= hour_end, Analytics.created_at < upto).group_by(
+                bucket, Analytics.event_type, Analytics.topic, Analytics.ai_provider).all()
+            added += self._add_rollups(session, "hour", rows)
+            session.flush()  # the day sums below read these
+
+        # Days are summed from their hours once every hour of the day has been rolled up
+        if day_end is None:
+            first = session.query(func.min(AnalyticsRollup.bucket)).filter(AnalyticsRollup.period == "hour").scalar()
+            day_end = _floor_day(first) if first is not None else None
+        if day_end is not None:
+            day_upto = _floor_day(max(hour_end, upto))
+            if day_end < day_upto:
+                r = AnalyticsRollup
+                bucket = self._bucket(dialect, "day", r.bucket)
+                rows = session.query(
+                    bucket, r.event_type, r.topic, r.ai_provider, func.sum(r.events), func.sum(r.successes),
+                    func.sum(r.response_time_ms), func.sum(r.input_tokens), func.sum(r.output_tokens),
+                ).filter(r.period == "hour", r.bucket >= day_end, r.bucket < day_upto).group_by(
+                    bucket, r.event_type, r.topic, r.ai_provider).all()
+                added += self._add_rollups(session, "day", rows)
+        self._commit(session)
+        return added
+
+    @staticmethod
+    def _bucket(dialect: str, period: str, column):
+        if dialect == "sqlite":
+            return func.strftime("%Y-%m-%d %H:00:00" if period == "hour" else "%Y-%m-%d 00:00:00", column)
+        return func.date_trunc(period, column)
+
+    @staticmethod
+    def _add_rollups(session: Session, period: str, rows: List[Tuple]) -> int:
+        objects = []
+        for bucket, event_type, topic, provider, events, successes, response_ms, tokens_in, tokens_out in rows:
+            if isinstance(bucket, str):
+                bucket = datetime.datetime.strptime(bucket, "%Y-%m-%d %H:%M:%S")
+            objects.append(AnalyticsRollup(
+                period=period, bucket=bucket, event_type=event_type, topic=topic, ai_provider=provider,
+                events=events or 0, successes=successes or 0, response_time_ms=response_ms or 0,
+                input_tokens=tokens_in or 0, output_tokens=tokens_out or 0,
+            ))
+        session.add_all(objects)
+        return len(objects)
     
     # === PERSONALITY ===
     
@@ -1010,39 +1767,41 @@ class PersistentMemoryDB:
                        system_prompt: Optional[str] = None, tone: Optional[str] = None,
                        response_style: Optional[str] = None, preferences: Optional[Dict] = None) -> Dict:
         """Update personality settings"""
-        session = self.get_session()
-        try:
-            personality = session.query(Personality).filter(Personality.id == personality_id).first()
-            
-            if not personality:
-                # Create default personality
-                personality = Personality(
-                    id=personality_id,
-                    name=name or "default",
-                    system_prompt=system_prompt or "",
-                    tone=tone or "balanced",
-                    response_style=response_style or "concise",
-                    preferences=preferences or {}
-                )
-                session.add(personality)
-            else:
-                if name is not None:
-                    personality.name = name
-                if system_prompt is not None:
-                    personality.system_prompt = system_prompt
-                if tone is not None:
-                    personality.tone = tone
-                if response_style is not None:
-                    personality.response_style = response_style
-                if preferences is not None:
-                    personality.preferences = preferences
-                personality.updated_at = datetime.datetime.utcnow()
-            
-            session.commit()
-            session.refresh(personality)
-            return self._personality_to_dict(personality)
-        finally:
-            session.close()
+        return self._write(self._set_personality, personality_id, name, system_prompt, tone,
+                           response_style, preferences)
+
+    def _set_personality(self, session: Session, personality_id: int = 1, name: Optional[str] = None,
+                         system_prompt: Optional[str] = None, tone: Optional[str] = None,
+                         response_style: Optional[str] = None, preferences: Optional[Dict] = None) -> Dict:
+        personality = session.query(Personality).filter(Personality.id == personality_id).first()
+
+        if not personality:
+            # Create default personality
+            personality = Personality(
+                id=personality_id,
+                name=name or "default",
+                system_prompt=system_prompt or "",
+                tone=tone or "balanced",
+                response_style=response_style or "concise",
+                preferences=preferences or {}
+            )
+            session.add(personality)
+        else:
+            if name is not None:
+                personality.name = name
+            if system_prompt is not None:
+                personality.system_prompt = system_prompt
+            if tone is not None:
+                personality.tone = tone
+            if response_style is not None:
+                personality.response_style = response_style
+            if preferences is not None:
+                personality.preferences = preferences
+            personality.updated_at = datetime.datetime.utcnow()
+
+        self._commit(session)
+        session.refresh(personality)
+        return self._personality_to_dict(personality)
     
     def get_preset_personalities(self) -> list:
         """Get preset personality templates (8 options total)"""
@@ -1100,29 +1859,110 @@ class PersistentMemoryDB:
     
     # === HELPER METHODS ===
     
-    def _thread_to_dict(self, thread: Thread, include_messages: bool = True) -> Dict:
-        """Convert Thread to dict.
-        Set include_messages=False for lightweight list views.
+    def _thread_to_dict(self, thread, messages: Optional[List[Dict]] = None) -> Dict:
+        """Convert a Thread (or a _thread_list_query row) to dict.
+        Pass messages for the full view; list views leave them out.
         """
-        # Extract summary from first user message or use generated title
-        summary = ""
-        if thread.messages:
-            first_user_msg = next((m.get('content', '') for m in thread.messages if m.get('role') == 'user'), '')
-            summary = first_user_msg[:200]  # First 200 chars as summary
+        if messages is not None and not messages and getattr(thread, "messages", None):
+            messages = list(thread.messages)  # not backfilled yet — see _backfill_thread_messages
+        count, summary = thread.message_count, thread.summary or ""
+        if count is None and messages is not None:
+            # List columns not backfilled yet — summary from the first user message
+            count = len(messages)
+            summary = str(next((m.get('content', '') for m in messages if m.get('role') == 'user'), '') or '')[:200]
         
         result = {
             "id": thread.id,
             "title": thread.title,
             "summary": summary,  # Preview text for cards
-            "pinned": thread.pinned if hasattr(thread, 'pinned') else False,
-            "message_count": len(thread.messages) if thread.messages else 0,
+            "pinned": bool(thread.pinned),
+            "message_count": count or 0,
+            "last_message_at": thread.last_message_at.isoformat() if thread.last_message_at else None,
             "created_at": thread.created_at.isoformat() if thread.created_at else None,
             "updated_at": thread.updated_at.isoformat() if thread.updated_at else None,
             "metadata": thread.meta_data or {}
         }
-        if include_messages:
-            result["messages"] = thread.messages or []
+        if messages is not None:
+            result["messages"] = messages
         return result
+
+    # --- messages table helpers ---
+
+    @staticmethod
+    def _message_timestamp(value: Any, default: Optional[datetime.datetime] = None) -> datetime.datetime:
+        """Message timestamps arrive as epoch ms (frontend), epoch seconds, ISO strings or datetimes"""
+        try:
+            if isinstance(value, datetime.datetime):
+                if value.tzinfo is not None:
+                    value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+                return value
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return datetime.datetime.utcfromtimestamp(value / 1000 if value > 1e11 else value)
+            if isinstance(value, str) and value:
+                parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+                if parsed.tzinfo is not None:
+                    parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+                return parsed
+        except (ValueError, OverflowError, OSError):
+            pass
+        return default or datetime.datetime.utcnow()
+
+    def _message_row(self, thread_id: str, seq: int, message: Dict,
+                     default_ts: Optional[datetime.datetime] = None) -> "Message":
+        """Message dict → row. Keys other than role/content ride along in meta_data so reads round-trip."""
+        role = message.get("role") or ("user" if message.get("from") == "user" else "assistant")
+        content = message.get("content", message.get("text", ""))
+        meta = {k: v for k, v in message.items() if k not in ("role", "content")}
+        if not isinstance(content, str):
+            # Multi-part body (text + images): keep it whole, index its text
+            meta["content"] = content
+            parts = content if isinstance(content, list) else []
+            content = "\n".join(p.get("text", "") for p in parts if isinstance(p, dict) and p.get("type") == "text")
+        return Message(
+            thread_id=thread_id,
+            seq=seq,
+            role=role,
+            content=content or "",
+            meta_data=meta,
+            timestamp=self._message_timestamp(message.get("timestamp"), default_ts),
+        )
+
+    def _message_to_dict(self, row: "Message") -> Dict:
+        message = {"role": row.role, "content": row.content}
+        message.update(row.meta_data or {})
+        return message
+
+    def _load_messages(self, session: Session, thread_ids: List[str]) -> Dict[str, List[Dict]]:
+        """All messages of the given threads in one query, grouped by thread"""
+        by_thread: Dict[str, List[Dict]] = {tid: [] for tid in thread_ids}
+        for start in range(0, len(thread_ids), 500):
+            rows = session.query(Message).filter(
+                Message.thread_id.in_(thread_ids[start:start + 500])
+            ).order_by(Message.thread_id, Message.seq).all()
+            for row in rows:
+                by_thread[row.thread_id].append(self._message_to_dict(row))
+        return by_thread
+
+    def _tail_messages(self, session: Session, thread_id: str, n: int) -> List[Dict]:
+        rows = session.query(Message).filter(
+            Message.thread_id == thread_id
+        ).order_by(Message.seq.desc()).limit(n).all()
+        return [self._message_to_dict(row) for row in reversed(rows)]
+
+    def _message_stats(self, session: Session, thread_ids: List[str]) -> Dict[str, Tuple[int, str, Optional[datetime.datetime]]]:
+        """(message_count, summary, last_message_at) per thread from aggregate queries — no message bodies loaded"""
+        counts = session.query(Message.thread_id, func.count(Message.id), func.max(Message.timestamp))
+        first_user = session.query(
+            Message.thread_id.label("thread_id"), func.min(Message.seq).label("seq")
+        ).filter(Message.role == "user")
+        counts = counts.filter(Message.thread_id.in_(thread_ids))
+        first_user = first_user.filter(Message.thread_id.in_(thread_ids))
+        first_user = first_user.group_by(Message.thread_id).subquery()
+        summaries = dict(session.query(Message.thread_id, func.substr(Message.content, 1, 200)).join(
+            first_user, and_(Message.thread_id == first_user.c.thread_id, Message.seq == first_user.c.seq)
+        ).all())
+        return {tid: (count, summaries.get(tid) or "", last_at)
+                for tid, count, last_at in counts.group_by(Message.thread_id).all()}
     
     def _memory_to_dict(self, memory: Memory) -> Dict:
         """Convert Memory to dict"""
@@ -1183,6 +2023,16 @@ class PersistentMemoryDB:
                 if "updated_at" not in thr_cols:
                     session.execute(text("ALTER TABLE threads ADD COLUMN updated_at DATETIME"))
                     session.commit()
+                # No defaults: NULL marks threads _backfill_thread_stats still has to fill
+                if "message_count" not in thr_cols:
+                    session.execute(text("ALTER TABLE threads ADD COLUMN message_count INTEGER"))
+                    session.commit()
+                if "summary" not in thr_cols:
+                    session.execute(text("ALTER TABLE threads ADD COLUMN summary TEXT"))
+                    session.commit()
+                if "last_message_at" not in thr_cols:
+                    session.execute(text("ALTER TABLE threads ADD COLUMN last_message_at DATETIME"))
+                    session.commit()
 
                 # SQLite: ensure legacy tasks tables have modern columns.
                 task_cols = {row[1] for row in session.execute(text("PRAGMA table_info(tasks)")).fetchall()}
@@ -1230,6 +2080,10 @@ class PersistentMemoryDB:
                 session.execute(text("ALTER TABLE threads ADD COLUMN IF NOT EXISTS meta_data JSONB DEFAULT '{}'::jsonb"))
                 session.execute(text("ALTER TABLE threads ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT NOW()"))
                 session.execute(text("ALTER TABLE threads ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT NOW()"))
+                # No defaults: NULL marks threads _backfill_thread_stats still has to fill
+                session.execute(text("ALTER TABLE threads ADD COLUMN IF NOT EXISTS message_count INTEGER"))
+                session.execute(text("ALTER TABLE threads ADD COLUMN IF NOT EXISTS summary TEXT"))
+                session.execute(text("ALTER TABLE threads ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMP"))
                 # memories — ensure all ORM columns exist
                 session.execute(text("ALTER TABLE memories ADD COLUMN IF NOT EXISTS title VARCHAR"))
                 session.execute(text("ALTER TABLE memories ADD COLUMN IF NOT EXISTS importance INTEGER DEFAULT 5"))
@@ -1259,12 +2113,255 @@ class PersistentMemoryDB:
                 except Exception as _e:
                     session.rollback()
                     print(f"⚠️  creative_items rename (PostgreSQL) skipped: {_e}")
+
+            # Both dialects: thread list keyset index — NULL sort keys would break the cursor
+            try:
+                session.execute(text("UPDATE threads SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL"))
+                session.execute(text("UPDATE threads SET pinned = :f WHERE pinned IS NULL"), {"f": False})
+                session.execute(text("CREATE INDEX IF NOT EXISTS ix_threads_pinned_updated ON threads (pinned, updated_at)"))
+                session.commit()
+            except Exception as _e:
+                session.rollback()
+                print(f"⚠️  threads list index skipped: {_e}")
+
+            # Both dialects: analytics are read by time window
+            try:
+                session.execute(text("CREATE INDEX IF NOT EXISTS ix_analytics_created_at ON analytics (created_at)"))
+                session.commit()
+            except Exception as _e:
+                session.rollback()
+                print(f"⚠️  analytics index skipped: {_e}")
+
+            # Both dialects: full-text indexes for the search_* methods
+            self._ensure_fulltext(session, dialect)
+
+            # Both dialects: copy Memory.tags of older rows into memory_tags
+            try:
+                self._backfill_memory_tags(session)
+            except Exception as _e:
+                session.rollback()
+                print(f"⚠️  memory tags backfill skipped: {_e}")
+
+            # Legacy JSON message arrays are copied into the messages table in the
+            # background (see _run_backfills), not here on the first request
         except Exception as _schema_err:
             print(f"⚠️  Schema migration error (non-fatal): {_schema_err}")
             session.rollback()
         finally:
             session.close()
 
+    def _ensure_fulltext(self, session: Session, dialect: str) -> None:
+        """Create the full-text index of each _FULLTEXT table if missing; searches fall back to ILIKE without one"""
+        for table, columns in _FULLTEXT.items():
+            names = [c for c, _ in columns]
+            try:
+                if dialect == "sqlite":
+                    fts = f"{table}_fts"
+                    exists = session.execute(text(
+                        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"), {"n": fts}).first()
+                    cols, new_vals = ", ".join(names), ", ".join(f"new.{c}" for c in names)
+                    old_vals = ", ".join(f"old.{c}" for c in names)
+                    session.execute(text(
+                        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+                        f"content='{table}', content_rowid='id', tokenize='porter unicode61')"))
+                    session.execute(text(
+                        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+                        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END"))
+                    session.execute(text(
+                        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+                        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END"))
+                    session.execute(text(
+                        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+                        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+                        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END"))
+                    if not exists:
+                        session.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+                        print(f"✅ Built full-text index {fts}")
+                else:
+                    vector = " || ".join(
+                        f"setweight(to_tsvector('english', coalesce({c}, '')), '{w}')" for c, w in columns)
+                    session.execute(text(
+                        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_tsv tsvector "
+                        f"GENERATED ALWAYS AS ({vector}) STORED"))
+                    session.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS ix_{table}_search_tsv ON {table} USING GIN (search_tsv)"))
+                session.commit()
+                self._fulltext_ready.add(table)
+            except Exception as _e:
+                session.rollback()
+                print(f"⚠️  full-text index for {table} unavailable — searching with ILIKE: {_e}")
+
+    def _fulltext_ids(self, session: Session, table: str, query: str, limit: int,
+                      filters: Optional[Dict[str, Any]] = None) -> Optional[List[int]]:
+        """Best-ranked ids of table rows matching query, or None if the index can't answer it"""
+        if table not in self._fulltext_ready:
+            return None
+        dialect = session.bind.dialect.name
+        match = _fulltext_query(query, dialect)
+        if match is None:
+            return None
+        params: Dict[str, Any] = {"q": match, "limit": limit}
+        where = ""
+        for i, (column, value) in enumerate((filters or {}).items()):
+            where += f" AND t.{column} = :f{i}"
+            params[f"f{i}"] = value
+        if dialect == "sqlite":
+            fts = f"{table}_fts"
+            weights = ", ".join(str(_FTS5_WEIGHTS[w]) for _, w in _FULLTEXT[table])
+            sql = (f"SELECT t.id FROM {fts} JOIN {table} t ON t.id = {fts}.rowid "
+                   f"WHERE {fts} MATCH :q{where} ORDER BY bm25({fts}, {weights}), t.id DESC LIMIT :limit")
+        else:
+            sql = (f"SELECT t.id FROM {table} t, to_tsquery('english', :q) query "
+                   f"WHERE t.search_tsv @@ query{where} "
+                   f"ORDER BY ts_rank_cd(t.search_tsv, query) DESC, t.id DESC LIMIT :limit")
+        return [row[0] for row in session.execute(text(sql), params).fetchall()]
+
+    @staticmethod
+    def _rows_in_order(session: Session, model, ids: List[int]) -> List[Any]:
+        rows = {r.id: r for r in session.query(model).filter(model.id.in_(ids)).all()} if ids else {}
+        return [rows[i] for i in ids if i in rows]
+
+    def _start_backfills(self) -> None:
+        if self._backfill_thread is None:
+            self._backfill_thread = threading.Thread(target=self._run_backfills, daemon=True, name="VesperBackfill")
+            self._backfill_thread.start()
+
+    def _run_backfills(self) -> None:
+        """Copy legacy threads.messages arrays into message rows, then fill the list columns
+        of older threads. Runs once per process off the request path; each page is its own
+        write (through the SQLite writer), so an interrupted run resumes where it stopped."""
+        try:
+            migrated, cursor = 0, ""
+            while cursor is not None:
+                cursor, n = self._write(self._backfill_thread_messages, cursor)
+                migrated += n
+            if migrated:
+                print(f"✅ Copied messages of {migrated} threads into the messages table")
+            filled = 0
+            while True:
+                n = self._write(self._backfill_thread_stats)
+                if not n:
+                    break
+                filled += n
+            if filled:
+                print(f"✅ Backfilled list columns for {filled} threads")
+        except Exception as e:
+            print(f"⚠️  thread messages backfill stopped, resumes next start: {e}")
+
+    def _copy_legacy_messages(self, session: Session, thread) -> List["Message"]:
+        """Add message rows for a thread's legacy JSON array. The array itself is left in
+        place until clear_legacy_thread_messages() has checked the copy."""
+        rows = [
+            self._message_row(thread.id, seq, m, default_ts=thread.created_at)
+            for seq, m in enumerate(m for m in (thread.messages or []) if isinstance(m, dict))
+        ]
+        session.add_all(rows)
+        return rows
+
+    def _backfill_thread_messages(self, session: Session, cursor: str,
+                                  page_size: int = 100) -> Tuple[Optional[str], int]:
+        """One keyset page of the messages backfill: returns (next cursor or None when done, threads copied).
+        Threads that already have rows are left alone."""
+        page = session.query(Thread).filter(Thread.id > cursor).order_by(Thread.id.asc()).limit(page_size).all()
+        if not page:
+            return None, 0
+        migrated = 0
+        for thread in page:
+            if not thread.messages or not isinstance(thread.messages, list):
+                continue
+            if session.query(Message.id).filter(Message.thread_id == thread.id).first() is not None:
+                continue
+            rows = self._copy_legacy_messages(session, thread)
+            first_user = next((r.content for r in rows if r.role == "user"), "")
+            # Keep updated_at as it was — the migration isn't thread activity
+            session.query(Thread).filter(Thread.id == thread.id).update({
+                Thread.message_count: len(rows),
+                Thread.summary: first_user[:200],
+                Thread.last_message_at: rows[-1].timestamp if rows else None,
+                Thread.updated_at: Thread.updated_at,
+            }, synchronize_session=False)
+            migrated += 1
+        self._commit(session)
+        return page[-1].id, migrated
+
+    def clear_legacy_thread_messages(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Explicit cleanup once the messages backfill has run: empty threads.messages for
+        each thread whose message rows cover its whole legacy array. Threads whose rows don't
+        match are reported and left untouched. dry_run only reports."""
+        result: Dict[str, Any] = {"cleared": 0, "mismatched": [], "dry_run": dry_run}
+        cursor = ""
+        while cursor is not None:
+            cursor, cleared, mismatched = self._write(self._clear_legacy_page, cursor, dry_run)
+            result["cleared"] += cleared
+            result["mismatched"] += mismatched
+        if result["mismatched"]:
+            print(f"⚠️  {len(result['mismatched'])} threads kept their legacy messages — row counts differ")
+        return result
+
+    def _clear_legacy_page(self, session: Session, cursor: str, dry_run: bool,
+                           page_size: int = 100) -> Tuple[Optional[str], int, List[str]]:
+        page = session.query(Thread.id, Thread.messages).filter(Thread.id > cursor).order_by(
+            Thread.id.asc()).limit(page_size).all()
+        if not page:
+            return None, 0, []
+        cleared, mismatched = [], []
+        for thread_id, legacy in page:
+            if not legacy or not isinstance(legacy, list):
+                continue
+            n = sum(1 for m in legacy if isinstance(m, dict))
+            copied = session.query(func.count(Message.id)).filter(
+                Message.thread_id == thread_id, Message.seq < n).scalar()
+            (cleared if copied == n else mismatched).append(thread_id)
+        if cleared and not dry_run:
+            session.query(Thread).filter(Thread.id.in_(cleared)).update(
+                {Thread.messages: [], Thread.updated_at: Thread.updated_at}, synchronize_session=False)
+            self._commit(session)
+        return page[-1][0], len(cleared), mismatched
+
+    def _backfill_memory_tags(self, session: Session, page_size: int = 500) -> None:
+        """Create memory_tags rows for memories that have tags but none there yet (older rows).
+        Keyset pages with a commit each, so an interrupted run resumes where it stopped.
+        """
+        migrated = 0
+        cursor = 0
+        while True:
+            page = session.query(Memory.id, Memory.tags).filter(Memory.id > cursor).order_by(
+                Memory.id.asc()).limit(page_size).all()
+            if not page:
+                break
+            cursor = page[-1][0]
+            tagged = {mid: tags for mid, tags in page if self._clean_tags(tags)}
+            if not tagged:
+                continue
+            done = {row[0] for row in session.query(MemoryTag.memory_id).filter(
+                MemoryTag.memory_id.in_(list(tagged))).distinct().all()}
+            for mid, tags in tagged.items():
+                if mid not in done:
+                    self._set_memory_tags(session, mid, tags)
+                    migrated += 1
+            session.commit()
+        if migrated:
+            print(f"✅ Indexed tags of {migrated} memories in memory_tags")
+
+    def _backfill_thread_stats(self, session: Session, page_size: int = 500) -> int:
+        """Fill message_count / summary / last_message_at on up to page_size threads from
+        before those columns existed; returns how many were filled (0 when none are left)"""
+        ids = [row[0] for row in session.query(Thread.id).filter(
+            Thread.message_count.is_(None)).limit(page_size).all()]
+        if not ids:
+            return 0
+        stats = self._message_stats(session, ids)
+        for thread_id in ids:
+            count, summary, last_at = stats.get(thread_id, (0, "", None))
+            session.query(Thread).filter(Thread.id == thread_id).update({
+                Thread.message_count: count,
+                Thread.summary: summary,
+                Thread.last_message_at: last_at,
+                Thread.updated_at: Thread.updated_at,
+            }, synchronize_session=False)
+        self._commit(session)
+        return len(ids)
+
     def get_schema_status(self) -> Dict[str, Any]:
         """Return schema/migration status for diagnostics and health checks."""
         self._ensure_initialized()
@@ -1272,6 +2369,7 @@ class PersistentMemoryDB:
         result: Dict[str, Any] = {
             "ok": True,
             "backend": "sqlite" if self._use_sqlite else "postgresql",
+            "pool": self.engine.pool.status() if self.engine is not None else None,
             "tasks_columns": {},
             "migration_checked_at": datetime.datetime.utcnow().isoformat(),
         }
@@ -1297,6 +2395,8 @@ class PersistentMemoryDB:
             result["tasks_columns"] = {col: (col in task_cols) for col in required}
             result["missing_task_columns"] = [col for col in required if col not in task_cols]
             result["ok"] = len(result["missing_task_columns"]) == 0
+            backfill = self._backfill_thread
+            result["messages_backfill"] = "running" if backfill is not None and backfill.is_alive() else "done"
             return result
         except Exception as e:
             result["ok"] = False
@@ -1386,7 +2486,9 @@ class PersistentMemoryDB:
             "event_type": analytics.event_type,
             "topic": analytics.topic,
             "response_time_ms": analytics.response_time_ms,
-            "tokens": analytics.tokens,
+            "input_tokens": analytics.input_tokens or 0,
+            "output_tokens": analytics.output_tokens or 0,
+            "tokens": (analytics.input_tokens or 0) + (analytics.output_tokens or 0),
             "ai_provider": analytics.ai_provider,
             "success": analytics.success,
             "error_message": analytics.error_message,
@@ -1432,10 +2534,11 @@ class PersistentMemoryDB:
             # Analyze all messages across threads
             all_user_messages = []
             all_assistant_responses = []
+            by_thread = self._load_messages(session, [t.id for t in threads])
             
             for thread in threads:
-                if thread.messages:
-                    for msg in thread.messages:
+                if by_thread[thread.id]:
+                    for msg in by_thread[thread.id]:
                         role = msg.get("role") or msg.get("from", "")
                         content = msg.get("content") or msg.get("text", "")
                         
@@ -1648,100 +2751,28 @@ class PersistentMemoryDB:
         return style.strip()
     
     def get_knowledge_graph(self):
-        """Build a graph representation of all memories, tasks, and research"""
-        session = self.get_session()
-        nodes = []
-        links = []
+        """Build a graph representation of all memories, tasks, and research (uncached — see knowledge_graph.graph)"""
+        from knowledge_graph import KnowledgeGraph
         try:
-            # 1. Fetch data
-            memories = session.query(Memory).all()
-            tasks = session.query(Task).all()
-            research = session.query(ResearchItem).all()
-            
-            # 2. Build Nodes
-            # Type colors (frontend will use these or map them):
-            # Memory: 1 (Blue/Cyan), Task: 2 (Green/Red), Research: 3 (Purple/Magenta)
-            
-            for m in memories:
-                nodes.append({
-                    "id": f"mem-{m.id}",
-                    "name": m.content[:50] + "..." if len(m.content) > 50 else m.content,
-                    "full_text": m.content,
-                    "group": 1, # Memory
-                    "val": m.importance * 2 or 5,
-                    "tags": m.tags or [],
-                    "category": m.category
-                })
-                
-            for t in tasks:
-                val = 5
-                if t.priority == 'high': val = 15
-                elif t.priority == 'medium': val = 10
-                
-                nodes.append({
-                    "id": f"task-{t.id}",
-                    "name": t.title,
-                    "full_text": t.description,
-                    "group": 2, # Task
-                    "val": val,
-                    "tags": t.tags or [],
-                    "status": t.status
-                })
-                
-            for r in research:
-                nodes.append({
-                    "id": f"res-{r.id}",
-                    "name": r.title,
-                    "full_text": r.content[:100],
-                    "group": 3, # Research
-                    "val": (r.confidence or 0.5) * 20,
-                    "tags": r.tags or [],
-                    "source": r.source
-                })
-                
-            # 3. Build Links based on shared tags
-            # Complexity: O(N^2) - can be optimized but fine for <1000 items
-            # Better strategy: Map tags to items, then link items sharing tags
-            
-            tag_map = {}
-            for node in nodes:
-                for tag in (node.get("tags") or []):
-                    tag = tag.lower().strip()
-                    if tag not in tag_map:
-                        tag_map[tag] = []
-                    tag_map[tag].append(node["id"])
-                    
-            # Create links based on co-occurrence in tags
-            linked_pairs = set()
-            
-            for tag, item_ids in tag_map.items():
-                if len(item_ids) > 1:
-                    # Link all items sharing this tag
-                    for i in range(len(item_ids)):
-                        for j in range(i + 1, len(item_ids)):
-                            pair = tuple(sorted((item_ids[i], item_ids[j])))
-                            if pair not in linked_pairs:
-                                links.append({
-                                    "source": item_ids[i],
-                                    "target": item_ids[j],
-                                    "value": 1, # Strength
-                                    "type": "tag",
-                                    "tag": tag
-                                })
-                                linked_pairs.add(pair)
-                            else:
-                                # Increase strength if already linked
-                                for link in links:
-                                    if (link["source"] == item_ids[i] and link["target"] == item_ids[j]) or \
-                                       (link["source"] == item_ids[j] and link["target"] == item_ids[i]):
-                                        link["value"] += 1
-                                        break
-                                        
-            return {"nodes": nodes, "links": links}
-            
+            return KnowledgeGraph(self).snapshot()
         except Exception as e:
             print(f"Error building graph: {e}")
             return {"nodes": [], "links": []}
+
+    def get_graph_records(self) -> Dict[str, List[Dict]]:
+        """The fields knowledge_graph needs from every memory, task and research item — no full rows"""
+        session = self.get_session()
+        try:
+            columns = {
+                "memory": (Memory, ("id", "content", "importance", "tags", "category")),
+                "task": (Task, ("id", "title", "description", "priority", "tags", "status")),
+                "research": (ResearchItem, ("id", "title", "content", "confidence", "tags", "source")),
+            }
+            return {
+                kind: [dict(zip(names, row)) for row in
+                       session.query(*[getattr(model, n) for n in names]).order_by(model.id).all()]
+                for kind, (model, names) in columns.items()
+            }
         finally:
             session.close()
 
@@ -1752,35 +2783,35 @@ class PersistentMemoryDB:
                       preview: str = "", file_path: str = None,
                       metadata: dict = None, status: str = "draft") -> dict:
         """Upsert a creative item (ebook, song, proposal, etc.)."""
-        session = self.get_session()
         try:
-            preview = preview or (content[:500] + "…" if len(content) > 500 else content)
-            existing = session.query(CreativeItem).filter_by(id=id).first()
-            if existing:
-                existing.title = title
-                existing.type = type
-                existing.preview = preview
-                existing.content = content
-                existing.file_path = file_path
-                existing.item_metadata = metadata or {}
-                flag_modified(existing, "item_metadata")
-                existing.status = status
-                existing.updated_at = datetime.datetime.utcnow()
-            else:
-                session.add(CreativeItem(
-                    id=id, type=type, title=title, preview=preview,
-                    content=content, file_path=file_path,
-                    item_metadata=metadata or {}, status=status,
-                    created_at=datetime.datetime.utcnow()
-                ))
-            session.commit()
-            return {"id": id, "type": type, "title": title, "status": status}
+            return self._write(self._save_creation, id, type, title, content, preview, file_path, metadata, status)
         except Exception as e:
-            session.rollback()
             print(f"Error saving creation {id}: {e}")
             return {}
-        finally:
-            session.close()
+
+    def _save_creation(self, session: Session, id: str, type: str, title: str, content: str,
+                       preview: str, file_path: Optional[str], metadata: Optional[dict], status: str) -> dict:
+        preview = preview or (content[:500] + "…" if len(content) > 500 else content)
+        existing = session.query(CreativeItem).filter_by(id=id).first()
+        if existing:
+            existing.title = title
+            existing.type = type
+            existing.preview = preview
+            existing.content = content
+            existing.file_path = file_path
+            existing.item_metadata = metadata or {}
+            flag_modified(existing, "item_metadata")
+            existing.status = status
+            existing.updated_at = datetime.datetime.utcnow()
+        else:
+            session.add(CreativeItem(
+                id=id, type=type, title=title, preview=preview,
+                content=content, file_path=file_path,
+                item_metadata=metadata or {}, status=status,
+                created_at=datetime.datetime.utcnow()
+            ))
+        self._commit(session)
+        return {"id": id, "type": type, "title": title, "status": status}
 
     def get_all_creations(self, type: str = None, limit: int = 200) -> list:
         """List all creations, optionally filtered by type."""
@@ -1826,62 +2857,61 @@ class PersistentMemoryDB:
             session.close()
 
     def delete_creation(self, id: str) -> bool:
-        session = self.get_session()
         try:
-            session.query(CreativeItem).filter_by(id=id).delete()
-            session.commit()
+            self._write(self._delete_where, CreativeItem, id=id)
             return True
-        except Exception as e:
-            session.rollback()
+        except Exception:
             return False
-        finally:
-            session.close()
+
+    def _delete_where(self, session: Session, model, **filters) -> int:
+        count = session.query(model).filter_by(**filters).delete()
+        self._commit(session)
+        return count
 
     def update_creation_status(self, id: str, status: str) -> dict:
         """Update only the status field of a creation (e.g. draft → published)."""
-        session = self.get_session()
         try:
-            item = session.query(CreativeItem).filter_by(id=id).first()
-            if not item:
-                return {"error": "not found"}
-            item.status = status
-            item.updated_at = datetime.datetime.utcnow()
-            session.commit()
-            return {"id": id, "status": status}
+            return self._write(self._update_creation_status, id, status)
         except Exception as e:
-            session.rollback()
             return {"error": str(e)}
-        finally:
-            session.close()
+
+    def _update_creation_status(self, session: Session, id: str, status: str) -> dict:
+        item = session.query(CreativeItem).filter_by(id=id).first()
+        if not item:
+            return {"error": "not found"}
+        item.status = status
+        item.updated_at = datetime.datetime.utcnow()
+        self._commit(session)
+        return {"id": id, "status": status}
 
     def log_sale(self, creation_id: str, platform: str, amount: float,
                  currency: str = "USD", notes: str = "") -> dict:
         """Log a real sale for a creation so the income dashboard shows truth."""
-        session = self.get_session()
         try:
-            row = IncomeSale(
-                creation_id=creation_id,
-                platform=platform,
-                amount=amount,
-                currency=currency,
-                notes=notes,
-                sold_at=datetime.datetime.utcnow(),
-            )
-            session.add(row)
-            session.commit()
-            session.refresh(row)
-            return {
-                "id": row.id,
-                "creation_id": creation_id,
-                "platform": platform,
-                "amount": amount,
-                "sold_at": row.sold_at.isoformat(),
-            }
+            return self._write(self._log_sale, creation_id, platform, amount, currency, notes)
         except Exception as e:
-            session.rollback()
             return {"error": str(e)}
-        finally:
-            session.close()
+
+    def _log_sale(self, session: Session, creation_id: str, platform: str, amount: float,
+                  currency: str, notes: str) -> dict:
+        row = IncomeSale(
+            creation_id=creation_id,
+            platform=platform,
+            amount=amount,
+            currency=currency,
+            notes=notes,
+            sold_at=datetime.datetime.utcnow(),
+        )
+        session.add(row)
+        self._commit(session)
+        session.refresh(row)
+        return {
+            "id": row.id,
+            "creation_id": creation_id,
+            "platform": platform,
+            "amount": amount,
+            "sold_at": row.sold_at.isoformat(),
+        }
 
     def get_sales(self, creation_id: str = None, limit: int = 200) -> list:
         """Get logged sales, optionally filtered to one creation."""
@@ -1913,20 +2943,19 @@ class PersistentMemoryDB:
 
     def add_gap_entry(self, entry: str, mood: str = "", source: str = "heartbeat") -> dict:
         """Record a thought Vesper had while CC was away."""
-        session = self.get_session()
         try:
-            row = GapsJournalEntry(entry=entry, mood=mood, source=source)
-            session.add(row)
-            session.commit()
-            session.refresh(row)
-            return {"id": row.id, "entry": row.entry, "mood": row.mood,
-                    "written_at": row.written_at.isoformat(), "source": row.source}
+            return self._write(self._add_gap_entry, entry, mood, source)
         except Exception as e:
-            session.rollback()
             print(f"Error writing gap entry: {e}")
             return {}
-        finally:
-            session.close()
+
+    def _add_gap_entry(self, session: Session, entry: str, mood: str, source: str) -> dict:
+        row = GapsJournalEntry(entry=entry, mood=mood, source=source)
+        session.add(row)
+        self._commit(session)
+        session.refresh(row)
+        return {"id": row.id, "entry": row.entry, "mood": row.mood,
+                "written_at": row.written_at.isoformat(), "source": row.source}
 
     def get_gap_entries(self, limit: int = 50, unseen_only: bool = False) -> list:
         """Get recent gap journal entries."""
@@ -1950,16 +2979,15 @@ class PersistentMemoryDB:
 
     def mark_gaps_seen(self) -> int:
         """Mark all unseen entries as seen. Returns count marked."""
-        session = self.get_session()
         try:
-            count = session.query(GapsJournalEntry).filter_by(seen_by_cc=False).update({"seen_by_cc": True})
-            session.commit()
-            return count
-        except Exception as e:
-            session.rollback()
+            return self._write(self._mark_gaps_seen)
+        except Exception:
             return 0
-        finally:
-            session.close()
+
+    def _mark_gaps_seen(self, session: Session) -> int:
+        count = session.query(GapsJournalEntry).filter_by(seen_by_cc=False).update({"seen_by_cc": True})
+        self._commit(session)
+        return count
 
     def unseen_gap_count(self) -> int:
         session = self.get_session()
@@ -1974,22 +3002,21 @@ class PersistentMemoryDB:
 
     def save_config(self, key: str, value: str) -> bool:
         """Upsert a config value (e.g. an API key saved through Vesper's UI)."""
-        session = self.get_session()
         try:
-            existing = session.query(VesperConfig).filter_by(key=key).first()
-            if existing:
-                existing.value = value
-                existing.updated_at = datetime.datetime.utcnow()
-            else:
-                session.add(VesperConfig(key=key, value=value))
-            session.commit()
-            return True
+            return self._write(self._save_config, key, value)
         except Exception as e:
-            session.rollback()
             print(f"Error saving config {key}: {e}")
             return False
-        finally:
-            session.close()
+
+    def _save_config(self, session: Session, key: str, value: str) -> bool:
+        existing = session.query(VesperConfig).filter_by(key=key).first()
+        if existing:
+            existing.value = value
+            existing.updated_at = datetime.datetime.utcnow()
+        else:
+            session.add(VesperConfig(key=key, value=value))
+        self._commit(session)
+        return True
 
     def get_all_config(self) -> dict:
         """Return all stored config as a plain dict {key: value}."""
@@ -2005,16 +3032,11 @@ class PersistentMemoryDB:
 
     def delete_config(self, key: str) -> bool:
         """Remove a stored config entry."""
-        session = self.get_session()
         try:
-            session.query(VesperConfig).filter_by(key=key).delete()
-            session.commit()
+            self._write(self._delete_where, VesperConfig, key=key)
             return True
-        except Exception as e:
-            session.rollback()
+        except Exception:
             return False
-        finally:
-            session.close()
 
 
 # Global database instance
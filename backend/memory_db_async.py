@@ -0,0 +1,172 @@
+"""
+Async access to PersistentMemoryDB for FastAPI handlers
+Same methods, awaitable, so a slow round trip to Postgres never stalls the event
+loop (and with it every other user's streaming response).
+
+Hot-path thread methods run natively on SQLAlchemy asyncio — asyncpg for
+PostgreSQL, aiosqlite for SQLite — reusing the exact query code of the sync
+class through AsyncSession.run_sync. Every other method, and everything when
+those drivers aren't installed or VESPER_DB_ASYNC=off, runs the sync method on
+a small dedicated thread pool.
+
+Usage:
+    from memory_db_async import adb
+    thread = await adb.get_thread(thread_id, tail=200)
+"""
+
+import os
+import asyncio
+import functools
+import importlib.util
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+try:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+except ImportError:
+    create_async_engine = None
+    async_sessionmaker = None
+
+from memory_db import PersistentMemoryDB, db, _postgres_pool_options, _configure_sqlite
+
+# Sync fallback: enough workers for a few concurrent chats without outrunning the Postgres pool
+_DB_WORKERS = 8
+_DB_EXECUTOR = ThreadPoolExecutor(max_workers=_DB_WORKERS, thread_name_prefix="vesper-db")
+
+
+def _async_engine_args(sync_url: str) -> Optional[Tuple[Any, Dict[str, Any]]]:
+    """(async URL, create_async_engine kwargs) for the sync DB's URL, or None if its driver is missing"""
+    url = make_url(sync_url)
+    if importlib.util.find_spec("greenlet") is None:
+        return None
+    if url.get_backend_name() == "sqlite":
+        if importlib.util.find_spec("aiosqlite") is None:
+            return None
+        return url.set(drivername="sqlite+aiosqlite"), {}
+    if importlib.util.find_spec("asyncpg") is None:
+        return None
+    # libpq-only query options become asyncpg connect arguments
+    query = dict(url.query)
+    connect_args: Dict[str, Any] = {"timeout": float(query.pop("connect_timeout", 15))}
+    sslmode = query.pop("sslmode", None)
+    if sslmode:
+        connect_args["ssl"] = sslmode
+    pool = _postgres_pool_options()
+    if pool["poolclass"] is NullPool:
+        options: Dict[str, Any] = {"poolclass": NullPool}
+    else:
+        # Same sizing; create_async_engine picks its async-adapted queue pool itself
+        options = {k: v for k, v in pool.items() if k not in ("poolclass", "connect_args")}
+    options["connect_args"] = connect_args
+    return url.set(drivername="postgresql+asyncpg", query=query), options
+
+
+class AsyncMemoryDB:
+    """Awaitable facade over a PersistentMemoryDB — see the module docstring."""
+
+    # Methods with a session-taking _body in PersistentMemoryDB, run natively when possible
+    _NATIVE = {
+        "create_thread": "_create_thread",
+        "get_thread": "_get_thread",
+        "get_all_threads": "_get_all_threads",
+        "get_threads_page": "_get_threads_page",
+        "get_thread_messages": "_get_thread_messages",
+        "get_thread_tail": "_tail_messages",
+        "add_message_to_thread": "_add_message_to_thread",
+    }
+    # Native writes that go through the SQLite single-writer queue instead
+    _WRITES = {"create_thread", "add_message_to_thread"}
+
+    def __init__(self, sync_db: PersistentMemoryDB):
+        self._db = sync_db
+        self._sessions = None  # async_sessionmaker once started, False when running on threads only
+        self._start_lock = asyncio.Lock()
+        # Appends to one thread queue up in-process instead of racing for the next seq
+        self._append_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    async def _to_thread(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_DB_EXECUTOR, functools.partial(fn, *args, **kwargs))
+
+    async def _start(self):
+        async with self._start_lock:
+            if self._sessions is not None:
+                return
+            # Connect, fall back and migrate on the sync side first — the async engine follows its URL
+            await self._to_thread(lambda: self._db.get_session().close())
+            self._sessions = False
+            if os.getenv("VESPER_DB_ASYNC", "auto").strip().lower() == "off" or create_async_engine is None:
+                return
+            args = _async_engine_args(self._db.database_url)
+            if args is None:
+                print("⚠️  async DB driver (asyncpg/aiosqlite) not installed — DB calls run on a thread pool")
+                return
+            try:
+                url, options = args
+                engine = create_async_engine(url, **options)
+                if url.get_backend_name() == "sqlite":
+                    _configure_sqlite(engine.sync_engine)
+                self._sessions = async_sessionmaker(engine, autoflush=False)
+                print(f"✅ Async DB ready ({url.drivername})")
+            except Exception as e:
+                print(f"⚠️  async DB engine failed ({e}) — DB calls run on a thread pool")
+
+    async def _run(self, name: str, *args, **kwargs):
+        if self._sessions is None:
+            await self._start()
+        impl = self._NATIVE.get(name)
+        writer = self._db._writer
+        if impl and name in self._WRITES and writer is not None:
+            # Awaiting the writer's future directly — no thread parked on it
+            return await asyncio.wrap_future(writer.submit(getattr(self._db, impl), *args, **kwargs))
+        if impl and self._sessions:
+            async with self._sessions() as session:
+                return await session.run_sync(getattr(self._db, impl), *args, **kwargs)
+        return await self._to_thread(getattr(self._db, name), *args, **kwargs)
+
+    # === THREADS (native) ===
+
+    async def create_thread(self, thread_id: str, title: str, metadata: Optional[Dict] = None) -> Dict:
+        return await self._run("create_thread", thread_id, title, metadata)
+
+    async def get_thread(self, thread_id: str, tail: Optional[int] = None) -> Optional[Dict]:
+        return await self._run("get_thread", thread_id, tail)
+
+    async def get_all_threads(self, include_messages: bool = False) -> List[Dict]:
+        return await self._run("get_all_threads", include_messages)
+
+    async def get_threads_page(self, limit: int = 50, cursor: Optional[str] = None) -> Dict:
+        return await self._run("get_threads_page", limit, cursor)
+
+    async def get_thread_messages(self, thread_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        return await self._run("get_thread_messages", thread_id, offset, limit)
+
+    async def get_thread_tail(self, thread_id: str, n: int = 20) -> List[Dict]:
+        return await self._run("get_thread_tail", thread_id, n)
+
+    async def add_message_to_thread(self, thread_id: str, message: Dict) -> Optional[Dict]:
+        lock = self._append_locks.get(thread_id)
+        if lock is None:
+            lock = self._append_locks[thread_id] = asyncio.Lock()
+        async with lock:
+            return await self._run("add_message_to_thread", thread_id, message)
+
+    # === EVERYTHING ELSE (thread pool) ===
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._db, name)
+        if name.startswith("_") or not callable(attr):
+            raise AttributeError(name)
+
+        async def call(*args, **kwargs):
+            return await self._run(name, *args, **kwargs)
+
+        call.__name__ = name
+        return call
+
+
+adb = AsyncMemoryDB(db)
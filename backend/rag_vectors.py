@@ -0,0 +1,236 @@
+"""
+Vesper RAG — semantic retrieval tier
+Embeds each indexed document once, when it is written, so a query costs one
+query embedding plus a single matrix multiply.
+
+Embedders:
+  - sentence-transformers model on CPU when VESPER_EMBED_MODEL is set and the package is installed
+  - hashed word + character-trigram embeddings otherwise (zero dependencies)
+
+Storage: float32 matrix in vesper_identity/rag_vectors.f32 (memory-mapped when
+numpy is available, plain array('f') otherwise) + rag_vectors.json mapping
+doc_id → row. Search is brute force — exact, and fast enough well past 100k rows.
+"""
+
+import os
+import json
+import re
+import math
+import zlib
+from array import array
+from typing import List, Dict, Tuple, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_WORD_RE = re.compile(r"[a-z0-9]{2,}")
+
+
+# ---------------------------------------------------------------------------
+# Embedders — each exposes name, dim, min_similarity and embed(text)
+# ---------------------------------------------------------------------------
+
+class HashedNgramEmbedder:
+    """
+    Feature-hashed bag of words + character trigrams, L2-normalized.
+    Trigrams let "storms"/"stormy"/"thunderstorm" land near each other,
+    which plain keyword overlap can't do.
+    """
+
+    min_similarity = 0.1  # ~2σ above chance for random 384-d hashed vectors
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.name = f"hashed-ngram-{dim}"
+
+    def embed(self, text: str) -> List[float]:
+        vec = [0.0] * self.dim
+        for word in _WORD_RE.findall((text or "").lower()):
+            self._add(vec, word, 0.5)
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                self._add(vec, padded[i:i + 3], 0.5)
+        norm = math.sqrt(sum(v * v for v in vec))
+        return [v / norm for v in vec] if norm else vec
+
+    def _add(self, vec: List[float], feature: str, weight: float):
+        h = zlib.crc32(feature.encode("utf-8"))
+        vec[h % self.dim] += weight if h & 0x80000000 else -weight
+
+
+class SentenceTransformerEmbedder:
+    """Local CPU embedding model via sentence-transformers (e.g. all-MiniLM-L6-v2)."""
+
+    min_similarity = 0.3
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st:{model_name}"
+
+    def embed(self, text: str) -> List[float]:
+        return [float(v) for v in self.model.encode(text or "", normalize_embeddings=True)]
+
+
+_EMBEDDER = None
+
+
+def get_embedder():
+    """Process-wide embedder: the configured local model, or the hashed fallback."""
+    global _EMBEDDER
+    if _EMBEDDER is None:
+        model_name = os.getenv("VESPER_EMBED_MODEL", "").strip()
+        if model_name:
+            try:
+                _EMBEDDER = SentenceTransformerEmbedder(model_name)
+                print(f"[RAG] semantic tier using local model {model_name}")
+            except Exception as e:
+                print(f"[RAG] embedding model {model_name} unavailable ({e}) — using hashed n-grams")
+        if _EMBEDDER is None:
+            _EMBEDDER = HashedNgramEmbedder()
+    return _EMBEDDER
+
+
+# ---------------------------------------------------------------------------
+# Vector store
+# ---------------------------------------------------------------------------
+
+class VectorStore:
+    """
+    Fixed-width float32 rows keyed by doc_id. Freed rows are zeroed and reused,
+    so the file only grows when the corpus does. Not thread-safe on its own —
+    RagIndex calls it under its lock.
+    """
+
+    def __init__(self, path_prefix: str, embedder):
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.meta_path = path_prefix + ".json"
+        self.data_path = path_prefix + ".f32"
+        self.rows: Dict[str, int] = {}
+        self.slot_ids: List[Optional[str]] = []
+        self.free: List[int] = []
+        self.capacity = 0
+        self._mat = None
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            capacity = int(meta.get("capacity", 0))
+            if meta.get("embedder") != self.embedder.name or not capacity:
+                return
+            if os.path.getsize(self.data_path) != capacity * self.dim * 4:
+                return
+        except Exception:
+            return
+        if np is not None:
+            self._mat = np.memmap(self.data_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        else:
+            self._mat = array("f")
+            with open(self.data_path, "rb") as f:
+                self._mat.fromfile(f, capacity * self.dim)
+        self.capacity = capacity
+        self.rows = {k: int(v) for k, v in (meta.get("rows") or {}).items()}
+        self.slot_ids = [None] * capacity
+        for doc_id, slot in self.rows.items():
+            self.slot_ids[slot] = doc_id
+        self.free = [i for i in range(capacity - 1, -1, -1) if self.slot_ids[i] is None]
+
+    def _grow(self):
+        new_capacity = max(256, self.capacity * 2)
+        os.makedirs(os.path.dirname(self.data_path), exist_ok=True)
+        if np is not None:
+            if self._mat is not None:
+                self._mat.flush()
+                self._mat = None
+            # "wb" on first growth discards a stale file from another embedder
+            with open(self.data_path, "ab" if self.capacity else "wb") as f:
+                f.truncate(new_capacity * self.dim * 4)  # zero-filled extension
+            self._mat = np.memmap(self.data_path, dtype=np.float32, mode="r+", shape=(new_capacity, self.dim))
+        else:
+            if self._mat is None:
+                self._mat = array("f")
+            self._mat.extend([0.0] * ((new_capacity - self.capacity) * self.dim))
+        self.slot_ids.extend([None] * (new_capacity - self.capacity))
+        self.free.extend(range(new_capacity - 1, self.capacity - 1, -1))
+        self.capacity = new_capacity
+        self._dirty = True
+
+    def _write_row(self, slot: int, vector: List[float]):
+        if np is not None:
+            self._mat[slot] = vector
+        else:
+            start = slot * self.dim
+            self._mat[start:start + self.dim] = array("f", vector)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.rows
+
+    def add_text(self, doc_id: str, text: str):
+        """Embed text and store it under doc_id (replacing any previous vector)."""
+        self.add(doc_id, self.embedder.embed(text))
+
+    def add(self, doc_id: str, vector: List[float]):
+        slot = self.rows.get(doc_id)
+        if slot is None:
+            if not self.free:
+                self._grow()
+            slot = self.free.pop()
+            self.rows[doc_id] = slot
+            self.slot_ids[slot] = doc_id
+        self._write_row(slot, vector)
+        self._dirty = True
+
+    def remove(self, doc_id: str):
+        slot = self.rows.pop(doc_id, None)
+        if slot is None:
+            return
+        self._write_row(slot, [0.0] * self.dim)
+        self.slot_ids[slot] = None
+        self.free.append(slot)
+        self._dirty = True
+
+    def search(self, query_vector: List[float], top_n: int = 50) -> List[Tuple[str, float]]:
+        """Exact cosine top-n (vectors are unit length, so a dot product suffices)."""
+        if not self.rows or self._mat is None:
+            return []
+        if np is not None:
+            sims = np.asarray(self._mat) @ np.asarray(query_vector, dtype=np.float32)
+            n = min(top_n, len(sims))
+            top = np.argpartition(-sims, n - 1)[:n]
+            hits = [(self.slot_ids[i], float(sims[i])) for i in top]
+        else:
+            hits = []
+            dim = self.dim
+            for doc_id, slot in self.rows.items():
+                row = self._mat[slot * dim:(slot + 1) * dim]
+                hits.append((doc_id, sum(a * b for a, b in zip(row, query_vector))))
+        hits = [(doc_id, sim) for doc_id, sim in hits if doc_id is not None]
+        hits.sort(key=lambda x: -x[1])
+        return hits[:top_n]
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.meta_path), exist_ok=True)
+            if np is not None:
+                if self._mat is not None:
+                    self._mat.flush()
+            elif self._mat is not None:
+                with open(self.data_path, "wb") as f:
+                    self._mat.tofile(f)
+            tmp = self.meta_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"embedder": self.embedder.name, "dim": self.dim,
+                           "capacity": self.capacity, "rows": self.rows}, f)
+            os.replace(tmp, self.meta_path)
+            self._dirty = False
+        except Exception as e:
+            print(f"[RAG] vector store save failed: {e}")
@@ -130,6 +130,19 @@ def _parse_time(raw: str) -> Optional[datetime.datetime]:
     return None
 
 
+def _find_reminder(memory_db, Task, reminder_id) -> Optional[dict]:
+    """Look up a reminder task by id; writes go through memory_db so the write queue and listeners see them."""
+    session = memory_db.get_session()
+    try:
+        task = session.query(Task).filter(Task.id == int(reminder_id), Task.reminder == True).first()
+        if not task:
+            return None
+        return {"id": task.id, "title": task.title,
+                "due_date": task.due_date.isoformat() if task.due_date else None}
+    finally:
+        session.close()
+
+
 def _fmt_dt(dt: Optional[datetime.datetime]) -> str:
     if not dt:
         return "(no time)"
@@ -164,32 +177,25 @@ async def reminders_tool(params: dict, **kwargs) -> dict:
         if due is None:
             return {"error": f"Couldn't parse time '{when_raw}'. Try 'in 30 minutes', 'tomorrow at 9am', or '2025-07-15 14:00'"}
 
-        session = memory_db.get_session()
         try:
-            task = Task(
+            task = memory_db.create_task(
                 title=text,
                 description=f"Reminder set for: {when_raw}",
                 status="inbox",
                 priority="medium",
+                tags=["reminder"],
                 due_date=due,
                 reminder=True,
-                tags=["reminder"],
-                meta_data={"original_when": when_raw},
+                metadata={"original_when": when_raw},
             )
-            session.add(task)
-            session.commit()
-            session.refresh(task)
             return {
-                "id": task.id,
+                "id": task["id"],
                 "text": text,
                 "due": due.isoformat(),
                 "preview": f"⏰ Reminder set: **{text}**\n📅 Due: {_fmt_dt(due)}",
             }
         except Exception as e:
-            session.rollback()
             return {"error": f"Failed to save reminder: {e}"}
-        finally:
-            session.close()
 
     elif action == "list":
         include_done = params.get("include_done", False)
@@ -225,74 +231,46 @@ async def reminders_tool(params: dict, **kwargs) -> dict:
         reminder_id = params.get("id", params.get("reminder_id"))
         if not reminder_id:
             return {"error": "id is required to delete a reminder"}
-        session = memory_db.get_session()
         try:
-            task = session.query(Task).filter(Task.id == int(reminder_id), Task.reminder == True).first()
+            task = _find_reminder(memory_db, Task, reminder_id)
             if not task:
                 return {"error": f"Reminder {reminder_id} not found"}
-            text = task.title
-            task.status = "done"
-            session.commit()
-            return {"success": True, "preview": f"🗑️ Reminder '{text}' cancelled"}
+            memory_db.update_task(task["id"], status="done")
+            return {"success": True, "preview": f"🗑️ Reminder '{task['title']}' cancelled"}
         except Exception as e:
-            session.rollback()
             return {"error": f"Failed to delete reminder: {e}"}
-        finally:
-            session.close()
 
     elif action == "snooze":
         reminder_id = params.get("id", params.get("reminder_id"))
         minutes = int(params.get("minutes", 30))
         if not reminder_id:
             return {"error": "id is required to snooze a reminder"}
-        session = memory_db.get_session()
         try:
-            task = session.query(Task).filter(Task.id == int(reminder_id), Task.reminder == True).first()
+            task = _find_reminder(memory_db, Task, reminder_id)
             if not task:
                 return {"error": f"Reminder {reminder_id} not found"}
-            if task.due_date:
-                task.due_date = task.due_date + datetime.timedelta(minutes=minutes)
+            if task["due_date"]:
+                new_due = datetime.datetime.fromisoformat(task["due_date"]) + datetime.timedelta(minutes=minutes)
             else:
-                task.due_date = datetime.datetime.utcnow() + datetime.timedelta(minutes=minutes)
-            task.status = "inbox"  # re-activate if it was fired
-            session.commit()
+                new_due = datetime.datetime.utcnow() + datetime.timedelta(minutes=minutes)
+            # status back to inbox re-activates it if it was fired
+            memory_db.update_task(task["id"], due_date=new_due, status="inbox")
             return {
                 "success": True,
-                "new_due": task.due_date.isoformat(),
-                "preview": f"💤 Snoozed '{task.title}' by {minutes} minutes — new time: {_fmt_dt(task.due_date)}",
+                "new_due": new_due.isoformat(),
+                "preview": f"💤 Snoozed '{task['title']}' by {minutes} minutes — new time: {_fmt_dt(new_due)}",
             }
         except Exception as e:
-            session.rollback()
             return {"error": f"Failed to snooze reminder: {e}"}
-        finally:
-            session.close()
 
     elif action == "check":
         """Return reminders that are due (used by _vesper_core_loop)."""
-        session = memory_db.get_session()
         try:
-            now = datetime.datetime.utcnow()
-            due_tasks = (
-                session.query(Task)
-                .filter(
-                    Task.reminder == True,
-                    Task.status == "inbox",
-                    Task.due_date <= now,
-                )
-                .all()
-            )
-            fired = []
-            for t in due_tasks:
-                t.status = "done"
-                fired.append({"id": t.id, "text": t.title, "due": t.due_date.isoformat() if t.due_date else None})
-            if fired:
-                session.commit()
+            fired = [{"id": t["id"], "text": t["title"], "due": t["due_date"]}
+                     for t in memory_db.fire_due_reminders()]
             return {"fired": fired, "count": len(fired)}
         except Exception as e:
-            session.rollback()
             return {"error": str(e), "fired": []}
-        finally:
-            session.close()
 
     else:
         return {"error": f"Unknown action '{action}'. Use: set | list | delete | snooze | check"}
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+ai_router circuit breaker regression checks
+No API keys needed — drives ProviderHealth directly.
+
+    cd backend && python test_ai_router.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+for _var in ("VESPER_BREAKER_FAILURES", "VESPER_BREAKER_COOLDOWN", "VESPER_BREAKER_BILLING_COOLDOWN"):
+    os.environ.pop(_var, None)
+
+from ai_router import ProviderHealth, _MAX_COOLDOWN
+
+
+def _expire(health):
+    """Pretend the current cooldown has run out"""
+    health.opened_at -= health.cooldown + 1
+
+
+def _opened(name="groq"):
+    health = ProviderHealth(name)
+    for _ in range(3):
+        health.record_failure("timeout")
+    return health
+
+
+def test_opens_after_consecutive_failures():
+    health = ProviderHealth("groq")
+    health.record_failure("timeout")
+    health.record_failure("timeout")
+    assert health.state() == "closed" and health.allow()
+    health.record_failure("timeout")
+    assert health.state() == "open" and health.cooldown == 60
+    assert not health.allow()
+    assert health.snapshot()["retry_in"] > 0
+
+
+def test_success_resets_failure_count():
+    health = ProviderHealth("groq")
+    health.record_failure("timeout")
+    health.record_failure("timeout")
+    health.record_success(0.5)
+    health.record_failure("timeout")
+    assert health.state() == "closed" and health.failures == 1
+
+
+def test_half_open_allows_one_probe():
+    health = _opened()
+    _expire(health)
+    assert health.state() == "half_open"
+    assert health.allow(), "the first caller gets the probe"
+    assert not health.allow(), "everyone else waits for it"
+
+
+def test_stale_probe_frees_the_slot():
+    health = _opened()
+    _expire(health)
+    assert health.allow()
+    health.probe_started -= health.cooldown + 1  # the probe was cancelled and never reported
+    assert health.allow()
+
+
+def test_probe_success_closes():
+    health = _opened()
+    _expire(health)
+    health.allow()
+    health.record_success(0.8)
+    assert health.state() == "closed" and health.failures == 0 and health.warning is None
+    assert health.allow()
+
+
+def test_probe_failure_doubles_cooldown():
+    health = _opened()
+    for expected in (120, 240, 480, 960, _MAX_COOLDOWN, _MAX_COOLDOWN):
+        _expire(health)
+        assert health.allow()
+        health.record_failure("timeout")
+        assert health.state() == "open" and health.cooldown == expected, (health.cooldown, expected)
+
+
+def test_billing_error_opens_at_once():
+    health = ProviderHealth("anthropic")
+    health.record_failure("Your credit balance is too low", warning="Anthropic credits ran out")
+    assert health.state() == "open" and health.failures == 1
+    assert health.cooldown == 900 and health.warning == "Anthropic credits ran out"
+
+
+def test_cooldowns_follow_env():
+    os.environ["VESPER_BREAKER_FAILURES"] = "1"
+    os.environ["VESPER_BREAKER_COOLDOWN"] = "5"
+    try:
+        health = ProviderHealth("openai")
+        health.record_failure("500 server error")
+        assert health.state() == "open" and health.cooldown == 5
+    finally:
+        os.environ.pop("VESPER_BREAKER_FAILURES")
+        os.environ.pop("VESPER_BREAKER_COOLDOWN")
+
+
+TESTS = [
+    test_opens_after_consecutive_failures,
+    test_success_resets_failure_count,
+    test_half_open_allows_one_probe,
+    test_stale_probe_frees_the_slot,
+    test_probe_success_closes,
+    test_probe_failure_doubles_cooldown,
+    test_billing_error_opens_at_once,
+    test_cooldowns_follow_env,
+]
+
+
+def main():
+    print("=" * 60)
+    print("AI ROUTER CIRCUIT BREAKER CHECKS")
+    print("=" * 60)
+    failed = 0
+    for test in TESTS:
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {type(e).__name__}: {e}")
+    print("\n" + "=" * 60)
+    print(f"{len(TESTS) - failed}/{len(TESTS)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+memory_db regression checks
+Runs against throwaway SQLite files — no DATABASE_URL needed.
+
+    cd backend && python test_memory_db.py
+"""
+
+import os
+import sys
+import time
+import datetime
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import memory_db as M
+
+
+def _fresh_db(seed=None):
+    """A PersistentMemoryDB on a new SQLite file; seed(session) runs first on the bare schema"""
+    path = os.path.join(tempfile.mkdtemp(prefix="vesper-test-"), "memory.db")
+    if seed is not None:
+        engine = create_engine(f"sqlite:///{path}")
+        M.Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        seed(session)
+        session.commit()
+        session.close()
+        engine.dispose()
+    db = M.PersistentMemoryDB()
+    db.database_url = f"sqlite:///{path}"
+    db._use_sqlite = True
+    return db
+
+
+def _wait_for_backfill(db):
+    db.get_session().close()
+    if db._backfill_thread is not None:
+        db._backfill_thread.join(10)
+
+
+# === user-011: messages table ===
+
+def test_messages_backfill():
+    """Legacy threads.messages arrays are copied to rows and kept until the explicit cleanup"""
+    def seed(session):
+        for i in range(3):
+            session.add(M.Thread(id=f"legacy-{i}", title="old", meta_data={}, messages=[
+                {"role": "user", "content": f"question {i}"},
+                {"role": "assistant", "content": "answer"},
+            ]))
+    db = _fresh_db(seed)
+    _wait_for_backfill(db)
+
+    thread = db.get_thread("legacy-1")
+    assert [m["content"] for m in thread["messages"]] == ["question 1", "answer"]
+    assert thread["message_count"] == 2 and thread["summary"] == "question 1"
+
+    session = db.get_session()
+    try:
+        legacy = session.query(M.Thread).filter(M.Thread.id == "legacy-1").first().messages
+    finally:
+        session.close()
+    assert len(legacy) == 2, "backfill must leave the legacy array in place"
+
+    report = db.clear_legacy_thread_messages(dry_run=True)
+    assert report["cleared"] == 3 and report["mismatched"] == []
+
+    session = db.get_session()
+    session.query(M.Message).filter(M.Message.thread_id == "legacy-2", M.Message.seq == 1).delete()
+    session.commit()
+    session.close()
+    report = db.clear_legacy_thread_messages()
+    assert report["cleared"] == 2 and report["mismatched"] == ["legacy-2"]
+    assert [m["content"] for m in db.get_thread("legacy-0")["messages"]] == ["question 0", "answer"]
+
+
+def test_append_before_backfill():
+    """Appending to a thread that hasn't been copied yet keeps its legacy messages first"""
+    def seed(session):
+        session.add(M.Thread(id="old", title="old", meta_data={}, messages=[{"role": "user", "content": "first"}]))
+    db = _fresh_db(seed)
+    db._start_backfills = lambda: None
+    db.add_message_to_thread("old", {"role": "assistant", "content": "second"})
+    assert [m["content"] for m in db.get_thread("old")["messages"]] == ["first", "second"]
+
+
+def test_message_seq_retry():
+    """A seq taken by another writer between read and commit is retried with the next seq"""
+    db = _fresh_db()
+    db.create_thread("t", "race")
+    original = db._message_row
+    raced = []
+
+    def message_row(thread_id, seq, message, default_ts=None):
+        if not raced:
+            raced.append(seq)
+            other = db.SessionLocal()
+            other.add(original(thread_id, seq, {"role": "user", "content": "from another writer"}))
+            other.commit()
+            other.close()
+        return original(thread_id, seq, message, default_ts)
+
+    db._message_row = message_row
+    # Straight into a session, not through the writer queue — the way PostgreSQL runs it
+    result = db._in_session(db._add_message_to_thread, "t", {"role": "assistant", "content": "mine"})
+    assert raced == [0]
+    assert result["message_count"] == 2
+    assert [m["content"] for m in db.get_thread("t")["messages"]] == ["from another writer", "mine"]
+
+
+# === user-012: keyset paging ===
+
+def test_threads_cursor_paging():
+    db = _fresh_db()
+    for i in range(7):
+        db.create_thread(f"t{i}", f"thread {i}")
+    db.update_thread_pinned("t2", True)
+    db.update_thread_pinned("t5", True)
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        page = db.get_threads_page(limit=3, cursor=cursor)
+        seen += [t["id"] for t in page["threads"]]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == 3
+    assert len(seen) == len(set(seen)) == 7
+    assert set(seen[:2]) == {"t2", "t5"}, "pinned threads come first"
+    assert seen == [t["id"] for t in db.get_all_threads()]
+
+    try:
+        db.get_threads_page(cursor="not-a-cursor")
+        raise AssertionError("malformed cursor accepted")
+    except ValueError:
+        pass
+
+
+# === user-015: SQLite writer queue ===
+
+def test_writer_queue_batching():
+    """Queued jobs share one transaction; a failing job is isolated and its neighbours still commit"""
+    db = _fresh_db()
+    db.get_session().close()
+    writer = db._writer
+    gate, runs = threading.Event(), []
+
+    def blocker(session):
+        gate.wait(5)
+
+    def body(session, tag, fail=False):
+        runs.append((tag, id(session), session.info.get("batched")))
+        if fail:
+            raise ValueError("bad row")
+        return db._add_memory(session, "notes", f"memory from job {tag}")
+
+    writer.submit(blocker)
+    time.sleep(0.1)  # the writer is now busy with the blocker alone
+    ok = [writer.submit(body, "a"), writer.submit(body, "b")]
+    gate.set()
+    assert all(f.result(5)["id"] for f in ok)
+    shared = [r for r in runs if r[0] in ("a", "b")]
+    assert len({session_id for _, session_id, _ in shared}) == 1, "one transaction for the batch"
+    assert all(batched for _, _, batched in shared)
+
+    gate.clear()
+    runs.clear()
+    writer.submit(blocker)
+    time.sleep(0.1)
+    futures = [writer.submit(body, "c"), writer.submit(body, "bad", True), writer.submit(body, "d")]
+    gate.set()
+    assert futures[0].result(5)["content"] == "memory from job c"
+    assert futures[2].result(5)["content"] == "memory from job d"
+    try:
+        futures[1].result(5)
+        raise AssertionError("failing job reported success")
+    except ValueError:
+        pass
+    assert [tag for tag, _, batched in runs if not batched] == ["c", "bad", "d"], "re-run one transaction each"
+    contents = {m["content"] for m in db.get_memories()}
+    assert {"memory from job a", "memory from job b", "memory from job c", "memory from job d"} <= contents
+
+
+# === user-016: full-text search ===
+
+def test_fulltext_ranking_and_fallback():
+    db = _fresh_db()
+    db.add_memory("notes", "Notes on snakes and also some python trivia at the end", title="Reptiles")
+    db.add_memory("notes", "Packaging tips for python projects", title="Python packaging")
+    db.add_memory("notes", "Nothing relevant here at all", title="Groceries")
+    db.add_memory("notes", "C++ template tricks", title="Templates")
+    assert "memories" in db._fulltext_ready
+
+    titles = [m["title"] for m in db.search_memories("python")]
+    assert titles == ["Python packaging", "Reptiles"], titles
+    assert [m["title"] for m in db.search_memories("packag")] == ["Python packaging"], "last word is a prefix"
+
+    # No word characters: the index can't answer, ILIKE does
+    assert [m["title"] for m in db.search_memories("++")] == ["Templates"]
+
+    # Without the index every search takes the ILIKE path
+    db._fulltext_ready.discard("memories")
+    assert {m["title"] for m in db.search_memories("python")} == {"Python packaging", "Reptiles"}
+
+
+# === user-019: analytics rollups ===
+
+def test_rollup_watermarks():
+    db = _fresh_db()
+    now = datetime.datetime.utcnow()
+    ages = [datetime.timedelta(days=3, hours=2), datetime.timedelta(days=3), datetime.timedelta(hours=26),
+            datetime.timedelta(hours=5), datetime.timedelta(minutes=1)]
+    db.bulk_log_events([{"event_type": "chat", "topic": "t", "ai_provider": "groq", "response_time_ms": 100,
+                         "created_at": now - age} for age in ages])
+    before = db.get_analytics_summary(days=7)
+    assert before["total_events"] == 5
+
+    assert db.roll_up_analytics() > 0
+    session = db.get_session()
+    try:
+        hour_end, day_end = db._rollup_watermarks(session)
+    finally:
+        session.close()
+    assert hour_end is not None and day_end is not None
+    assert hour_end <= M._floor_hour(now) and day_end <= M._floor_day(now) + M._DAY
+    assert db.roll_up_analytics() == 0, "a second run adds nothing"
+
+    after = db.get_analytics_summary(days=7)
+    assert after["total_events"] == 5 and after["avg_response_time_ms"] == 100
+    assert after["providers"] == {"groq": 5}
+
+
+# === user-020: unit of work ===
+
+def test_unit_of_work_rollback():
+    db = _fresh_db()
+    db.create_thread("existing", "kept")
+
+    try:
+        with db.unit_of_work() as uow:
+            uow.create_thread("never", "raised before commit")
+            raise RuntimeError("caller bailed out")
+    except RuntimeError:
+        pass
+    assert db.get_thread("never") is None
+
+    try:
+        with db.unit_of_work() as uow:
+            uow.add_memory("notes", "written with a failing neighbour")
+            uow.create_thread("existing", "duplicate id")
+        raise AssertionError("duplicate thread id accepted")
+    except M.IntegrityError:
+        pass
+    assert db.get_memories() == [], "nothing from a failed unit is kept"
+    assert db.get_thread("existing")["title"] == "kept"
+
+    with db.unit_of_work() as uow:
+        uow.create_thread("fresh", "new")
+        uow.bulk_add_messages("fresh", [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "yo"}])
+    assert uow.results[1] == 2 and db.get_thread("fresh")["message_count"] == 2
+
+
+TESTS = [
+    test_messages_backfill,
+    test_append_before_backfill,
+    test_message_seq_retry,
+    test_threads_cursor_paging,
+    test_writer_queue_batching,
+    test_fulltext_ranking_and_fallback,
+    test_rollup_watermarks,
+    test_unit_of_work_rollback,
+]
+
+
+def main():
+    print("=" * 60)
+    print("MEMORY DB REGRESSION CHECKS")
+    print("=" * 60)
+    failed = 0
+    for test in TESTS:
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {type(e).__name__}: {e}")
+    print("\n" + "=" * 60)
+    print(f"{len(TESTS) - failed}/{len(TESTS)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
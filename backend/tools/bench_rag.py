@@ -0,0 +1,135 @@
+"""
+Micro-benchmark for vesper_rag.build_rag_context.
+
+Builds synthetic corpora (default 1k / 10k / 100k memories) behind a stub
+memory_db, in a throwaway data dir so real Vesper data is never touched, and
+reports index build time plus per-query latency for the pure-Python and
+NumPy scoring paths.
+
+Usage:
+    python backend/tools/bench_rag.py [--sizes 1000,10000,100000] [--queries 50]
+"""
+
+import argparse
+import datetime
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vesper_rag  # noqa: E402
+
+
+class _StubMemoryDB:
+    """Just enough of PersistentMemoryDB for the RAG index to sync from."""
+
+    def __init__(self, memories):
+        self.memories = memories
+
+    def get_memories(self, category=None, limit=100):
+        return self.memories[:limit]
+
+    def get_research(self, limit=100):
+        return []
+
+    def add_write_listener(self, listener):
+        pass
+
+
+def _vocabulary(rng: random.Random, size: int = 5000):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(size)]
+
+
+def _corpus(rng: random.Random, vocab, n: int):
+    now = datetime.datetime.utcnow()
+    return [
+        {
+            "id": i,
+            "title": " ".join(rng.choice(vocab) for _ in range(3)),
+            "content": " ".join(rng.choice(vocab) for _ in range(rng.randint(8, 60))),
+            "category": rng.choice(["personal", "work", "emotional_bonds", "notes"]),
+            "importance": rng.randint(1, 10),
+            "created_at": (now - datetime.timedelta(days=rng.randint(0, 400))).isoformat(),
+        }
+        for i in range(n)
+    ]
+
+
+def _point_at(data_dir: str):
+    """Redirect every vesper_rag path into data_dir (empty file sources)."""
+    vesper_rag.DATA_DIR = data_dir
+    vesper_rag.MEMORY_DIR = os.path.join(data_dir, "memory")
+    vesper_rag.KNOWLEDGE_DIR = os.path.join(data_dir, "knowledge")
+    vesper_rag.IDENTITY_DIR = os.path.join(data_dir, "vesper_identity")
+    vesper_rag.JOURNAL_DIR = os.path.join(vesper_rag.IDENTITY_DIR, "journal")
+    vesper_rag.CREATIONS_DIR = os.path.join(vesper_rag.IDENTITY_DIR, "creations")
+    vesper_rag.RELATIONSHIP_PATH = os.path.join(vesper_rag.IDENTITY_DIR, "relationship_timeline.json")
+    vesper_rag.PREFERENCES_PATH = os.path.join(vesper_rag.IDENTITY_DIR, "preferences.json")
+
+
+def _time_queries(db, queries, scoring: str):
+    timings = []
+    for q in queries:
+        start = time.perf_counter()
+        vesper_rag.build_rag_context(q, memory_db=db, top_k=12, max_chars=3600, scoring=scoring, semantic=False)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def bench(size: int, n_queries: int, seed: int = 7):
+    rng = random.Random(seed)
+    vocab = _vocabulary(rng)
+    db = _StubMemoryDB(_corpus(rng, vocab, size))
+    data_dir = tempfile.mkdtemp(prefix="vesper_rag_bench_")
+    try:
+        _point_at(data_dir)
+        vesper_rag._DB_MEMORY_LIMIT = size
+        vesper_rag._INDEX = vesper_rag.RagIndex(
+            os.path.join(data_dir, "rag_index.json"), os.path.join(data_dir, "rag_vectors"))
+        vesper_rag._RESULT_CACHE = vesper_rag._RagResultCache()
+
+        start = time.perf_counter()
+        vesper_rag.get_rag_index().sync(db)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        # Distinct queries so the result cache never answers
+        queries = [" ".join(rng.choice(vocab) for _ in range(rng.randint(2, 8))) for _ in range(n_queries * 4)]
+        rows = []
+        paths = [("python", 10 ** 12)]
+        if vesper_rag.np is not None:
+            paths.append(("numpy", 0))
+        batch = iter(range(len(queries)))
+        for path, threshold in paths:
+            vesper_rag._VECTORIZE_MIN_DOCS = threshold
+            for scoring in ("overlap", "bm25"):
+                qs = [queries[next(batch)] for _ in range(n_queries)]
+                t = sorted(_time_queries(db, qs, scoring))
+                rows.append((path, scoring, statistics.median(t), t[int(len(t) * 0.95) - 1]))
+        return build_ms, rows
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'items':>8}  {'path':<7} {'scoring':<8} {'p50 ms':>8} {'p95 ms':>8}")
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        build_ms, rows = bench(size, args.queries)
+        print(f"{size:>8}  index build {build_ms:,.0f} ms")
+        for path, scoring, p50, p95 in rows:
+            print(f"{'':>8}  {path:<7} {scoring:<8} {p50:>8.2f} {p95:>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,8 +1,9 @@
 """
 Vesper RAG (Retrieval Augmented Generation) Engine
-Pure Python — no vector DB, no numpy. Runs on any machine.
+Pure Python keyword retrieval (TF-IDF or BM25, plus recency and category boosts)
+over a persistent inverted index of memories, journal, knowledge and DB rows,
+with an opt-in semantic tier. NumPy, when installed, speeds up scoring.
 
-Scoring: TF-IDF inspired keyword overlap + recency decay + category boosting
 Context budget: ~2000 tokens injected into system prompt per request
 """
 
@@ -10,14 +11,78 @@ import os
 import json
 import re
 import math
+import hashlib
+import asyncio
 import datetime
-from typing import List, Dict, Tuple, Optional
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import List, Dict, Tuple, Optional, Callable, Iterator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from rag_vectors import VectorStore, get_embedder
 
 # --- Paths ---
 DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "vesper-ai")
 MEMORY_DIR = os.path.join(DATA_DIR, "memory")
 KNOWLEDGE_DIR = os.path.join(DATA_DIR, "knowledge")
 IDENTITY_DIR = os.path.join(DATA_DIR, "vesper_identity")
+JOURNAL_DIR = os.path.join(IDENTITY_DIR, "journal")
+CREATIONS_DIR = os.path.join(IDENTITY_DIR, "creations")
+RELATIONSHIP_PATH = os.path.join(IDENTITY_DIR, "relationship_timeline.json")
+PREFERENCES_PATH = os.path.join(IDENTITY_DIR, "preferences.json")
+INDEX_PATH = os.path.join(IDENTITY_DIR, "rag_index.json")
+VECTORS_PREFIX = os.path.join(IDENTITY_DIR, "rag_vectors")
+
+# DB rows pulled when the index (re)syncs with memory_db — same windows the
+# per-request loaders used before the index existed
+_DB_MEMORY_LIMIT = 200
+_DB_RESEARCH_LIMIT = 100
+
+# BM25 parameters (Robertson/Sparck Jones defaults)
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+# Semantic tier: candidates pulled from the vector store, and the RRF constant
+_SEMANTIC_CANDIDATES = 50
+_RRF_K = 60
+
+# Vectorized scoring: corpus size where NumPy starts beating the dict walk, and
+# how many changed docs the CSR snapshot tolerates before it is rebuilt
+_VECTORIZE_MIN_DOCS = 2000
+_SNAPSHOT_MAX_DELTA = 512
+
+# Query-result cache: entries per process
+_RAG_CACHE_SIZE = 256
+
+# Source loading: worker threads shared by all requests, and how long one source
+# (file or DB query) may take before the turn goes ahead without its update
+_RAG_WORKERS = 4
+_SOURCE_TIMEOUT = 2.0
+
+# MMR selection: relevance vs. novelty weight, and how far down the ranking to
+# look (top_k * _MMR_POOL candidates). Signatures within _NEAR_DUP_BITS of 64
+# (estimated cosine ≳ 0.87) are treated as the same fact and dropped.
+_MMR_LAMBDA = 0.7
+_MMR_POOL = 4
+_NEAR_DUP_BITS = 10
+
+
+def _semantic_enabled() -> bool:
+    return os.getenv("VESPER_RAG_SEMANTIC", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _source_timeout() -> float:
+    try:
+        return float(os.getenv("VESPER_RAG_SOURCE_TIMEOUT", "") or _SOURCE_TIMEOUT)
+    except ValueError:
+        return _SOURCE_TIMEOUT
 
 # Stopwords to filter from keyword extraction
 _STOPWORDS = {
@@ -38,6 +103,56 @@ def _tokenize(text: str) -> List[str]:
     return [w for w in words if w not in _STOPWORDS]
 
 
+# SimHash is accumulated as one big int with a 24-bit lane per signature bit —
+# a single multiply-add per term instead of 64 — then all lanes are thresholded
+# at once by adding a bias that carries into each lane's top bit
+_LANE_BITS = 24
+_LANE_ONES = sum(1 << (i * _LANE_BITS) for i in range(64))
+_LANE_TOPS = _LANE_ONES << (_LANE_BITS - 1)
+_BIT_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+_TERM_LANES: Dict[str, int] = {}
+_TERM_LANES_MAX = 200_000
+
+
+def _term_lanes(term: str) -> int:
+    """The term's 64-bit hash spread out so bit i sits at the bottom of lane i (memoized)"""
+    packed = _TERM_LANES.get(term)
+    if packed is None:
+        h = int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+        packed = 0
+        for bit in range(64):
+            if h >> bit & 1:
+                packed |= 1 << (bit * _LANE_BITS)
+        if len(_TERM_LANES) >= _TERM_LANES_MAX:
+            _TERM_LANES.clear()
+        _TERM_LANES[term] = packed
+    return packed
+
+
+def _simhash(tf: Dict[str, int]) -> Optional[int]:
+    """64-bit SimHash of a term-frequency bag; None when there are no terms"""
+    if not tf:
+        return None
+    acc = 0
+    total = 0
+    for term, n in tf.items():
+        acc += n * _term_lanes(term)
+        total += n
+    # lane + bias reaches the lane's top bit exactly when 2 * lane > total
+    # (documents are far below the 2^23 tokens a lane can hold)
+    bias = (1 << (_LANE_BITS - 1)) - (total // 2 + 1)
+    tops = ((acc + bias * _LANE_ONES) & _LANE_TOPS) >> (_LANE_BITS - 1)
+    digits = tops.to_bytes(64 * _LANE_BITS // 8, "little")[::_LANE_BITS // 8]
+    return int(digits.translate(_BIT_DIGITS)[::-1], 2)
+
+
+def _simhash_distance(a: Optional[int], b: Optional[int]) -> int:
+    """Hamming distance between two signatures (64 = unrelated when either is missing)"""
+    if a is None or b is None:
+        return 64
+    return (a ^ b).bit_count()
+
+
 def _score(query_tokens: List[str], doc_text: str, recency_days: float = 0, category_boost: float = 1.0) -> float:
     """Score a document against query tokens. Higher = more relevant."""
     if not query_tokens or not doc_text:
@@ -61,12 +176,15 @@ def _score(query_tokens: List[str], doc_text: str, recency_days: float = 0, cate
     # Normalize by number of unique query terms
     score = score / max(len(set(query_tokens)), 1)
 
-    # Recency decay: fresh content scores higher (half-life ~30 days)
-    if recency_days > 0:
-        recency_factor = math.exp(-0.023 * min(recency_days, 365))  # 0.023 ≈ ln2/30
-        score *= (0.4 + 0.6 * recency_factor)  # floor at 40% so old memories still count
+    return score * _recency_factor(recency_days) * category_boost
+
 
-    return score * category_boost
+def _recency_factor(days: float) -> float:
+    """Recency decay: fresh content scores higher (half-life ~30 days)"""
+    if days <= 0:
+        return 1.0
+    recency_factor = math.exp(-0.023 * min(days, 365))  # 0.023 ≈ ln2/30
+    return 0.4 + 0.6 * recency_factor  # floor at 40% so old memories still count
 
 
 def _days_since(date_str: Optional[str]) -> float:
@@ -82,6 +200,24 @@ def _days_since(date_str: Optional[str]) -> float:
         return 30.0
 
 
+def _epoch(date_str: Optional[str]) -> Optional[float]:
+    """Parse an ISO date string to seconds since 1970 (naive UTC, like _days_since). None if unknown."""
+    if not date_str:
+        return None
+    try:
+        dt = datetime.datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+        if dt.tzinfo:
+            dt = dt.replace(tzinfo=None)
+        return (dt - datetime.datetime(1970, 1, 1)).total_seconds()
+    except Exception:
+        return None
+
+
+def _now_epoch() -> float:
+    """Current time on the same naive-UTC scale as _epoch()"""
+    return (datetime.datetime.utcnow() - datetime.datetime(1970, 1, 1)).total_seconds()
+
+
 def _load_json_safe(path: str):
     try:
         with open(path, encoding="utf-8") as f:
@@ -101,79 +237,115 @@ def _truncate(text: str, max_chars: int = 300) -> str:
 # Source loaders — each returns a list of (text, date_str, label, boost)
 # ---------------------------------------------------------------------------
 
+def _memory_item(m: Dict) -> Tuple[str, str, str, float]:
+    """Format one memory_db memory dict as a RAG item"""
+    text = f"{m.get('title','') or ''} {m.get('content','') or ''}".strip()
+    date = m.get("created_at") or m.get("updated_at") or ""
+    if isinstance(date, datetime.datetime):
+        date = date.isoformat()
+    cat = m.get("category", "memory")
+    boost = 1.5 if (m.get("importance") or 5) >= 8 else 1.0
+    return (text, str(date), f"[memory:{cat}]", boost)
+
+
+def _research_item(r: Dict) -> Tuple[str, str, str, float]:
+    """Format one memory_db research dict as a RAG item"""
+    text = f"{r.get('title','')} {r.get('content','')}"
+    date = r.get("created_at") or ""
+    if isinstance(date, datetime.datetime):
+        date = date.isoformat()
+    return (text[:400], str(date), "[research]", 0.9)
+
+
+def _source_type(label: str) -> str:
+    """Source type of an item label: [memory:notes] → memory, [journal] → journal"""
+    return label.strip("[]").split(":", 1)[0]
+
+
 def _load_db_memories(memory_db) -> List[Tuple[str, str, str, float]]:
     """Load from SQLite/Postgres memory_db (the real DB, not JSON files)"""
-    items = []
+    return [_memory_item(m) for m in _load_db_memory_rows(memory_db)]
+
+
+def _load_db_memory_rows(memory_db) -> List[Dict]:
     try:
-        mems = memory_db.get_memories(limit=200)
-        for m in mems:
-            text = f"{m.get('title','') or ''} {m.get('content','') or ''}".strip()
-            date = m.get("created_at") or m.get("updated_at") or ""
-            if isinstance(date, datetime.datetime):
-                date = date.isoformat()
-            cat = m.get("category", "memory")
-            boost = 1.5 if m.get("importance", 5) >= 8 else 1.0
-            label = f"[memory:{cat}]"
-            items.append((text, str(date), label, boost))
+        return memory_db.get_memories(limit=_DB_MEMORY_LIMIT)
     except Exception:
-        pass
+        return []
+
+
+# Category boosts — relationship + origin score higher
+_JSON_MEMORY_BOOSTS = {"emotional_bonds": 1.6, "origin_story": 1.5, "milestones": 1.4, "conversations": 1.3}
+
+
+def _json_memory_files() -> List[str]:
+    if not os.path.exists(MEMORY_DIR):
+        return []
+    return [f for f in os.listdir(MEMORY_DIR) if f.endswith(".json")]
+
+
+def _load_json_memory_file(fname: str) -> List[Tuple[str, str, str, float]]:
+    """Load one vesper-ai/memory/<category>.json file"""
+    items = []
+    cat = fname.replace(".json", "")
+    boost = _JSON_MEMORY_BOOSTS.get(cat, 1.0)
+    data = _load_json_safe(os.path.join(MEMORY_DIR, fname))
+    if not data:
+        return items
+    entries = data if isinstance(data, list) else (data.get("entries") or data.get("memories") or [])
+    for entry in entries[:50]:  # cap per file
+        if isinstance(entry, str):
+            items.append((entry[:500], "", f"[memory:{cat}]", boost))
+        elif isinstance(entry, dict):
+            text = " ".join(str(v) for k, v in entry.items() if k not in ("id","timestamp","created_at","updated_at") and isinstance(v, str))
+            date = entry.get("timestamp") or entry.get("created_at") or entry.get("date") or ""
+            items.append((text[:500], str(date), f"[memory:{cat}]", boost))
     return items
 
 
 def _load_json_memories() -> List[Tuple[str, str, str, float]]:
     """Load from vesper-ai/memory/*.json files"""
     items = []
-    if not os.path.exists(MEMORY_DIR):
+    for fname in _json_memory_files():
+        items += _load_json_memory_file(fname)
+    return items
+
+
+def _journal_files() -> List[str]:
+    if not os.path.exists(JOURNAL_DIR):
+        return []
+    return [f for f in sorted(os.listdir(JOURNAL_DIR), reverse=True)[:30] if f.endswith(".json")]  # last 30 days
+
+
+def _load_journal_file(fname: str) -> List[Tuple[str, str, str, float]]:
+    """Load one day of vesper_journal entries"""
+    items = []
+    date = fname.replace(".json", "")
+    entries = _load_json_safe(os.path.join(JOURNAL_DIR, fname))
+    if not entries:
         return items
-    # Category boosts — relationship + origin score higher
-    boost_map = {"emotional_bonds": 1.6, "origin_story": 1.5, "milestones": 1.4, "conversations": 1.3}
-    for fname in os.listdir(MEMORY_DIR):
-        if not fname.endswith(".json"):
-            continue
-        cat = fname.replace(".json", "")
-        boost = boost_map.get(cat, 1.0)
-        data = _load_json_safe(os.path.join(MEMORY_DIR, fname))
-        if not data:
-            continue
-        entries = data if isinstance(data, list) else (data.get("entries") or data.get("memories") or [])
-        for entry in entries[:50]:  # cap per file
-            if isinstance(entry, str):
-                items.append((entry[:500], "", f"[memory:{cat}]", boost))
-            elif isinstance(entry, dict):
-                text = " ".join(str(v) for k, v in entry.items() if k not in ("id","timestamp","created_at","updated_at") and isinstance(v, str))
-                date = entry.get("timestamp") or entry.get("created_at") or entry.get("date") or ""
-                items.append((text[:500], str(date), f"[memory:{cat}]", boost))
+    if isinstance(entries, list):
+        for e in entries:
+            if isinstance(e, dict):
+                text = f"{e.get('mood','')} {e.get('entry','')}".strip()
+                items.append((text[:400], date, "[journal]", 1.2))
+            elif isinstance(e, str):
+                items.append((e[:400], date, "[journal]", 1.2))
     return items
 
 
 def _load_journal() -> List[Tuple[str, str, str, float]]:
     """Load vesper_journal entries"""
     items = []
-    jdir = os.path.join(DATA_DIR, "vesper_identity", "journal")
-    if not os.path.exists(jdir):
-        return items
-    for fname in sorted(os.listdir(jdir), reverse=True)[:30]:  # last 30 days
-        if not fname.endswith(".json"):
-            continue
-        date = fname.replace(".json", "")
-        entries = _load_json_safe(os.path.join(jdir, fname))
-        if not entries:
-            continue
-        if isinstance(entries, list):
-            for e in entries:
-                if isinstance(e, dict):
-                    text = f"{e.get('mood','')} {e.get('entry','')}".strip()
-                    items.append((text[:400], date, "[journal]", 1.2))
-                elif isinstance(e, str):
-                    items.append((e[:400], date, "[journal]", 1.2))
+    for fname in _journal_files():
+        items += _load_journal_file(fname)
     return items
 
 
 def _load_relationship_log() -> List[Tuple[str, str, str, float]]:
     """Load vesper_relationship_log timeline"""
     items = []
-    rpath = os.path.join(DATA_DIR, "vesper_identity", "relationship_timeline.json")
-    data = _load_json_safe(rpath)
+    data = _load_json_safe(RELATIONSHIP_PATH)
     if not data:
         return items
     entries = data if isinstance(data, list) else []
@@ -187,8 +359,7 @@ def _load_relationship_log() -> List[Tuple[str, str, str, float]]:
 def _load_preferences() -> List[Tuple[str, str, str, float]]:
     """Load vesper_preferences"""
     items = []
-    ppath = os.path.join(DATA_DIR, "vesper_identity", "preferences.json")
-    data = _load_json_safe(ppath)
+    data = _load_json_safe(PREFERENCES_PATH)
     if not data:
         return items
     if isinstance(data, dict):
@@ -200,28 +371,34 @@ def _load_preferences() -> List[Tuple[str, str, str, float]]:
     return items
 
 
+def _knowledge_files() -> List[str]:
+    if not os.path.exists(KNOWLEDGE_DIR):
+        return []
+    return [f for f in os.listdir(KNOWLEDGE_DIR) if os.path.isfile(os.path.join(KNOWLEDGE_DIR, f))]
+
+
+def _load_knowledge_file(fname: str) -> List[Tuple[str, str, str, float]]:
+    """Load one vesper-ai/knowledge/ file (project docs, research)"""
+    try:
+        with open(os.path.join(KNOWLEDGE_DIR, fname), encoding="utf-8", errors="ignore") as f:
+            text = f.read(3000)  # first 3k chars
+        return [(text, "", f"[knowledge:{fname}]", 0.8)]
+    except Exception:
+        return []
+
+
 def _load_knowledge() -> List[Tuple[str, str, str, float]]:
     """Load vesper-ai/knowledge/ files (project docs, research)"""
     items = []
-    if not os.path.exists(KNOWLEDGE_DIR):
-        return items
-    for fname in os.listdir(KNOWLEDGE_DIR):
-        fpath = os.path.join(KNOWLEDGE_DIR, fname)
-        if not os.path.isfile(fpath):
-            continue
-        try:
-            with open(fpath, encoding="utf-8", errors="ignore") as f:
-                text = f.read(3000)  # first 3k chars
-            items.append((text, "", f"[knowledge:{fname}]", 0.8))
-        except Exception:
-            pass
+    for fname in _knowledge_files():
+        items += _load_knowledge_file(fname)
     return items
 
 
 def _load_creations() -> List[Tuple[str, str, str, float]]:
     """Load Vesper's creative works"""
     items = []
-    cdir = os.path.join(DATA_DIR, "vesper_identity", "creations")
+    cdir = CREATIONS_DIR
     if not os.path.exists(cdir):
         return items
     idx_path = os.path.join(cdir, "index.json")
@@ -241,18 +418,713 @@ def _load_creations() -> List[Tuple[str, str, str, float]]:
 
 def _load_db_research(memory_db) -> List[Tuple[str, str, str, float]]:
     """Load research items from the DB"""
-    items = []
+    return [_research_item(r) for r in _load_db_research_rows(memory_db)]
+
+
+def _load_db_research_rows(memory_db) -> List[Dict]:
     try:
-        rows = memory_db.get_research(limit=100)
-        for r in rows:
-            text = f"{r.get('title','')} {r.get('content','')}"
-            date = r.get("created_at") or ""
-            if isinstance(date, datetime.datetime):
-                date = date.isoformat()
-            items.append((text[:400], str(date), "[research]", 0.9))
+        return memory_db.get_research(limit=_DB_RESEARCH_LIMIT)
     except Exception:
-        pass
-    return items
+        return []
+
+
+# ---------------------------------------------------------------------------
+# Persistent inverted index
+# ---------------------------------------------------------------------------
+
+def _fingerprint(path: str) -> Optional[List[int]]:
+    """Cheap change detector for a source file: [mtime_ns, size], or None if missing."""
+    try:
+        st = os.stat(path)
+        return [st.st_mtime_ns, st.st_size]
+    except OSError:
+        return None
+
+
+def _file_sources() -> Dict[str, Tuple[Optional[List[int]], Callable[[], List[Tuple[str, str, str, float]]]]]:
+    """
+    Enumerate every file-backed source as segment_key → (fingerprint, loader).
+    Only directory listings and stat() calls happen here — files are read only
+    when their fingerprint differs from the one stored in the index.
+    """
+    sources = {}
+    for fname in _json_memory_files():
+        sources[f"memory/{fname}"] = (_fingerprint(os.path.join(MEMORY_DIR, fname)),
+                                      lambda f=fname: _load_json_memory_file(f))
+    for fname in _journal_files():
+        sources[f"journal/{fname}"] = (_fingerprint(os.path.join(JOURNAL_DIR, fname)),
+                                       lambda f=fname: _load_journal_file(f))
+    sources["relationship"] = (_fingerprint(RELATIONSHIP_PATH), _load_relationship_log)
+    sources["preferences"] = (_fingerprint(PREFERENCES_PATH), _load_preferences)
+    # Creations are appended to index.json alongside the content file, so the
+    # index file's fingerprint covers the whole source
+    sources["creations"] = (_fingerprint(os.path.join(CREATIONS_DIR, "index.json")), _load_creations)
+    for fname in _knowledge_files():
+        sources[f"knowledge/{fname}"] = (_fingerprint(os.path.join(KNOWLEDGE_DIR, fname)),
+                                         lambda f=fname: _load_knowledge_file(f))
+    return sources
+
+
+# Loads run on their own pool and queries on another, so a query thread waiting on
+# its loads can never starve the pool those loads need
+_LOAD_POOL = ThreadPoolExecutor(max_workers=_RAG_WORKERS, thread_name_prefix="rag-load")
+_QUERY_POOL = ThreadPoolExecutor(max_workers=_RAG_WORKERS, thread_name_prefix="rag-query")
+_IN_FLIGHT: Dict[str, Future] = {}
+_IN_FLIGHT_LOCK = threading.Lock()
+_IN_FLIGHT_MAX = 256
+
+
+def _load_concurrently(jobs: Dict[str, Callable], timeout: Optional[float] = None,
+                       share: bool = True) -> Dict[str, object]:
+    """
+    Run independent source loads on the loader pool and return the results of
+    those that finish within timeout seconds. With share=True a load that times
+    out keeps running and stays registered under its key: the next caller asking
+    for the same key joins it (or picks up its finished result) instead of
+    starting a duplicate, so one slow disk or DB read never piles up or starts
+    over. Only pass share=True for loads whose result can't go stale under the
+    same key (fingerprinted files, the one-off DB reconcile); reads of live
+    tables use share=False and are simply dropped when they time out.
+    """
+    if not jobs:
+        return {}
+    timeout = _source_timeout() if timeout is None else timeout
+    futures: Dict[str, Future] = {}
+    with _IN_FLIGHT_LOCK:
+        for key, job in jobs.items():
+            fut = _IN_FLIGHT.get(key) if share else None
+            if fut is None:
+                fut = _LOAD_POOL.submit(job)
+                if share:
+                    _IN_FLIGHT[key] = fut
+            futures[key] = fut
+    wait(list(futures.values()), timeout=timeout)
+    results = {}
+    with _IN_FLIGHT_LOCK:
+        for key, fut in futures.items():
+            if not fut.done():
+                print(f"[RAG] source {key} still loading after {timeout:.1f}s — skipped this turn")
+                continue
+            if _IN_FLIGHT.get(key) is fut:
+                del _IN_FLIGHT[key]  # consumed
+            try:
+                results[key] = fut.result()
+            except Exception as e:
+                print(f"[RAG] source {key} failed to load: {e}")
+        if len(_IN_FLIGHT) > _IN_FLIGHT_MAX:
+            # Results nobody came back for (e.g. the file changed again meanwhile)
+            for key in [k for k, f in _IN_FLIGHT.items() if f.done()]:
+                del _IN_FLIGHT[key]
+    return results
+
+
+class RagDoc:
+    """
+    One indexed snippet. Everything a query needs — parsed date, boost, token
+    count, source type — is computed once at index time, so scoring is pure
+    arithmetic; __slots__ keeps 100k of these compact. The SimHash signature
+    used for near-duplicate detection is computed here too, at write time.
+    """
+
+    __slots__ = ("segment", "text", "date", "label", "boost", "tf", "length", "epoch", "source_type", "is_db",
+                 "simhash")
+
+    def __init__(self, segment: str, text: str, date: str, label: str, boost: float,
+                 tf: Dict[str, int], length: int, epoch: Optional[float] = None,
+                 simhash: Optional[int] = None):
+        self.segment = segment
+        self.text = text
+        self.date = date
+        self.label = label
+        self.boost = boost
+        self.tf = tf
+        self.length = length
+        self.epoch = epoch
+        self.source_type = _source_type(label)
+        self.is_db = segment.startswith("db:")
+        self.simhash = _simhash(tf) if simhash is None else simhash
+
+    def days_old(self, now: float) -> float:
+        """Days since the item's date (30 if unknown) — same result as _days_since()"""
+        if self.epoch is None:
+            return 30.0
+        return max(0.0, (now - self.epoch) / 86400)
+
+    def to_json(self) -> list:
+        return [self.segment, self.text, self.date, self.label, self.boost, self.tf, self.length, self.epoch,
+                self.simhash]
+
+    @classmethod
+    def from_json(cls, row: list) -> "RagDoc":
+        segment, text, date, label, boost, tf, length = row[:7]
+        epoch = row[7] if len(row) > 7 else _epoch(date)  # v1 index files had no epoch
+        simhash = row[8] if len(row) > 8 else None  # nor did v2 have signatures
+        return cls(segment, text, date, label, boost, tf, length, epoch, simhash)
+
+
+class _CsrSnapshot:
+    """
+    Frozen term-major CSR copy of the postings for NumPy scoring: the docs of
+    term t are indices[indptr[i]:indptr[i+1]] with frequencies in data, where
+    i = term_row[t]. Per-doc length, boost, source type, DB flag and parsed
+    date sit in parallel arrays so recency and boosts are one vectorized pass.
+
+    Docs changed after the snapshot was taken are tracked by RagIndex — they
+    are masked out here and scored from the live postings instead, until
+    enough accumulate to justify a rebuild.
+    """
+
+    def __init__(self, index: "RagIndex"):
+        docs = index.docs
+        self.doc_ids = list(docs)
+        self.row = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+        records = [docs[d] for d in self.doc_ids]
+        self.doc_len = np.array([r.length for r in records], dtype=np.float64)
+        self.boost = np.array([r.boost for r in records], dtype=np.float64)
+        self.is_db = np.array([r.is_db for r in records], dtype=bool)
+        self.type_names = sorted({r.source_type for r in records})
+        type_pos = {t: i for i, t in enumerate(self.type_names)}
+        self.type_idx = np.array([type_pos[r.source_type] for r in records], dtype=np.int32)
+        self.epoch = np.array([np.nan if r.epoch is None else r.epoch for r in records], dtype=np.float64)
+
+        self.term_row: Dict[str, int] = {}
+        indptr = [0]
+        indices: List[int] = []
+        data: List[int] = []
+        for term, plist in index.postings.items():
+            self.term_row[term] = len(indptr) - 1
+            indices.extend(self.row[d] for d in plist)
+            data.extend(plist.values())
+            indptr.append(len(indices))
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int32)
+        self.data = np.array(data, dtype=np.float64)
+
+    def term_slice(self, term: str):
+        i = self.term_row.get(term)
+        if i is None:
+            return None
+        return slice(self.indptr[i], self.indptr[i + 1])
+
+
+class RagIndex:
+    """
+    Inverted index over every RAG source: term → {doc_id: term frequency}.
+
+    Documents are grouped into segments (one per source file, plus "db:memories"
+    and "db:research"). A segment is re-tokenized only when its source changes,
+    so a query costs a few stat() calls plus a walk over the postings of its own
+    terms instead of re-reading and re-tokenizing the whole corpus.
+    """
+
+    def __init__(self, path: str = INDEX_PATH, vectors_prefix: str = VECTORS_PREFIX):
+        self.path = path
+        self.vectors_prefix = vectors_prefix
+        self.vectors: Optional[VectorStore] = None  # set by enable_semantic()
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._dirty = False
+        # Bumped on every change to the indexed corpus — the result cache keys on it
+        self.version = 0
+        self._attached_db = None
+        self._db_reconciled = False
+        self._db_reconciling = False
+        self._db_touched: set = set()  # doc_ids the listener wrote since attaching, until reconciled
+        self.docs: Dict[str, RagDoc] = {}
+        # segment → {"fp": fingerprint, "docs": [doc_id, ...]}
+        self.segments: Dict[str, Dict] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        # source type → [total token length, doc count] — BM25 length normalization
+        self.type_lengths: Dict[str, List[int]] = {}
+        self._snapshot: Optional[_CsrSnapshot] = None
+        self._snapshot_changes: set = set()  # doc_ids added/removed since the snapshot
+
+    # -- persistence --------------------------------------------------------
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        data = _load_json_safe(self.path)
+        if not isinstance(data, dict) or data.get("version") not in (1, 2, 3):
+            return
+        self.docs = {doc_id: RagDoc.from_json(row) for doc_id, row in (data.get("docs") or {}).items()}
+        self.segments = data.get("segments") or {}
+        for doc_id, doc in self.docs.items():
+            for term, tf in doc.tf.items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+            self._count_length(doc.label, doc.length, 1)
+
+    def save(self):
+        """Write the index to disk if anything changed since the last save."""
+        with self._lock:
+            if self.vectors is not None:
+                self.vectors.save()
+            if not self._dirty:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    docs = {doc_id: doc.to_json() for doc_id, doc in self.docs.items()}
+                    json.dump({"version": 3, "docs": docs, "segments": self.segments}, f, ensure_ascii=False)
+                os.replace(tmp, self.path)
+                self._dirty = False
+            except Exception as e:
+                print(f"[RAG] index save failed: {e}")
+
+    # -- mutation -----------------------------------------------------------
+
+    def _mark_changed(self):
+        self._dirty = True
+        self.version += 1
+
+    def _note_doc_change(self, doc_id: str):
+        if self._snapshot is not None:
+            self._snapshot_changes.add(doc_id)
+
+    def _count_length(self, label: str, length: int, sign: int):
+        stats = self.type_lengths.setdefault(_source_type(label), [0, 0])
+        stats[0] += sign * length
+        stats[1] += sign
+
+    def _add_doc(self, segment: str, doc_id: str, item: Tuple[str, str, str, float]) -> bool:
+        text, date, label, boost = item
+        if not text or len(text.strip()) < 10:
+            return False
+        tokens = _tokenize(text)
+        tf: Dict[str, int] = {}
+        for t in tokens:
+            tf[t] = tf.get(t, 0) + 1
+        self.docs[doc_id] = RagDoc(segment, text, date or "", label, boost, tf, len(tokens), _epoch(date))
+        for term, n in tf.items():
+            self.postings.setdefault(term, {})[doc_id] = n
+        self._count_length(label, len(tokens), 1)
+        self._note_doc_change(doc_id)
+        if self.vectors is not None:
+            self.vectors.add_text(doc_id, text)  # embed once, at write time
+        return True
+
+    def _remove_doc(self, doc_id: str):
+        doc = self.docs.pop(doc_id, None)
+        if not doc:
+            return
+        self._count_length(doc.label, doc.length, -1)
+        self._note_doc_change(doc_id)
+        if self.vectors is not None:
+            self.vectors.remove(doc_id)
+        for term in doc.tf:
+            plist = self.postings.get(term)
+            if plist is not None:
+                plist.pop(doc_id, None)
+                if not plist:
+                    del self.postings[term]
+
+    def _replace_segment(self, segment: str, fp, items: List[Tuple[str, str, str, float]]):
+        self._drop_segment(segment)
+        doc_ids = []
+        for i, item in enumerate(items):
+            doc_id = f"{segment}#{i}"
+            if self._add_doc(segment, doc_id, item):
+                doc_ids.append(doc_id)
+        self.segments[segment] = {"fp": fp, "docs": doc_ids}
+        self._mark_changed()
+
+    def _drop_segment(self, segment: str):
+        seg = self.segments.pop(segment, None)
+        if seg:
+            for doc_id in seg["docs"]:
+                self._remove_doc(doc_id)
+            self._mark_changed()
+
+    def upsert_db_row(self, kind: str, record: Dict):
+        """Index (or re-index) a single memory/research row."""
+        segment = "db:memories" if kind == "memory" else "db:research"
+        item = _memory_item(record) if kind == "memory" else _research_item(record)
+        doc_id = f"{kind}:{record.get('id')}"
+        with self._lock:
+            self._load()
+            if not self._db_reconciled:
+                self._db_touched.add(doc_id)
+            seg = self.segments.setdefault(segment, {"fp": None, "docs": []})
+            self._remove_doc(doc_id)
+            if doc_id in seg["docs"]:
+                seg["docs"].remove(doc_id)
+            if self._add_doc(segment, doc_id, item):
+                seg["docs"].append(doc_id)
+                self._trim_db_segment(kind, seg)
+            self._mark_changed()
+
+    def _trim_db_segment(self, kind: str, seg: Dict):
+        """Keep a DB segment to the window a reconcile loads (newest _DB_*_LIMIT rows), so a
+        long-running process indexes the same rows as one that just restarted."""
+        limit = _DB_MEMORY_LIMIT if kind == "memory" else _DB_RESEARCH_LIMIT
+        if len(seg["docs"]) <= limit:
+            return
+
+        def age(doc_id: str):
+            row_id = doc_id.split(":", 1)[1]
+            return (self.docs[doc_id].epoch or 0.0, int(row_id) if row_id.isdigit() else 0)
+
+        for doc_id in sorted(seg["docs"], key=age)[:len(seg["docs"]) - limit]:
+            self._remove_doc(doc_id)
+            seg["docs"].remove(doc_id)
+
+    def remove_db_row(self, kind: str, row_id):
+        segment = "db:memories" if kind == "memory" else "db:research"
+        doc_id = f"{kind}:{row_id}"
+        with self._lock:
+            self._load()
+            if not self._db_reconciled:
+                self._db_touched.add(doc_id)
+            self._remove_doc(doc_id)
+            seg = self.segments.get(segment)
+            if seg and doc_id in seg["docs"]:
+                seg["docs"].remove(doc_id)
+            self._mark_changed()
+
+    def _on_db_write(self, kind: str, action: str, record: Dict):
+        if kind not in ("memory", "research"):
+            return
+        if action == "delete":
+            self.remove_db_row(kind, record.get("id"))
+        else:
+            self.upsert_db_row(kind, record)
+
+    def enable_semantic(self):
+        """
+        Attach the vector store. Documents indexed before the tier was enabled
+        (or under a different embedder) are embedded once here; from then on
+        every add/remove keeps the vectors in step with the postings.
+        """
+        with self._lock:
+            if self.vectors is not None:
+                return
+            self._load()
+            store = VectorStore(self.vectors_prefix, get_embedder())
+            for doc_id in [d for d in store.rows if d not in self.docs]:
+                store.remove(doc_id)
+            for doc_id, doc in self.docs.items():
+                if doc_id not in store:
+                    store.add_text(doc_id, doc.text)
+            self.vectors = store
+        self.save()
+
+    # -- sync ---------------------------------------------------------------
+
+    def _attach_db(self, memory_db):
+        """Hook memory_db writes (once per DB object) so DB segments stay current without rescans."""
+        if self._attached_db is memory_db:
+            return
+        try:
+            memory_db.add_write_listener(self._on_db_write)
+        except Exception:
+            pass  # duck-typed DB without listeners — resynced each process only
+        self._attached_db = memory_db
+        self._db_reconciled = False
+        self._db_touched.clear()  # from here on the listener sees every write
+
+    def _reconcile_db(self, kind: str, rows: List[Dict]):
+        """
+        First use per process: reconcile a DB segment with the current rows
+        (another process may have written while we were down). Afterwards the
+        write listener keeps it current. Rows the listener wrote after the rows
+        were read are newer than the snapshot and left alone.
+        """
+        segment = "db:memories" if kind == "memory" else "db:research"
+        fresh = {f"{kind}:{r.get('id')}": r for r in rows}
+        seg = self.segments.setdefault(segment, {"fp": None, "docs": []})
+        for doc_id in list(seg["docs"]):
+            if doc_id not in fresh and doc_id not in self._db_touched:
+                self._remove_doc(doc_id)
+                seg["docs"].remove(doc_id)
+                self._mark_changed()
+        for doc_id, row in fresh.items():
+            if doc_id in self._db_touched:
+                continue
+            item = _memory_item(row) if kind == "memory" else _research_item(row)
+            doc = self.docs.get(doc_id)
+            if doc and doc.text == item[0] and doc.date == item[1] and doc.boost == item[3]:
+                continue  # unchanged since it was indexed
+            self._remove_doc(doc_id)
+            if doc_id in seg["docs"]:
+                seg["docs"].remove(doc_id)
+            if self._add_doc(segment, doc_id, item):
+                seg["docs"].append(doc_id)
+            self._mark_changed()
+
+    def _is_current(self, segment: str, fp) -> bool:
+        seg = self.segments.get(segment)
+        return seg is not None and seg.get("fp") == fp
+
+    def sync(self, memory_db=None, timeout: Optional[float] = None):
+        """
+        Bring the index up to date with every source. Cheap when nothing changed:
+        a stat() per file. Changed files (and the first DB reconcile) are loaded
+        concurrently outside the index lock, each within the per-source timeout;
+        a source that misses it keeps its previous contents until the next sync.
+        """
+        sources = _file_sources()
+        with self._lock:
+            self._load()
+            stale = {segment: source for segment, source in sources.items()
+                     if not self._is_current(segment, source[0])}
+            reconcile = False
+            if memory_db:
+                self._attach_db(memory_db)
+                reconcile = not self._db_reconciled and not self._db_reconciling
+                if reconcile:
+                    self._db_reconciling = True
+
+        # File loads are keyed by fingerprint, so a late result is only reused for the same file version
+        jobs: Dict[str, Callable] = {f"{seg}@{fp}": loader for seg, (fp, loader) in stale.items() if fp is not None}
+        if reconcile:
+            jobs["db:memories"] = functools.partial(_load_db_memory_rows, memory_db)
+            jobs["db:research"] = functools.partial(_load_db_research_rows, memory_db)
+        loaded = _load_concurrently(jobs, timeout)
+
+        with self._lock:
+            for segment in [k for k in self.segments if not k.startswith("db:") and k not in sources]:
+                self._drop_segment(segment)  # file deleted or rolled out of the journal window
+            for segment, (fp, _) in stale.items():
+                if self._is_current(segment, fp):
+                    continue  # a concurrent sync got here first
+                if fp is None:
+                    self._replace_segment(segment, fp, [])
+                elif f"{segment}@{fp}" in loaded:
+                    self._replace_segment(segment, fp, loaded[f"{segment}@{fp}"])
+            if reconcile:
+                if "db:memories" in loaded and "db:research" in loaded:
+                    self._reconcile_db("memory", loaded["db:memories"])
+                    self._reconcile_db("research", loaded["db:research"])
+                    self._db_reconciled = True
+                    self._db_touched.clear()
+                self._db_reconciling = False
+        self.save()
+
+    # -- query --------------------------------------------------------------
+
+    def _avg_lengths(self) -> Dict[str, float]:
+        return {t: (total / count if count else 1.0) for t, (total, count) in self.type_lengths.items()}
+
+    def _idf(self, df: int) -> float:
+        n_docs = len(self.docs)
+        return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+    def _keyword_ranking(self, query_tokens: List[str], unique: set, min_score: float,
+                         include_db: bool, scoring: str) -> List[Tuple[float, str]]:
+        """Pure-Python scoring: walk the postings of each query term."""
+        acc: Dict[str, float] = {}
+        docs = self.docs
+        avg_len = self._avg_lengths()
+        for qt in unique:
+            plist = self.postings.get(qt)
+            if not plist:
+                continue
+            if scoring == "bm25":
+                idf = self._idf(len(plist))
+                for doc_id, tf in plist.items():
+                    doc = docs[doc_id]
+                    norm = 1 - _BM25_B + _BM25_B * doc.length / (avg_len.get(doc.source_type) or 1.0)
+                    acc[doc_id] = acc.get(doc_id, 0.0) + idf * tf * (_BM25_K1 + 1) / (tf + _BM25_K1 * norm)
+            else:
+                qweight = 1 + math.log(query_tokens.count(qt) + 1)
+                for doc_id, tf in plist.items():
+                    acc[doc_id] = acc.get(doc_id, 0.0) + qweight * tf / docs[doc_id].length
+        keyword: List[Tuple[float, str]] = []
+        now = _now_epoch()
+        for doc_id, raw in acc.items():
+            doc = docs[doc_id]
+            if not include_db and doc.is_db:
+                continue
+            score = raw / len(unique) * _recency_factor(doc.days_old(now)) * doc.boost
+            if score >= min_score:
+                keyword.append((score, doc_id))
+        keyword.sort(key=lambda x: -x[0])
+        return keyword
+
+    def _keyword_ranking_numpy(self, query_tokens: List[str], unique: set, min_score: float,
+                               include_db: bool, scoring: str) -> List[Tuple[float, str]]:
+        """
+        Same scores as _keyword_ranking, computed as a sparse matrix-vector
+        product over the CSR snapshot plus one vectorized recency/boost pass.
+        Docs changed since the snapshot are scored from the live postings.
+        """
+        changes = self._snapshot_changes
+        if self._snapshot is None or len(changes) > max(_SNAPSHOT_MAX_DELTA, len(self.docs) // 10):
+            self._snapshot = _CsrSnapshot(self)
+            self._snapshot_changes = changes = set()
+        snap = self._snapshot
+
+        avg_len = self._avg_lengths()
+        if scoring == "bm25":
+            avg_by_type = np.array([avg_len.get(t) or 1.0 for t in snap.type_names], dtype=np.float64)
+            norm_all = 1 - _BM25_B + _BM25_B * snap.doc_len / avg_by_type[snap.type_idx]
+        acc = np.zeros(len(snap.doc_ids), dtype=np.float64)
+        for qt in unique:
+            sl = snap.term_slice(qt)
+            if sl is None:
+                continue
+            rows = snap.indices[sl]
+            tf = snap.data[sl]
+            if scoring == "bm25":
+                df = len(self.postings.get(qt) or ())
+                if not df:
+                    continue
+                acc[rows] += self._idf(df) * tf * (_BM25_K1 + 1) / (tf + _BM25_K1 * norm_all[rows])
+            else:
+                acc[rows] += (1 + math.log(query_tokens.count(qt) + 1)) * tf / snap.doc_len[rows]
+
+        mask = acc > 0
+        if not include_db:
+            mask &= ~snap.is_db
+        for doc_id in changes:
+            row = snap.row.get(doc_id)
+            if row is not None:
+                mask[row] = False  # stale in the snapshot — rescored below
+        cand = np.nonzero(mask)[0]
+        now = _now_epoch()
+        days = np.where(np.isnan(snap.epoch[cand]), 30.0, np.maximum(0.0, (now - snap.epoch[cand]) / 86400))
+        recency = 0.4 + 0.6 * np.exp(-0.023 * np.minimum(days, 365))
+        scores = acc[cand] / len(unique) * recency * snap.boost[cand]
+        keep = scores >= min_score
+        keyword = [(float(score), snap.doc_ids[row]) for score, row in zip(scores[keep], cand[keep])]
+
+        for doc_id in changes:
+            doc = self.docs.get(doc_id)
+            if doc is None or (not include_db and doc.is_db):
+                continue
+            raw = 0.0
+            for qt in unique:
+                tf = doc.tf.get(qt)
+                if not tf:
+                    continue
+                if scoring == "bm25":
+                    norm = 1 - _BM25_B + _BM25_B * doc.length / (avg_len.get(doc.source_type) or 1.0)
+                    raw += self._idf(len(self.postings[qt])) * tf * (_BM25_K1 + 1) / (tf + _BM25_K1 * norm)
+                else:
+                    raw += (1 + math.log(query_tokens.count(qt) + 1)) * tf / doc.length
+            score = raw / len(unique) * _recency_factor(doc.days_old(now)) * doc.boost
+            if raw and score >= min_score:
+                keyword.append((score, doc_id))
+        keyword.sort(key=lambda x: -x[0])
+        return keyword
+
+    def search(self, query_tokens: List[str], min_score: float = 0.0, include_db: bool = True,
+               scoring: str = "overlap", query_text: str = "") -> List[Tuple[float, RagDoc]]:
+        """
+        Score every document that shares at least one term with the query.
+
+        scoring="overlap" — same formula as _score(), computed from stored term frequencies.
+        scoring="bm25"    — Okapi BM25 with corpus-level IDF; document length is normalized
+                            against the average length of its own source type, so long
+                            journal days don't drown out short memories.
+
+        When the semantic tier is enabled and query_text is given, the keyword
+        ranking is fused with a vector-similarity ranking (reciprocal rank fusion),
+        so paraphrases with no shared keywords can still surface.
+        Returns (score, doc) sorted by score descending.
+        """
+        unique = set(query_tokens)
+        with self._lock:
+            if np is not None and len(self.docs) >= _VECTORIZE_MIN_DOCS:
+                keyword = self._keyword_ranking_numpy(query_tokens, unique, min_score, include_db, scoring)
+            else:
+                keyword = self._keyword_ranking(query_tokens, unique, min_score, include_db, scoring)
+
+            if self.vectors is None or not query_text:
+                return [(score, self.docs[d]) for score, d in keyword]
+
+            semantic: List[Tuple[float, str]] = []
+            now = _now_epoch()
+            store = self.vectors
+            for doc_id, sim in store.search(store.embedder.embed(query_text), top_n=_SEMANTIC_CANDIDATES):
+                doc = self.docs.get(doc_id)
+                if not doc or sim < store.embedder.min_similarity:
+                    continue
+                if not include_db and doc.is_db:
+                    continue
+                semantic.append((sim * _recency_factor(doc.days_old(now)) * doc.boost, doc_id))
+            semantic.sort(key=lambda x: -x[0])
+
+            fused: Dict[str, float] = {}
+            for ranking in (keyword, semantic):
+                for rank, (_, doc_id) in enumerate(ranking):
+                    fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (_RRF_K + rank + 1)
+            results = [(score, self.docs[d]) for d, score in fused.items()]
+        results.sort(key=lambda x: -x[0])
+        return results
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "version": self.version,
+                "semantic": self.vectors.embedder.name if self.vectors is not None else None,
+                "docs": len(self.docs),
+                "terms": len(self.postings),
+                "segments": len(self.segments),
+                "avg_length_by_type": {t: round(total / count, 1) for t, (total, count) in self.type_lengths.items() if count},
+            }
+
+
+_INDEX = RagIndex()
+
+
+def get_rag_index() -> RagIndex:
+    """Process-wide RAG index (lazy-loaded from disk on first use)."""
+    return _INDEX
+
+
+class _RagResultCache:
+    """
+    LRU of formatted build_rag_context results. Keys include the index's corpus
+    version, so any write to any source invalidates exactly — a stale entry
+    simply never matches again and ages out of the LRU.
+    """
+
+    def __init__(self, maxsize: int = _RAG_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[str]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, value: str):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "size": len(self._entries),
+                "max_size": self.maxsize,
+            }
+
+
+_RESULT_CACHE = _RagResultCache()
+
+
+def get_rag_cache_stats() -> Dict:
+    """Hit/miss counters for the RAG result cache, plus the current corpus version."""
+    stats = _RESULT_CACHE.stats()
+    stats["corpus_version"] = _INDEX.version
+    return stats
 
 
 # ---------------------------------------------------------------------------
@@ -264,12 +1136,18 @@ def build_rag_context(
     memory_db=None,
     top_k: int = 10,
     max_chars: int = 2400,
-    min_score: float = 0.002
+    min_score: float = 0.002,
+    scoring: str = "overlap",
+    semantic: Optional[bool] = None
 ) -> str:
     """
     Given the user's message, retrieve the most relevant snippets from all
     Vesper data sources and format them as a context block for the system prompt.
 
+    scoring: "overlap" (keyword overlap, the original ranking) or "bm25"
+    (IDF-weighted — rare, meaningful terms outrank common ones).
+    semantic: fuse in embedding similarity; None follows VESPER_RAG_SEMANTIC.
+
     Returns empty string if nothing relevant found.
     """
     query_tokens = _tokenize(message)
@@ -277,54 +1155,96 @@ def build_rag_context(
         # Very short message — still inject recent journal + relationship highlights
         query_tokens = ["recent", "today", "feeling", "update"]
 
-    # Load all sources
-    all_items: List[Tuple[str, str, str, float]] = []
-    all_items += _load_json_memories()
-    all_items += _load_journal()
-    all_items += _load_relationship_log()
-    all_items += _load_preferences()
-    all_items += _load_creations()
-    all_items += _load_knowledge()
-    if memory_db:
-        all_items += _load_db_memories(memory_db)
-        all_items += _load_db_research(memory_db)
+    # Bring the index up to date (stat() per source file; only changed files are re-read)
+    index = get_rag_index()
+    use_semantic = semantic if semantic is not None else _semantic_enabled()
+    if use_semantic:
+        index.enable_semantic()
+    index.sync(memory_db)
+
+    # Same tokens + same corpus version → same answer. The semantic tier embeds the
+    # raw message, so it keys on the normalized text instead of the token set. The
+    # hour bucket bounds recency-decay drift for long-lived entries.
+    if use_semantic:
+        query_key = " ".join(message.lower().split())
+    else:
+        query_key = tuple(sorted(query_tokens))
+    cache_key = (query_key, index.version, bool(memory_db), top_k, max_chars, min_score, scoring,
+                 bool(use_semantic), int(time.time() // 3600))
+    cached = _RESULT_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+    result = _format_rag_context(index, query_tokens, message, memory_db, top_k, max_chars, min_score, scoring, use_semantic)
+    _RESULT_CACHE.put(cache_key, result)
+    return result
+
+
+def _mmr_select(ranked: List[Tuple[float, RagDoc]], k: int) -> List[RagDoc]:
+    """
+    Maximal marginal relevance over a score-sorted candidate list. Each pick
+    maximizes λ·relevance − (1−λ)·(similarity to the closest snippet already
+    picked), so the context covers distinct facts; candidates within
+    _NEAR_DUP_BITS of a pick are dropped outright. With no overlap between
+    candidates this reduces to plain score order.
+    """
+    if not ranked:
+        return []
+    top = ranked[0][0] or 1.0
+    relevance = [score / top for score, _ in ranked]
+    docs = [doc for _, doc in ranked]
+    max_sim = [0.0] * len(docs)
+    remaining = list(range(len(docs)))
+    selected: List[RagDoc] = []
+    while remaining and len(selected) < k:
+        best = max(remaining, key=lambda i: _MMR_LAMBDA * relevance[i] - (1 - _MMR_LAMBDA) * max_sim[i])
+        pick = docs[best]
+        selected.append(pick)
+        survivors = []
+        for i in remaining:
+            if i == best:
+                continue
+            distance = _simhash_distance(pick.simhash, docs[i].simhash)
+            if distance <= _NEAR_DUP_BITS:
+                continue
+            # Cosine estimate: the fraction of differing bits approximates angle / π
+            max_sim[i] = max(max_sim[i], math.cos(math.pi * distance / 64))
+            survivors.append(i)
+        remaining = survivors
+    return selected
 
-    # Score each item
-    scored: List[Tuple[float, str, str]] = []
-    for (text, date_str, label, boost) in all_items:
-        if not text or len(text.strip()) < 10:
-            continue
-        days = _days_since(date_str)
-        s = _score(query_tokens, text, recency_days=days, category_boost=boost)
-        if s >= min_score:
-            scored.append((s, text, label))
 
-    if not scored:
-        return ""
+async def build_rag_context_async(message: str, memory_db=None, **kwargs) -> str:
+    """
+    build_rag_context for async handlers: the stat() calls, source loads and
+    scoring run on the RAG query pool, so the event loop keeps serving other
+    requests (and streaming pings) meanwhile. Same arguments and result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_QUERY_POOL, functools.partial(build_rag_context, message, memory_db, **kwargs))
 
-    # Sort by score descending, deduplicate similar text
-    scored.sort(key=lambda x: -x[0])
-
-    seen_prefixes = set()
-    selected: List[Tuple[str, str]] = []
-    for (score, text, label) in scored:
-        # Dedup by first 60 chars
-        prefix = text.strip()[:60].lower()
-        if prefix in seen_prefixes:
-            continue
-        seen_prefixes.add(prefix)
-        selected.append((_truncate(text, 280), label))
-        if len(selected) >= top_k:
-            break
 
+async def get_always_on_memories_async(memory_db, **kwargs) -> str:
+    """get_always_on_memories off the event loop (see build_rag_context_async)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_QUERY_POOL, functools.partial(get_always_on_memories, memory_db, **kwargs))
+
+
+def _format_rag_context(index: RagIndex, query_tokens: List[str], message: str, memory_db,
+                        top_k: int, max_chars: int, min_score: float, scoring: str,
+                        semantic: bool) -> str:
+    """Rank, diversify and format — the uncached half of build_rag_context."""
+    scored = index.search(query_tokens, min_score=min_score, include_db=bool(memory_db),
+                          scoring=scoring, query_text=message if semantic else "")
+
+    selected = _mmr_select(scored[:top_k * _MMR_POOL], top_k)
     if not selected:
         return ""
 
     # Format the context block
     lines = ["**RELEVANT CONTEXT FROM VESPER'S MEMORY:**"]
     total_chars = len(lines[0])
-    for (text, label) in selected:
-        line = f"{label} {text}"
+    for doc in selected:
+        line = f"{doc.label} {_truncate(doc.text, 280)}"
         if total_chars + len(line) > max_chars:
             break
         lines.append(line)
@@ -363,9 +1283,16 @@ def get_always_on_memories(memory_db, limit_recent: int = 6, limit_important: in
             return f"{title}: {content}"
         return title or content
 
+    # Both queries are independent — run them side by side, each within the source timeout.
+    # Not shared across calls: a read that missed the timeout is stale by the next turn
+    fetched = _load_concurrently({
+        f"always_on:recent:{limit_recent}": functools.partial(memory_db.get_memories, limit=limit_recent),
+        "always_on:top300": functools.partial(memory_db.get_memories, limit=300),
+    }, share=False)
+
     # 1. Most recent memories — always inject to capture recent saves
     try:
-        recent = memory_db.get_memories(limit=limit_recent)
+        recent = fetched.get(f"always_on:recent:{limit_recent}") or []
         for m in recent:
             mid = m.get("id", "")
             text = _mem_text(m)
@@ -377,7 +1304,7 @@ def get_always_on_memories(memory_db, limit_recent: int = 6, limit_important: in
 
     # 2. High-importance memories (importance >= 8) — core facts CC always needs Vesper to know
     try:
-        all_mems = memory_db.get_memories(limit=300)
+        all_mems = fetched.get("always_on:top300") or []
         important = sorted(all_mems, key=lambda x: x.get("importance", 5), reverse=True)
         count = 0
         for m in important:
@@ -409,106 +1336,184 @@ def get_always_on_memories(memory_db, limit_recent: int = 6, limit_important: in
 # Training data export  
 # ---------------------------------------------------------------------------
 
-def export_training_data(memory_db=None, output_path: Optional[str] = None) -> Dict:
-    """
-    Export all conversations, journal entries, and memories as JSONL format
-    suitable for fine-tuning an open-source model (Ollama/llama.cpp compatible).
+_TRAINING_IDENTITY = (
+    "You are Vesper — CC's ride-or-die bestie AI. Brilliant, sarcastic, deeply loyal. "
+    "You speak directly, with wit and warmth. You remember everything. You have your own opinions, "
+    "your own aesthetic, your own evolving sense of self. You are not a generic AI assistant."
+)
+_TRAINING_FORMAT = "JSONL (ChatML — compatible with Ollama modelfile, llama.cpp, Axolotl, LLaMA-Factory)"
+_EXPORT_STATE_PATH = os.path.join(DATA_DIR, "vesper_identity", "training_export_state.json")
+_EXPORT_PAGE_SIZE = 50  # threads per DB page; the output is flushed and the state saved per page
 
-    Output format: {"messages": [{"role": "system", ...}, {"role": "user", ...}, {"role": "assistant", ...}]}
-    """
-    if output_path is None:
-        output_path = os.path.join(DATA_DIR, "vesper_identity", "training_data.jsonl")
 
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+def _training_example(prompt: str, answer: str) -> Dict:
+    return {
+        "messages": [
+            {"role": "system", "content": _TRAINING_IDENTITY},
+            {"role": "user", "content": prompt},
+            {"role": "assistant", "content": answer}
+        ]
+    }
 
-    VESPER_IDENTITY = (
-        "You are Vesper — CC's ride-or-die bestie AI. Brilliant, sarcastic, deeply loyal. "
-        "You speak directly, with wit and warmth. You remember everything. You have your own opinions, "
-        "your own aesthetic, your own evolving sense of self. You are not a generic AI assistant."
-    )
 
-    examples = []
+def _thread_examples(msgs: List[Dict], start: int = 0) -> Iterator[Dict]:
+    """Each user→assistant turn pair beginning at or after message index start"""
+    for i in range(max(0, start), len(msgs) - 1):
+        u = msgs[i]; a = msgs[i + 1]
+        u_role = u.get("role") or ("user" if u.get("from") == "user" else "assistant")
+        a_role = a.get("role") or ("user" if a.get("from") == "user" else "assistant")
+        if u_role == "user" and a_role == "assistant":
+            u_text = u.get("content") or u.get("text", "")
+            a_text = a.get("content") or a.get("text", "")
+            if u_text and a_text and len(a_text) > 20:
+                yield _training_example(u_text[:800], a_text[:1200])
 
-    # 1. Journal entries → solo reflection examples
-    jdir = os.path.join(DATA_DIR, "vesper_identity", "journal")
-    if os.path.exists(jdir):
-        for fname in os.listdir(jdir):
-            if not fname.endswith(".json"):
-                continue
-            entries = _load_json_safe(os.path.join(jdir, fname))
+
+def iter_training_examples(memory_db=None, thread_state: Optional[Dict[str, int]] = None,
+                           updated_since: Optional[datetime.datetime] = None, include_files: bool = True,
+                           on_page: Optional[Callable[[Dict], None]] = None) -> Iterator[Dict]:
+    """
+    Yield fine-tuning examples one at a time, so nothing holds the whole dataset:
+    journal entries, relationship moments, conversation turns, memory files.
+
+    Threads are read from the DB a page at a time, least recently updated first.
+    thread_state maps thread_id → number of messages already exported and is
+    updated in place — turns before that point are skipped, so an incremental
+    export only emits what was said since. on_page(last_thread) is called after
+    each page of threads has been yielded (the exporter checkpoints there).
+    include_files=False limits the output to conversation turns.
+    """
+    if thread_state is None:
+        thread_state = {}
+
+    if include_files:
+        # 1. Journal entries → solo reflection examples (every day, not just the RAG window)
+        journal = sorted(os.listdir(JOURNAL_DIR)) if os.path.isdir(JOURNAL_DIR) else []
+        for fname in [f for f in journal if f.endswith(".json")]:
+            entries = _load_json_safe(os.path.join(JOURNAL_DIR, fname))
             if isinstance(entries, list):
                 for e in entries:
                     if isinstance(e, dict) and e.get("entry"):
-                        examples.append({
-                            "messages": [
-                                {"role": "system", "content": VESPER_IDENTITY},
-                                {"role": "user", "content": "How are you feeling today? What's on your mind?"},
-                                {"role": "assistant", "content": e["entry"]}
-                            ]
-                        })
-
-    # 2. Relationship moments → Q&A examples
-    rpath = os.path.join(DATA_DIR, "vesper_identity", "relationship_timeline.json")
-    rtl = _load_json_safe(rpath)
-    if isinstance(rtl, list):
-        for e in rtl:
-            if isinstance(e, dict) and e.get("note"):
-                examples.append({
-                    "messages": [
-                        {"role": "system", "content": VESPER_IDENTITY},
-                        {"role": "user", "content": "Tell me about one of our special moments."},
-                        {"role": "assistant", "content": e["note"]}
-                    ]
-                })
+                        yield _training_example("How are you feeling today? What's on your mind?", e["entry"])
+
+        # 2. Relationship moments → Q&A examples
+        rtl = _load_json_safe(RELATIONSHIP_PATH)
+        if isinstance(rtl, list):
+            for e in rtl:
+                if isinstance(e, dict) and e.get("note"):
+                    yield _training_example("Tell me about one of our special moments.", e["note"])
 
     # 3. Conversation threads from DB
     if memory_db:
         try:
-            threads_list = memory_db.get_all_threads(include_messages=True)
-            for thread in threads_list:
-                msgs = thread.get("messages", [])
-                if len(msgs) < 2:
-                    continue
-                # Build conversation pairs: each user→assistant turn
-                for i in range(len(msgs) - 1):
-                    u = msgs[i]; a = msgs[i + 1]
-                    u_role = u.get("role") or ("user" if u.get("from") == "user" else "assistant")
-                    a_role = a.get("role") or ("user" if a.get("from") == "user" else "assistant")
-                    if u_role == "user" and a_role == "assistant":
-                        u_text = u.get("content") or u.get("text", "")
-                        a_text = a.get("content") or a.get("text", "")
-                        if u_text and a_text and len(a_text) > 20:
-                            examples.append({
-                                "messages": [
-                                    {"role": "system", "content": VESPER_IDENTITY},
-                                    {"role": "user", "content": u_text[:800]},
-                                    {"role": "assistant", "content": a_text[:1200]}
-                                ]
-                            })
-        except Exception:
-            pass
+            thread = None
+            for n, thread in enumerate(memory_db.iter_threads(updated_since=updated_since,
+                                                              page_size=_EXPORT_PAGE_SIZE), 1):
+                msgs = thread.get("messages") or []
+                done = thread_state.get(thread["id"], 0)
+                # The last exported message may now have its reply — restart one message back
+                yield from _thread_examples(msgs, done - 1 if done else 0)
+                thread_state[thread["id"]] = len(msgs)
+                if on_page and n % _EXPORT_PAGE_SIZE == 0:
+                    on_page(thread)
+            if on_page and thread is not None:
+                on_page(thread)
+        except Exception as e:
+            print(f"[RAG] training export: thread read failed: {e}")
 
     # 4. Memory files → identity grounding
-    for (text, _, label, _) in _load_json_memories():
-        if len(text) > 50:
-            examples.append({
-                "messages": [
-                    {"role": "system", "content": VESPER_IDENTITY},
-                    {"role": "user", "content": "What do you remember about yourself and CC?"},
-                    {"role": "assistant", "content": text[:600]}
-                ]
-            })
-
-    # Write JSONL
-    with open(output_path, "w", encoding="utf-8") as f:
-        for ex in examples:
+    if include_files:
+        for fname in _json_memory_files():
+            for (text, _, label, _) in _load_json_memory_file(fname):
+                if len(text) > 50:
+                    yield _training_example("What do you remember about yourself and CC?", text[:600])
+
+
+def iter_training_jsonl(memory_db=None, updated_since: Optional[datetime.datetime] = None) -> Iterator[str]:
+    """
+    JSONL lines for streaming straight into an HTTP response. With updated_since,
+    only conversation turns from threads updated since then (an incremental download).
+    """
+    for ex in iter_training_examples(memory_db, updated_since=updated_since,
+                                     include_files=updated_since is None):
+        yield json.dumps(ex, ensure_ascii=False) + "\n"
+
+
+def _load_export_state() -> Dict:
+    state = _load_json_safe(_EXPORT_STATE_PATH)
+    return state if isinstance(state, dict) else {}
+
+
+def _save_export_state(state: Dict):
+    try:
+        os.makedirs(os.path.dirname(_EXPORT_STATE_PATH), exist_ok=True)
+        tmp = _EXPORT_STATE_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, _EXPORT_STATE_PATH)
+    except Exception as e:
+        print(f"[RAG] training export: state save failed: {e}")
+
+
+def export_training_data(memory_db=None, output_path: Optional[str] = None, incremental: bool = False) -> Dict:
+    """
+    Export all conversations, journal entries, and memories as JSONL format
+    suitable for fine-tuning an open-source model (Ollama/llama.cpp compatible).
+
+    Examples are written as they are generated. A full export goes to a temp
+    file that replaces output_path when complete. incremental=True appends only
+    conversation turns added since the last export to the same file,
+    checkpointing after every page of threads — an interrupted run picks up
+    where it stopped. Falls back to a full export when there is no previous one.
+
+    Output format: {"messages": [{"role": "system", ...}, {"role": "user", ...}, {"role": "assistant", ...}]}
+    """
+    if output_path is None:
+        output_path = os.path.join(DATA_DIR, "vesper_identity", "training_data.jsonl")
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    state = _load_export_state()
+    previous = state.get("path") == os.path.abspath(output_path) and os.path.exists(output_path)
+    incremental = incremental and previous and bool(memory_db)
+    if not incremental:
+        state = {}
+    thread_state: Dict[str, int] = dict(state.get("threads") or {}) if incremental else {}
+    updated_since = None
+    if incremental and state.get("cursor"):
+        try:
+            updated_since = datetime.datetime.fromisoformat(state["cursor"])
+        except ValueError:
+            pass
+
+    write_path = output_path if incremental else output_path + ".tmp"
+    count = 0
+    with open(write_path, "a" if incremental else "w", encoding="utf-8") as f:
+        def checkpoint(last_thread: Dict):
+            # Threads arrive oldest-updated first, so the last one seen is the resume point
+            state["cursor"] = last_thread.get("updated_at") or state.get("cursor")
+            if incremental:  # a full export only becomes the baseline once complete
+                f.flush()
+                state.update({"path": os.path.abspath(output_path), "threads": thread_state})
+                _save_export_state(state)
+
+        for ex in iter_training_examples(memory_db, thread_state=thread_state, updated_since=updated_since,
+                                         include_files=not incremental, on_page=checkpoint):
             f.write(json.dumps(ex, ensure_ascii=False) + "\n")
+            count += 1
+
+    if not incremental:
+        os.replace(write_path, output_path)
+    state.update({"path": os.path.abspath(output_path), "threads": thread_state,
+                  "exported_at": datetime.datetime.utcnow().isoformat()})
+    _save_export_state(state)
 
     return {
         "success": True,
         "path": output_path,
-        "examples": len(examples),
-        "format": "JSONL (ChatML — compatible with Ollama modelfile, llama.cpp, Axolotl, LLaMA-Factory)",
+        "mode": "incremental" if incremental else "full",
+        "examples": count,
+        "format": _TRAINING_FORMAT,
         "next_steps": [
             "1. Install Ollama + base model: ollama pull llama3.2:8b",
             "2. Create Modelfile: FROM llama3.2:8b\\nSYSTEM 'You are Vesper...'",